@@ -0,0 +1,75 @@
+"""Фоновый перенос выполненных задач в архив и обслуживание файла БД.
+
+Выполненные задачи с дедлайном старше older_than раз в interval переносятся
+из task в task_archive пачками по batch_size (каждая пачка — одна запись
+group commit, между пачками обработчики пользователей успевают выполнить
+свои запросы). После переноса — PRAGMA optimize, раз в неделю — VACUUM,
+который возвращает освободившиеся страницы и дефрагментирует task.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from database import ARCHIVE_BATCH, AsyncDatabase
+from timeutil import now_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class Archiver:
+    """Планировщик архивации: archive_completed пачками, optimize и VACUUM по расписанию"""
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        older_than: timedelta = timedelta(days=30),
+        batch_size: int = ARCHIVE_BATCH,
+        interval: timedelta = timedelta(hours=1),
+        vacuum_cron: str = "0 4 * * sun"
+    ):
+        self.db = db
+        self.older_than = int(older_than.total_seconds())
+        self.batch_size = batch_size
+        self.interval = interval
+        self.vacuum_cron = vacuum_cron
+        self.scheduler = AsyncIOScheduler()
+        self.archived = 0
+
+    def start(self):
+        # Первый перенос — сразу после запуска: за время простоя могли накопиться задачи
+        self.scheduler.add_job(self.run, "interval", seconds=self.interval.total_seconds(),
+                               next_run_time=datetime.now(), id="archive", max_instances=1, coalesce=True,
+                               replace_existing=True)
+        if self.vacuum_cron:
+            self.scheduler.add_job(self.vacuum, CronTrigger.from_crontab(self.vacuum_cron),
+                                   id="vacuum", max_instances=1, coalesce=True, replace_existing=True)
+        self.scheduler.start()
+        logger.info("Archiver started: completed tasks older than %d days", self.older_than // 86400)
+
+    def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    async def run(self) -> int:
+        """Перенести все подходящие задачи, пачка за пачкой"""
+        before = now_timestamp() - self.older_than
+        total = 0
+        while True:
+            moved = await self.db.archive_completed(before, self.batch_size)
+            total += moved
+            if moved < self.batch_size:
+                break
+            await asyncio.sleep(0)
+
+        if total:
+            self.archived += total
+            logger.info("Archived %d completed tasks", total)
+            await self.db.compact()
+        return total
+
+    async def vacuum(self):
+        logger.info("Running VACUUM")
+        await self.db.compact(vacuum=True)
@@ -0,0 +1,669 @@
+"""Бенчмарки слоя данных TaskFlow.
+
+Примеры:
+    python benchmark.py stats
+    python benchmark.py stats --sizes 10000 100000 1000000
+    python benchmark.py search --sizes 100000 1000000
+    python benchmark.py memory --sizes 100000
+    python benchmark.py writes --ops 2000
+    python benchmark.py methods --json methods.json
+    python benchmark.py handlers --sizes 1000 100000 --json handlers.json --baseline old.json
+    python benchmark.py plans
+
+methods замеряет каждый метод Database, handlers — обработчики bot.py целиком
+с фейковыми Message/CallbackQuery (нужен config.py, DB_PATH берётся из
+TASKFLOW_DB_PATH). --json сохраняет результаты с хэшем коммита, --baseline
+сравнивает медианы с прошлым прогоном и завершается с кодом 1 при регрессии.
+
+plans проверяет EXPLAIN QUERY PLAN каждого запроса Database и завершается
+с кодом 1, если запрос сканирует task целиком или сортирует через TEMP B-TREE.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database import ACTIVE_TASKS_SQL, RECURRING_PENDING_SQL, AsyncDatabase, Database, Task
+from schema import migrate
+from stats import COUNTERS_SQL, WINDOW_COUNTERS_SQL, build_stats, window_params
+from timeutil import to_timestamp
+
+# Прежний вариант статистики: один проход с условной агрегацией по всей таблице
+FULL_PASS_SQL = """
+SELECT
+    COUNT(*),
+    COUNT(*) FILTER (WHERE status = 'pending'),
+    COUNT(*) FILTER (WHERE status = 'running'),
+    COUNT(*) FILTER (WHERE status = 'completed'),
+    COUNT(*) FILTER (WHERE status = 'pending' AND deadline < :now),
+    COUNT(*) FILTER (WHERE status = 'completed' AND created_at >= :week_ago),
+    COUNT(*) FILTER (WHERE created_at >= :week_ago),
+    COUNT(*) FILTER (WHERE status = 'completed' AND deadline >= :today_start AND deadline <= :today_end)
+FROM task
+"""
+
+WORDS = (
+    "отчет встреча звонок python релиз ревью план бюджет клиент договор "
+    "презентация тест деплой счет письмо дизайн задача проект база данные"
+).split()
+
+# Редкие слова: ~5000 сочетаний из трёх слогов
+SYLLABLES = "ба ве ги до жу зе ки ло му не по ру са ти фу ха це чи шо ю".split()
+RARE_WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES[:12]]
+
+
+# Все задачи по умолчанию принадлежат одному «тяжёлому» пользователю
+BENCH_USER_ID = 1
+
+
+def generate_tasks(count: int, seed: int = 42, users: int = 1):
+    """Синтетические задачи: дедлайны ±60 дней, создание за последние 60 дней"""
+    rnd = random.Random(seed)
+    now = datetime.now()
+
+    for _ in range(count):
+        title = " ".join(rnd.choices(WORDS, k=3)) + " " + rnd.choice(RARE_WORDS)
+        description = " ".join(rnd.choices(WORDS, k=8))
+        deadline = now + timedelta(minutes=rnd.randint(-60 * 24 * 60, 60 * 24 * 60))
+        created_at = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 60))
+        status = rnd.choices(("pending", "running", "completed"), weights=(5, 2, 3))[0]
+        user_id = BENCH_USER_ID + rnd.randrange(users)
+        yield title, description, to_timestamp(deadline), status, to_timestamp(created_at), user_id
+
+
+def seed_database(path: str, count: int, users: int = 1):
+    """Создать БД с актуальной схемой и count задачами users пользователей"""
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO task (title, description, deadline, status, created_at, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        generate_tasks(count, users=users)
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(fn, repeat: int = 5) -> dict:
+    """Время выполнения fn в миллисекундах"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {"min_ms": min(timings), "median_ms": statistics.median(timings)}
+
+
+def legacy_stats(path: str) -> dict:
+    """Статистика прежним способом: восемь отдельных COUNT(*)"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    params = window_params(BENCH_USER_ID)
+    result = {}
+
+    queries = {
+        "total": ("SELECT COUNT(*) FROM task", ()),
+        "pending": ("SELECT COUNT(*) FROM task WHERE status = 'pending'", ()),
+        "running": ("SELECT COUNT(*) FROM task WHERE status = 'running'", ()),
+        "completed": ("SELECT COUNT(*) FROM task WHERE status = 'completed'", ()),
+        "overdue": ("SELECT COUNT(*) FROM task WHERE status = 'pending' AND deadline < ?", (params["now"],)),
+        "completed_week": (
+            "SELECT COUNT(*) FROM task WHERE status = 'completed' AND created_at >= ?", (params["week_ago"],)
+        ),
+        "created_week": ("SELECT COUNT(*) FROM task WHERE created_at >= ?", (params["week_ago"],)),
+        "completed_today": (
+            "SELECT COUNT(*) FROM task WHERE status = 'completed' AND deadline >= ? AND deadline <= ?",
+            (params["today_start"], params["today_end"])
+        ),
+    }
+    for key, (sql, args) in queries.items():
+        cursor.execute(sql, args)
+        result[key] = cursor.fetchone()[0]
+
+    conn.close()
+    return result
+
+
+def single_pass_stats(path: str) -> dict:
+    """Вся статистика одним проходом по таблице"""
+    conn = sqlite3.connect(path)
+    total, pending, running, completed, *window_row = conn.execute(FULL_PASS_SQL, window_params(BENCH_USER_ID)).fetchone()
+    conn.close()
+
+    stats = build_stats((), window_row)
+    stats.update(total=total, pending=pending, running=running, completed=completed)
+    return stats
+
+
+def counters_stats(path: str) -> dict:
+    """Статистика из task_stats плюс один проход по временным окнам"""
+    conn = sqlite3.connect(path)
+    counters = conn.execute(COUNTERS_SQL, (BENCH_USER_ID,)).fetchall()
+    window_row = conn.execute(WINDOW_COUNTERS_SQL, window_params(BENCH_USER_ID)).fetchone()
+    conn.close()
+
+    return build_stats(counters, window_row)
+
+
+def bench_stats(sizes, workdir: str) -> list:
+    results = []
+
+    for size in sizes:
+        path = os.path.join(workdir, f"stats_{size}.db")
+        seed_database(path, size)
+
+        db = Database(path)
+        assert legacy_stats(path) == single_pass_stats(path) == db.get_dashboard_stats(BENCH_USER_ID)
+
+        for name, fn in (
+            ("legacy_8_queries", lambda: legacy_stats(path)),
+            ("single_pass", lambda: single_pass_stats(path)),
+            ("counters_table", lambda: db.get_dashboard_stats(BENCH_USER_ID)),
+        ):
+            row = {"bench": "stats", "size": size, "variant": name, **measure(fn)}
+            results.append(row)
+            print(f"stats size={size:>8} {name:<18} min={row['min_ms']:9.2f}ms median={row['median_ms']:9.2f}ms")
+
+    return results
+
+
+LIKE_SEARCH_SQL = """SELECT id, title, description, deadline, status, created_at
+                     FROM task
+                     WHERE status != 'completed'
+                     AND (title LIKE ? OR description LIKE ?)
+                     ORDER BY deadline"""
+
+
+def like_search(path: str, query: str) -> list:
+    """Прежний поиск через LIKE '%q%'"""
+    conn = sqlite3.connect(path)
+    rows = conn.execute(LIKE_SEARCH_SQL, (f"%{query}%", f"%{query}%")).fetchall()
+    conn.close()
+    return rows
+
+
+def bench_search(sizes, workdir: str) -> list:
+    results = []
+
+    for size in sizes:
+        path = os.path.join(workdir, f"search_{size}.db")
+        seed_database(path, size)
+        db = Database(path)
+
+        # Редкое слово берём из первой задачи, чтобы совпадения точно были
+        rare = db.get_task_by_id(BENCH_USER_ID, 1).title.split()[-1]
+        queries = {"rare": rare, "common": WORDS[0], "two_words": f"{WORDS[1]} {WORDS[2]}"}
+
+        for label, query in queries.items():
+            fts_ids = {task.id for task in db.search_tasks(BENCH_USER_ID, query)}
+            matches = len(fts_ids)
+            if " " not in query:
+                # LIKE ищет подстроку, FTS — слова, поэтому FTS находит подмножество
+                assert fts_ids <= {row[0] for row in like_search(path, query)}
+
+            for name, fn in (
+                ("like", lambda: like_search(path, query)),
+                ("fts5", lambda: db.search_tasks(BENCH_USER_ID, query)),
+            ):
+                row = {"bench": "search", "size": size, "query": label, "variant": name, "matches": matches,
+                       **measure(fn)}
+                results.append(row)
+                print(f"search size={size:>8} {label:<9} {name:<5} matches={matches:>7} "
+                      f"min={row['min_ms']:9.2f}ms median={row['median_ms']:9.2f}ms")
+
+    return results
+
+
+def _dict_from_row(row) -> dict:
+    """Прежнее представление задачи: словарь на каждую строку"""
+    return {
+        "id": row[0],
+        "title": row[1],
+        "description": row[2],
+        "deadline": datetime.fromtimestamp(row[3]),
+        "status": row[4],
+        "created_at": datetime.fromtimestamp(row[5])
+    }
+
+
+def bench_memory(sizes, workdir: str) -> list:
+    """Память и время на материализацию списка задач: dict против Task"""
+    results = []
+
+    for size in sizes:
+        path = os.path.join(workdir, f"memory_{size}.db")
+        seed_database(path, size)
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE task SET status = 'pending'")
+        conn.commit()
+
+        for name, factory in (("dict", _dict_from_row), ("task_slots", Task.from_row)):
+            rows = conn.execute(ACTIVE_TASKS_SQL, (BENCH_USER_ID,)).fetchall()
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            tasks = [factory(row) for row in rows]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            row = {
+                "bench": "memory", "size": size, "variant": name, "rows": len(tasks),
+                "retained_bytes": retained, "peak_bytes": peak,
+                "bytes_per_task": retained / max(len(tasks), 1), "build_ms": elapsed_ms,
+            }
+            results.append(row)
+            print(f"memory size={size:>8} {name:<10} retained={retained / 2**20:8.1f}MiB "
+                  f"per_task={row['bytes_per_task']:7.1f}B build={elapsed_ms:8.1f}ms")
+            del tasks, rows
+
+        conn.close()
+
+    return results
+
+
+class TracingDatabase(Database):
+    """Database, запоминающий каждый выполненный SQL (с подставленными параметрами)"""
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        self.statements = []
+
+    def _get_connection(self):
+        conn = super()._get_connection()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+FULL_SCAN_RE = re.compile(r"SCAN task\b(?! USING)")
+
+# Запросы, которым полный просмотр таблицы пока допустим
+PLAN_EXCEPTIONS = set()
+
+# Запросы без параметров, которые должны идти по конкретному (частичному) индексу
+PLAN_INDEXES = {
+    RECURRING_PENDING_SQL: "idx_task_recurring_status_deadline",
+}
+
+
+async def _tap_statuses(db: AsyncDatabase, ops: int, concurrency: int, tasks: int):
+    """ops нажатий «Начать»/«Выполнено» от concurrency одновременных пользователей"""
+    statuses = ("running", "completed")
+
+    async def tapper(worker: int):
+        for i in range(worker, ops, concurrency):
+            await db.update_task_status(BENCH_USER_ID, i % tasks + 1, statuses[i % 2])
+
+    await db.connect()
+    started = time.perf_counter()
+    await asyncio.gather(*(tapper(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await db.close()
+
+    return elapsed
+
+
+def bench_writes(ops: int, workdir: str) -> list:
+    """Пропускная способность записей: коммит на каждую запись против group commit"""
+    results = []
+    tasks = 10_000
+    path = os.path.join(workdir, "writes.db")
+
+    def report(variant: str, concurrency: int, elapsed: float):
+        row = {"bench": "writes", "ops": ops, "concurrency": concurrency, "variant": variant,
+               "ops_per_s": ops / elapsed}
+        results.append(row)
+        print(f"writes ops={ops} concurrency={concurrency:>4} {variant:<22} {row['ops_per_s']:10.0f} ops/s")
+
+    seed_database(path, tasks)
+    db = Database(path)
+    started = time.perf_counter()
+    for i in range(ops):
+        db.update_task_status(BENCH_USER_ID, i % tasks + 1, ("running", "completed")[i % 2])
+    report("sync_connect_per_call", 1, time.perf_counter() - started)
+
+    for concurrency in (1, 10, 100):
+        for variant, make_db in (
+            ("async_commit_each", lambda: AsyncDatabase(path, commit_interval=0, max_batch=1)),
+            ("async_group_commit", lambda: AsyncDatabase(path)),
+        ):
+            seed_database(path, tasks)
+            report(variant, concurrency, asyncio.run(_tap_statuses(make_db(), ops, concurrency, tasks)))
+
+    return results
+
+
+def database_calls() -> dict:
+    """Вызов каждого публичного метода Database на данных seed_database (для plans и methods)"""
+    # Удаления берут новые id при каждом вызове, чтобы повторы не били в пустоту
+    fresh_ids = itertools.count(2)
+
+    return {
+        "get_all_tasks": lambda db: db.get_all_tasks(BENCH_USER_ID),
+        "get_all_tasks(status)": lambda db: db.get_all_tasks(BENCH_USER_ID, "running"),
+        "get_all_tasks(completed)": lambda db: db.get_all_tasks(BENCH_USER_ID, "completed"),
+        "get_tasks_page": lambda db: db.get_tasks_page(BENCH_USER_ID),
+        "get_tasks_page(after)": lambda db: db.get_tasks_page(BENCH_USER_ID, after=(0, 0)),
+        "get_tasks_page(before)": lambda db: db.get_tasks_page(BENCH_USER_ID, before=(2 ** 40, 0)),
+        "get_today_tasks": lambda db: db.get_today_tasks(BENCH_USER_ID),
+        "get_overdue_tasks": lambda db: db.get_overdue_tasks(BENCH_USER_ID),
+        "get_upcoming_tasks": lambda db: db.get_upcoming_tasks(BENCH_USER_ID),
+        "get_pending_tasks_from": lambda db: db.get_pending_tasks_from(datetime.now()),
+        "get_reminded": lambda db: db.get_reminded(datetime.now()),
+        "change_watermark": lambda db: db.change_watermark(),
+        "get_changed_tasks": lambda db: db.get_changed_tasks(db.change_watermark()),
+        "get_next_pending_deadline": lambda db: db.get_next_pending_deadline(BENCH_USER_ID, 0),
+        "get_task_by_id": lambda db: db.get_task_by_id(BENCH_USER_ID, 1),
+        "get_dashboard_stats": lambda db: db.get_dashboard_stats(BENCH_USER_ID),
+        "get_stats": lambda db: db.get_stats(BENCH_USER_ID),
+        "get_weekly_stats": lambda db: db.get_weekly_stats(BENCH_USER_ID),
+        "search_tasks": lambda db: db.search_tasks(BENCH_USER_ID, "отчет"),
+        "iter_tasks": lambda db: sum(1 for _ in db.iter_tasks(BENCH_USER_ID)),
+        "create_task": lambda db: db.create_task(BENCH_USER_ID, "bench", None, datetime.now() + timedelta(days=1)),
+        "import_tasks": lambda db: db.import_tasks(
+            BENCH_USER_ID, [("bench", None, to_timestamp(datetime.now()), "pending")] * 100
+        ),
+        "update_task_status": lambda db: db.update_task_status(BENCH_USER_ID, 1, "running"),
+        "update_tasks_status": lambda db: db.update_tasks_status(BENCH_USER_ID, [3, 4, 5], "completed"),
+        "set_recurrence": lambda db: db.set_recurrence(BENCH_USER_ID, 1, "weekly"),
+        "mark_reminded": lambda db: db.mark_reminded(db.get_all_tasks(BENCH_USER_ID, "pending")[:10]),
+        "reschedule_task": lambda db: db.reschedule_task(BENCH_USER_ID, 1, datetime.now() + timedelta(days=7)),
+        "delete_task": lambda db: db.delete_task(BENCH_USER_ID, next(fresh_ids)),
+        "delete_tasks": lambda db: db.delete_tasks(BENCH_USER_ID, [next(fresh_ids) for _ in range(3)]),
+        # Порог в прошлом: план проверяется, данные для остальных вызовов не меняются
+        "archive_completed": lambda db: db.archive_completed(0),
+    }
+
+
+def bench_methods(sizes, workdir: str) -> list:
+    """Время каждого метода Database"""
+    results = []
+
+    for size in sizes:
+        path = os.path.join(workdir, f"methods_{size}.db")
+        seed_database(path, size)
+        db = Database(path)
+
+        for name, call in database_calls().items():
+            row = {"bench": "methods", "size": size, "variant": name, **measure(lambda: call(db))}
+            results.append(row)
+            print(f"methods size={size:>8} {name:<26} min={row['min_ms']:9.2f}ms median={row['median_ms']:9.2f}ms")
+
+    return results
+
+
+class FakeMessage:
+    """Message для вызова обработчиков без Telegram: ответы складываются в sent"""
+
+    def __init__(self, text: str = "", reply_markup=None):
+        self.text = text
+        self.from_user = self.chat = SimpleNamespace(id=BENCH_USER_ID)
+        self.reply_markup = reply_markup
+        self.document = None
+        self.sent = []
+
+    async def answer(self, text, **kwargs):
+        self.sent.append(text)
+        return self
+
+    async def answer_document(self, document, caption=None, **kwargs):
+        self.sent.append(caption)
+        return self
+
+    async def edit_text(self, text, reply_markup=None, **kwargs):
+        self.sent.append(text)
+        self.reply_markup = reply_markup
+        return self
+
+    async def edit_reply_markup(self, reply_markup=None, **kwargs):
+        self.reply_markup = reply_markup
+        return self
+
+
+class FakeCallback:
+    """CallbackQuery с FakeMessage"""
+
+    def __init__(self, data: str, message: FakeMessage = None):
+        self.data = data
+        self.from_user = SimpleNamespace(id=BENCH_USER_ID)
+        self.message = message or FakeMessage()
+
+    async def answer(self, text=None, **kwargs):
+        pass
+
+
+async def measure_async(fn, repeat: int = 5) -> dict:
+    """Время выполнения корутины fn() в миллисекундах"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {"min_ms": min(timings), "median_ms": statistics.median(timings)}
+
+
+def handler_calls(bot_module) -> dict:
+    """Обработчики bot.py с фейковыми Message/CallbackQuery"""
+    from aiogram.filters import CommandObject
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    from callbacks import Direction, DoneTask, PageNav, PickDate, PickTime, SelectPage
+
+    def dispatch(callback, state=None):
+        # Как в боте: callback_data разбирается и маршрутизируется CallbackTable
+        return bot_module.callbacks.dispatch(callback, state)
+
+    async def add_task_wizard():
+        state = FSMContext(MemoryStorage(), StorageKey(bot_id=0, chat_id=BENCH_USER_ID, user_id=BENCH_USER_ID))
+        await bot_module.btn_add(FakeMessage("➕ Добавить"), state)
+        await bot_module.process_title(FakeMessage("Бенчмарк"), state)
+        await bot_module.process_description(FakeMessage("Описание"), state)
+        await dispatch(FakeCallback(PickDate(year=datetime.now().year + 1, month=1, day=15).pack()), state)
+        await dispatch(FakeCallback(PickTime(hour=10, minute=0).pack()), state)
+
+    return {
+        "cmd_start": lambda: bot_module.cmd_start(FakeMessage("/start")),
+        "btn_today": lambda: bot_module.btn_today(FakeMessage("📅 Сегодня")),
+        "btn_overdue": lambda: bot_module.btn_overdue(FakeMessage("⚠️ Просроченные")),
+        "btn_all_tasks": lambda: bot_module.btn_all_tasks(FakeMessage("📋 Все задачи")),
+        "process_page": lambda: dispatch(FakeCallback(PageNav(direction=Direction.NEXT, deadline=0, task_id=0).pack())),
+        "process_select": lambda: dispatch(FakeCallback(SelectPage(deadline=0, task_id=0).pack())),
+        "btn_stats": lambda: bot_module.btn_stats(FakeMessage("📊 Статистика")),
+        "cmd_reminder": lambda: bot_module.cmd_reminder(FakeMessage("/reminder")),
+        "cmd_search": lambda: bot_module.cmd_search(FakeMessage("/search отчет")),
+        "cmd_repeat": lambda: bot_module.cmd_repeat(FakeMessage("/repeat 2 daily"), CommandObject(command="repeat", args="2 daily")),
+        "cmd_export": lambda: bot_module.cmd_export(FakeMessage("/export"), CommandObject(command="export", args="csv")),
+        "add_task_wizard": add_task_wizard,
+        "process_done": lambda: dispatch(FakeCallback(DoneTask(task_id=1).pack())),
+    }
+
+
+def bench_handlers(sizes, workdir: str) -> list:
+    """Обработчики bot.py целиком: БД (через TaskCache, как в боте) + форматирование ответа"""
+    # bot.py читает DB_PATH при импорте: направляем его во временный каталог
+    bot_db = os.path.join(workdir, "bot.db")
+    os.environ["TASKFLOW_DB_PATH"] = bot_db
+    try:
+        import bot as bot_module
+    except ImportError as e:
+        print(f"handlers: bot.py не импортируется ({e}), пропуск")
+        return []
+    if os.path.abspath(bot_module.DB_PATH) != os.path.abspath(bot_db):
+        print("handlers: config.py не читает TASKFLOW_DB_PATH, пропуск")
+        return []
+
+    from cache import TaskCache
+
+    async def run(size: int, path: str) -> list:
+        rows = []
+        bot_module.db = TaskCache(AsyncDatabase(path))
+        await bot_module.db.connect()
+
+        for name, call in handler_calls(bot_module).items():
+            row = {"bench": "handlers", "size": size, "variant": name, **await measure_async(call)}
+            rows.append(row)
+            print(f"handlers size={size:>8} {name:<18} min={row['min_ms']:9.2f}ms median={row['median_ms']:9.2f}ms")
+
+        await bot_module.db.close()
+        return rows
+
+    results = []
+    for size in sizes:
+        path = os.path.join(workdir, f"handlers_{size}.db")
+        seed_database(path, size)
+        results.extend(asyncio.run(run(size, path)))
+
+    return results
+
+
+# Сравниваемая величина строки (первая найденная) -> больше значит лучше
+METRICS = {"median_ms": False, "ops_per_s": True, "retained_bytes": False}
+# Ключ строки результата — только параметры прогона, без измеренных величин
+KEY_FIELDS = ("bench", "size", "query", "variant", "ops", "concurrency")
+
+
+def result_key(row: dict) -> tuple:
+    return tuple((k, row[k]) for k in KEY_FIELDS if k in row)
+
+
+def write_results(path: str, bench: str, results: list):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    report = {
+        "bench": bench,
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def compare_results(baseline_path: str, results: list, threshold: float) -> int:
+    """Сравнить с сохранённым прогоном, вернуть число регрессий хуже threshold раз"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result_key(row): row for row in json.load(f)["results"]}
+
+    regressions = 0
+    for row in results:
+        old = baseline.get(result_key(row))
+        if old is None:
+            continue
+
+        metric = next((name for name in METRICS if name in row), None)
+        if metric is None or not old.get(metric):
+            continue
+
+        ratio = row[metric] / old[metric]
+        if METRICS[metric]:
+            ratio = 1 / ratio if ratio else float("inf")  # для ops/s больше — лучше
+
+        mark = "REGRESSION" if ratio > threshold else "ok"
+        regressions += ratio > threshold
+        label = " ".join(f"{k}={v}" for k, v in result_key(row))
+        print(f"{mark:<10} x{ratio:5.2f} {label}")
+
+    return regressions
+
+
+def check_plans(workdir: str) -> bool:
+    """Проверить планы всех запросов Database на БД с 10k задач"""
+    path = os.path.join(workdir, "plans.db")
+    seed_database(path, 10_000, users=10)
+    conn = sqlite3.connect(path)
+    conn.execute("ANALYZE")
+
+    calls = database_calls()
+
+    ok = True
+    for name, call in calls.items():
+        db = TracingDatabase(path)
+        call(db)
+
+        for sql in db.statements:
+            if sql.startswith("--"):
+                continue  # тела триггеров
+
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            if not plan:
+                continue
+
+            bad = [step for step in plan if "TEMP B-TREE" in step or FULL_SCAN_RE.match(step)]
+            index = PLAN_INDEXES.get(sql)
+            if index is not None and not any(f"INDEX {index}" in step for step in plan):
+                bad.append(f"expected {index}")
+            failed = bool(bad) and name.split("(")[0] not in PLAN_EXCEPTIONS
+            ok = ok and not failed
+
+            print(f"{'FAIL' if failed else 'ok':<4} {name}")
+            for step in plan:
+                print(f"       {step}")
+
+    conn.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bench", choices=["stats", "search", "memory", "writes", "methods", "handlers", "plans"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=2000, help="Число записей для writes")
+    parser.add_argument("--json", default=None, help="Сохранить результаты в JSON")
+    parser.add_argument("--baseline", default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Регрессия: медиана хуже в N раз")
+    parser.add_argument("--workdir", default=None, help="Каталог для сгенерированных БД")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="taskflow-bench-")
+
+    if args.bench == "plans":
+        sys.exit(0 if check_plans(workdir) else 1)
+
+    if args.bench == "stats":
+        results = bench_stats(args.sizes, workdir)
+    elif args.bench == "search":
+        results = bench_search(args.sizes, workdir)
+    elif args.bench == "memory":
+        results = bench_memory(args.sizes, workdir)
+    elif args.bench == "writes":
+        results = bench_writes(args.ops, workdir)
+    elif args.bench == "methods":
+        results = bench_methods(args.sizes, workdir)
+    else:
+        results = bench_handlers(args.sizes, workdir)
+
+    if args.json:
+        write_results(args.json, args.bench, results)
+    if args.baseline and compare_results(args.baseline, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,48 @@
 import asyncio
+import csv
+import html
+import itertools
 import logging
+import os
+import secrets
+import tempfile
+from typing import List, Optional
+import database
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from archive import Archiver
+from cache import TaskCache
+from callbacks import (
+    BulkAction, BulkOp, CalendarNav, CallbackTable, Cancel, DeleteTask, Direction, DoneTask, Ignore, PageNav,
+    PickDate, PickTime, SelectPage, StartTask, ToggleTask
+)
 from config import BOT_TOKEN, ADMIN_USER_ID, DB_PATH
-from database import Database
+from database import AsyncDatabase, ShardedDatabase, Task
 from keyboards import (
     get_main_keyboard, get_tasks_keyboard, get_cancel_keyboard,
-    get_calendar_keyboard, get_time_keyboard, get_task_actions_keyboard, get_back_keyboard
+    get_calendar_keyboard, get_time_keyboard, get_task_actions_keyboard, get_back_keyboard,
+    get_pagination_keyboard, get_selection_keyboard, toggle_selection, selected_ids,
+    menu_button_texts
+)
+from leader import LeaderLease, lease_path
+from metrics import (
+    HandlerMetricsMiddleware, name_queries, observe_query, perf_report, register_gauge, setup_routes
 )
+from recurrence import Rule
+from reminders import ReminderScheduler
+from render import (
+    OVERDUE_LINE, PAGE_LINE, SEARCH_LINE, TODAY_LINE, answer_chunks, render_chunks, render_page, render_tasks
+)
+from sender import LANES, OutboundSender
+from slowlog import SlowQueryLog
+from storage import SQLiteStorage
+from timeutil import to_timestamp
+from transfer import ExportWriter, ImportReport, detect_format, iter_import_rows
 from datetime import datetime, timedelta
 
 # Настройка логирования
@@ -22,10 +53,94 @@ logger = logging.getLogger(__name__)
 if not BOT_TOKEN:
     raise ValueError("Установите переменную окружения TASKFLOW_BOT_TOKEN с токеном бота")
 
+# Воркер supervisor.py: апдейты приходят с supervisor на 127.0.0.1:WORKER_PORT,
+# напоминания и архивацию запускает только держатель аренды (LEASE_TTL_SECONDS)
+WORKER_ID = os.getenv("TASKFLOW_WORKER_ID", "")
+WORKER_PORT = int(os.getenv("TASKFLOW_WORKER_PORT", "0"))
+WORKERS = int(os.getenv("TASKFLOW_WORKERS", "1")) if WORKER_PORT else 1
+LEASE_TTL_SECONDS = int(os.getenv("TASKFLOW_LEASE_TTL_SECONDS", "30"))
+
 # Инициализация
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-db = Database(DB_PATH)
+# Все исходящие сообщения идут через очередь с лимитами Telegram;
+# общий лимит бота (~30 сообщений/с) делится между воркерами
+sender = OutboundSender(global_rate=30.0 / WORKERS)
+bot.session.middleware(sender)
+# Состояния мастеров хранятся в той же БД; брошенные удаляются через FSM_TTL_HOURS
+FSM_TTL_HOURS = int(os.getenv("TASKFLOW_FSM_TTL_HOURS", "24"))
+storage = SQLiteStorage(DB_PATH, ttl=timedelta(hours=FSM_TTL_HOURS))
+dp = Dispatcher(storage=storage)
+# Все inline-кнопки — через одну таблицу префикс callback_data -> обработчик
+callbacks = CallbackTable()
+dp.callback_query.register(callbacks.dispatch)
+# TASKFLOW_DB_SHARDS > 1 разносит пользователей по нескольким файлам SQLite
+DB_SHARDS = int(os.getenv("TASKFLOW_DB_SHARDS", "1"))
+# Сегодня/просроченные/предстоящие отдаются из кэша до записи или ближайшего дедлайна
+db = TaskCache(ShardedDatabase(DB_PATH, DB_SHARDS) if DB_SHARDS > 1 else AsyncDatabase(DB_PATH))
+
+# Напоминание приходит за REMIND_BEFORE_MINUTES до дедлайна
+REMIND_BEFORE_MINUTES = int(os.getenv("TASKFLOW_REMIND_BEFORE_MINUTES", "60"))
+reminders = ReminderScheduler(
+    bot, db, remind_before=timedelta(minutes=REMIND_BEFORE_MINUTES),
+    # Задачи создают и другие воркеры: ведущий сверяется с БД
+    sync_interval=timedelta(seconds=LEASE_TTL_SECONDS) if WORKER_PORT else None
+)
+db.add_listener(reminders.on_task_change)
+
+# Выполненные задачи старше ARCHIVE_AFTER_DAYS уходят в task_archive (0 — не архивировать);
+# VACUUM — по cron-выражению TASKFLOW_VACUUM_CRON (пустое — не запускать)
+ARCHIVE_AFTER_DAYS = int(os.getenv("TASKFLOW_ARCHIVE_AFTER_DAYS", "30"))
+archiver = Archiver(
+    db, older_than=timedelta(days=ARCHIVE_AFTER_DAYS),
+    vacuum_cron=os.getenv("TASKFLOW_VACUUM_CRON", "0 4 * * sun")
+)
+
+# Режим webhook включается заданием публичного адреса; иначе — long polling
+WEBHOOK_URL = os.getenv("TASKFLOW_WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("TASKFLOW_WEBHOOK_PATH", "/webhook")
+# Апдейты без этого секрета в X-Telegram-Bot-Api-Secret-Token отклоняются; если он
+# не задан, на каждый запуск создаётся случайный и передаётся в set_webhook
+WEBHOOK_SECRET = os.getenv("TASKFLOW_WEBHOOK_SECRET", "") or secrets.token_urlsafe(32)
+WEBHOOK_HOST = os.getenv("TASKFLOW_WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("TASKFLOW_WEBHOOK_PORT", "8080"))
+
+# Длинные списки делятся на сообщения по 4096 символов; дальше MAX_LIST_MESSAGES — только число оставшихся
+MAX_LIST_MESSAGES = int(os.getenv("TASKFLOW_MAX_LIST_MESSAGES", "10"))
+
+# Метрики: время обработчиков и SQL, очередь отправки, кэш.
+# /metrics отдаёт отдельный сервер на METRICS_HOST:METRICS_PORT (0 — не запускать),
+# не публичный webhook; воркер supervisor.py — на своём локальном порту
+METRICS_HOST = os.getenv("TASKFLOW_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("TASKFLOW_METRICS_PORT", "9090"))
+handler_metrics = HandlerMetricsMiddleware(button_texts=menu_button_texts(), callback_label=callbacks.label)
+dp.message.middleware(handler_metrics)
+dp.callback_query.middleware(handler_metrics)
+name_queries(vars(database))
+db.add_query_hook(observe_query)
+register_gauge("taskflow_outbound_queue_depth", lambda: sender.queue_depth)
+register_gauge("taskflow_outbound_sent", lambda: sender.sent)
+register_gauge("taskflow_outbound_retried", lambda: sender.retried)
+register_gauge("taskflow_outbound_failed", lambda: sender.failed)
+# Задержка очередь + отправка по приоритетам (скользящее окно OutboundSender)
+for lane in LANES.values():
+    for quantile in ("p50", "p95"):
+        key = f"{lane}_{quantile}_ms"
+        register_gauge(f"taskflow_outbound_{key}", lambda key=key: sender.metrics().get(key, 0))
+register_gauge("taskflow_cache_hits", lambda: db.hits)
+register_gauge("taskflow_cache_misses", lambda: db.misses)
+register_gauge("taskflow_archived_tasks", lambda: archiver.archived)
+register_gauge("taskflow_failed_writes", lambda: db.failed_writes)
+
+# Журнал медленных запросов (с EXPLAIN QUERY PLAN) включается порогом в мс
+SLOW_QUERY_MS = float(os.getenv("TASKFLOW_SLOW_QUERY_MS", "0"))
+slow_log = None
+if SLOW_QUERY_MS > 0:
+    # Схема у шардов одна: план строится по первому файлу
+    slow_log = SlowQueryLog(
+        db.shards[0].db_path if DB_SHARDS > 1 else DB_PATH, SLOW_QUERY_MS,
+        log_path=os.getenv("TASKFLOW_SLOW_QUERY_LOG", "slow_queries.log")
+    )
+    db.add_query_hook(slow_log)
 
 
 # Состояния FSM
@@ -37,6 +152,10 @@ class AddTaskState(StatesGroup):
     waiting_for_manual_time = State()
 
 
+class ImportState(StatesGroup):
+    waiting_for_file = State()
+
+
 # Временное хранилище данных
 temp_data = {}
 
@@ -101,17 +220,33 @@ async def cmd_help(message: types.Message):
         "/today — Задачи на сегодня\n"
         "/overdue — Просроченные задачи\n"
         "/reminder — Напоминание о предстоящих задачах\n"
-        "/search &lt;запрос&gt; — Поиск задач",
+        "/search &lt;запрос&gt; — Поиск задач\n"
+        "/repeat &lt;id&gt; daily|weekly|monthly|off [N] — Повтор задачи (каждые N дней/недель/месяцев)\n"
+        "/import — Загрузить задачи из CSV/JSON\n"
+        "/export [csv|json] — Выгрузить задачи в файл",
         parse_mode="HTML"
     )
 
 
+# Команда /perf (только для администратора)
+@dp.message(Command("perf"))
+async def cmd_perf(message: types.Message):
+    """Самые медленные обработчики и запросы с момента запуска"""
+    if not ADMIN_USER_ID or message.from_user.id != int(ADMIN_USER_ID):
+        return
+
+    text = perf_report()
+    if slow_log is not None:
+        text += f"\n\n🐢 <b>Медленные запросы</b> (≥{SLOW_QUERY_MS:g}мс):\n<pre>{html.escape(slow_log.report(5))}</pre>"
+    await message.answer(text, parse_mode="HTML")
+
+
 # Команда /reminder
 @dp.message(Command("reminder"))
 async def cmd_reminder(message: types.Message):
     """Напоминание о предстоящих задачах"""
-    tasks_24h = db.get_upcoming_tasks(hours=24)
-    overdue_tasks = db.get_overdue_tasks()
+    tasks_24h = await db.get_upcoming_tasks(message.from_user.id, hours=24)
+    overdue_tasks = await db.get_overdue_tasks(message.from_user.id)
 
     if not tasks_24h and not overdue_tasks:
         await message.answer(
@@ -121,33 +256,31 @@ async def cmd_reminder(message: types.Message):
         )
         return
 
-    text = "🔔 <b>Напоминание:</b>\n\n"
+    now = datetime.now()
+    lines = []
 
     # Сначала просроченные
     if overdue_tasks:
-        text += "⚠️ <b>Просроченные задачи:</b>\n"
+        lines.append("⚠️ <b>Просроченные задачи:</b>\n")
         for task in overdue_tasks[:5]:  # Максимум 5 просроченных
-            deadline_str = task["deadline"].split(".")[0]
-            deadline = datetime.strptime(deadline_str, "%Y-%m-%d %H:%M:%S")
-            hours_overdue = int((datetime.now() - deadline).total_seconds() / 3600)
-            text += f"   ❌ {task['title']}\n"
-            text += f"      Просрочено на {hours_overdue}ч\n\n"
+            hours_overdue = int((now - task.deadline).total_seconds() / 3600)
+            lines.append(f"   ❌ {html.escape(task.title, quote=False)}\n      Просрочено на {hours_overdue}ч\n\n")
 
     # Затем предстоящие
     if tasks_24h:
-        text += "⏰ <b>Предстоящие задачи (24ч):</b>\n"
+        lines.append("⏰ <b>Предстоящие задачи (24ч):</b>\n")
         for task in tasks_24h[:10]:  # Максимум 10 задач
-            deadline_str = task["deadline"].split(".")[0]
-            deadline = datetime.strptime(deadline_str, "%Y-%m-%d %H:%M:%S")
-            hours_left = int((deadline - datetime.now()).total_seconds() / 3600)
+            hours_left = int((task.deadline - now).total_seconds() / 3600)
             time_str = f"{hours_left}ч" if hours_left > 0 else "< 1ч"
-            text += f"   {task['title']}\n"
-            text += f"      Осталось: {time_str}\n\n"
+            lines.append(f"   {html.escape(task.title, quote=False)}\n      Осталось: {time_str}\n\n")
 
     if len(tasks_24h) > 10:
-        text += f"... и ещё {len(tasks_24h) - 10} задач\n"
+        lines.append(f"... и ещё {len(tasks_24h) - 10} задач\n")
 
-    await message.answer(text, parse_mode="HTML", reply_markup=get_main_keyboard())
+    await answer_chunks(
+        message, render_chunks(lines, "🔔 <b>Напоминание:</b>\n\n"),
+        parse_mode="HTML", reply_markup=get_main_keyboard()
+    )
 
 
 # Команда /search
@@ -169,7 +302,8 @@ async def cmd_search(message: types.Message):
         )
         return
 
-    tasks = db.search_tasks(text)
+    tasks = await db.search_tasks(message.from_user.id, text)
+    text = html.escape(text, quote=False)
 
     if not tasks:
         await message.answer(
@@ -179,19 +313,143 @@ async def cmd_search(message: types.Message):
         )
         return
 
-    result_text = f"🔍 <b>Результаты поиска:</b> {text}\n\n"
+    # Максимум 15 задач
+    chunks = render_tasks(tasks[:15], SEARCH_LINE, f"🔍 <b>Результаты поиска:</b> {text}\n\n")
+    if len(tasks) > 15:
+        chunks = itertools.chain(chunks, [f"... и ещё {len(tasks) - 15} задач\n"])
 
-    for i, task in enumerate(tasks[:15], 1):  # Максимум 15 задач
-        status_emoji = {"pending": "⏳", "running": "▶️"}.get(task["status"], "❓")
-        deadline_str = task["deadline"].split(".")[0]
-        deadline = datetime.strptime(deadline_str, "%Y-%m-%d %H:%M:%S")
-        result_text += f"{i}. {status_emoji} {task['title']}\n"
-        result_text += f"   ⏰ {deadline.strftime('%d.%m.%Y %H:%M')}\n\n"
+    await answer_chunks(message, render_chunks(chunks), parse_mode="HTML", reply_markup=get_main_keyboard())
 
-    if len(tasks) > 15:
-        result_text += f"... и ещё {len(tasks) - 15} задач\n"
 
-    await message.answer(result_text, parse_mode="HTML", reply_markup=get_main_keyboard())
+# Команда /repeat
+# Частота -> (каждый раз, каждые N)
+REPEAT_NAMES = {
+    "daily": ("каждый день", "раз в {} дн."),
+    "weekly": ("каждую неделю", "раз в {} нед."),
+    "monthly": ("каждый месяц", "раз в {} мес."),
+}
+
+
+@dp.message(Command("repeat"))
+async def cmd_repeat(message: types.Message, command: CommandObject):
+    """Сделать задачу повторяющейся или снова разовой"""
+    args = (command.args or "").split()
+    if len(args) not in (2, 3) or not args[0].isdigit():
+        await message.answer(
+            "🔁 <b>Повтор задачи</b>\n\n"
+            "Использование: /repeat &lt;id&gt; daily|weekly|monthly|off [N]\n\n"
+            "Примеры:\n"
+            "• /repeat 12 daily — каждый день\n"
+            "• /repeat 12 weekly 2 — раз в две недели\n"
+            "• /repeat 12 off — больше не повторять",
+            parse_mode="HTML"
+        )
+        return
+
+    task_id = int(args[0])
+    task = await db.get_task_by_id(message.from_user.id, task_id)
+    if task is None:
+        await message.answer("❌ Задача не найдена", reply_markup=get_main_keyboard())
+        return
+
+    if args[1].lower() == "off":
+        await db.set_recurrence(message.from_user.id, task_id, None)
+        await message.answer(f"✅ Задача [{task_id}] больше не повторяется", reply_markup=get_main_keyboard())
+        return
+
+    try:
+        rule = Rule.parse(":".join(args[1:])).anchored(task.deadline)
+    except ValueError:
+        await message.answer("❌ Повтор: daily, weekly или monthly и число N ≥ 1", reply_markup=get_main_keyboard())
+        return
+
+    await db.set_recurrence(message.from_user.id, task_id, str(rule))
+    once, every = REPEAT_NAMES[rule.freq]
+    await message.answer(
+        f"🔁 Задача [{task_id}] повторяется {once if rule.interval == 1 else every.format(rule.interval)}\n"
+        f"⏰ Ближайшее: {task.deadline.strftime('%d.%m.%Y %H:%M')}",
+        reply_markup=get_main_keyboard()
+    )
+
+
+# Команда /import
+@dp.message(Command("import"))
+async def cmd_import(message: types.Message, state: FSMContext):
+    await message.answer(
+        "📥 Отправьте файл .csv или .json с задачами.\n\n"
+        "Поля: title, description, deadline (2026-05-01 18:00 или 01.05.2026 18:00), "
+        "status (необязательно: pending, running, completed)",
+        reply_markup=get_cancel_keyboard()
+    )
+    await state.set_state(ImportState.waiting_for_file)
+
+
+# Файл для импорта: читается с диска потоком, вставляется кусками
+@dp.message(ImportState.waiting_for_file)
+async def process_import_file(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("Отменено", reply_markup=get_main_keyboard())
+        return
+
+    document = message.document
+    fmt = detect_format(document.file_name) if document else None
+    if fmt is None:
+        await message.answer("Нужен файл .csv или .json", reply_markup=get_cancel_keyboard())
+        return
+
+    await state.clear()
+    await message.answer("⏳ Импортирую...")
+
+    report = ImportReport()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "import")
+        await bot.download(document, destination=path)
+
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                rows = iter_import_rows(f, fmt, report)
+                report.imported = await db.import_tasks(message.from_user.id, rows)
+        except (ValueError, csv.Error) as e:
+            logger.warning("Import failed for user %s: %s", message.from_user.id, e)
+            await message.answer(
+                "❌ Не удалось разобрать файл. Строки до ошибки могли быть добавлены.",
+                reply_markup=get_main_keyboard()
+            )
+            return
+
+    text = f"✅ Импортировано задач: {report.imported}"
+    if report.skipped:
+        text += f"\nПропущено строк: {report.skipped}\n\n" + "\n".join(report.errors)
+
+    await message.answer(text, reply_markup=get_main_keyboard())
+
+
+# Команда /export: задачи пишутся в файл прямо с курсора
+@dp.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject):
+    fmt = (command.args or "csv").strip().lower()
+    if fmt not in ("csv", "json"):
+        await message.answer("Использование: /export [csv|json]", reply_markup=get_main_keyboard())
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"tasks.{fmt}")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = ExportWriter(f, fmt)
+            async for task in db.iter_tasks(message.from_user.id):
+                writer.write(task)
+            writer.close()
+
+        if not writer.count:
+            await message.answer("Задач нет! ✅", reply_markup=get_main_keyboard())
+            return
+
+        await message.answer_document(
+            types.FSInputFile(path, filename=f"tasks.{fmt}"),
+            caption=f"📤 Задач: {writer.count}",
+            reply_markup=get_main_keyboard()
+        )
 
 
 # ➕ Добавить задачу
@@ -237,18 +495,13 @@ async def process_description(message: types.Message, state: FSMContext):
 
 
 # Выбор даты (inline callback)
-@dp.callback_query(F.data.startswith("date_"))
-async def process_date(callback: types.CallbackQuery, state: FSMContext):
-    data_parts = callback.data.split("_")
-    year = int(data_parts[1])
-    month = int(data_parts[2])
-    day = int(data_parts[3])
-    
-    date = datetime(year, month, day)
+@callbacks.route(PickDate)
+async def process_date(callback: types.CallbackQuery, callback_data: PickDate, state: FSMContext):
+    date = datetime.combine(callback_data.date, datetime.min.time())
     await state.update_data(date=date)
     
     await callback.message.edit_text(
-        f"Выбрана дата: {day:02d}.{month:02d}.{year}\n\nВыберите время:",
+        f"Выбрана дата: {date.strftime('%d.%m.%Y')}\n\nВыберите время:",
         reply_markup=get_time_keyboard()
     )
     
@@ -257,11 +510,9 @@ async def process_date(callback: types.CallbackQuery, state: FSMContext):
 
 
 # Выбор времени (inline callback)
-@dp.callback_query(F.data.startswith("time_"))
-async def process_time(callback: types.CallbackQuery, state: FSMContext):
-    time_str = callback.data.split("_")[1]
-    
-    if time_str == "manual":
+@callbacks.route(PickTime)
+async def process_time(callback: types.CallbackQuery, callback_data: PickTime, state: FSMContext):
+    if callback_data.manual:
         await callback.message.edit_text(
             "Введите время в формате ЧЧ:ММ (например, 14:30):"
         )
@@ -269,18 +520,16 @@ async def process_time(callback: types.CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
-    # Парсим время
-    hour, minute = map(int, time_str.split(":"))
-    
     # Получаем данные из состояния
     data = await state.get_data()
     date = data["date"]
     
     # Создаём дедлайн
-    deadline = date.replace(hour=hour, minute=minute)
+    deadline = date.replace(hour=callback_data.hour, minute=callback_data.minute)
     
     # Создаём задачу
-    task_id = db.create_task(
+    task_id = await db.create_task(
+        callback.from_user.id,
         title=data["title"],
         description=data["description"],
         deadline=deadline
@@ -320,7 +569,8 @@ async def process_manual_time(message: types.Message, state: FSMContext):
         deadline = date.replace(hour=hour, minute=minute)
         
         # Создаём задачу
-        task_id = db.create_task(
+        task_id = await db.create_task(
+            message.from_user.id,
             title=data["title"],
             description=data["description"],
             deadline=deadline
@@ -343,35 +593,23 @@ async def process_manual_time(message: types.Message, state: FSMContext):
 
 
 # Навигация по календарю
-@dp.callback_query(F.data.startswith("cal_"))
-async def process_calendar_navigation(callback: types.CallbackQuery):
-    data_parts = callback.data.split("_")
-    year = int(data_parts[1])
-    month = int(data_parts[2])
-    
-    # Корректируем месяц
-    if month == 0:
-        month = 12
-        year -= 1
-    elif month == 13:
-        month = 1
-        year += 1
-    
+@callbacks.route(CalendarNav)
+async def process_calendar_navigation(callback: types.CallbackQuery, callback_data: CalendarNav):
     await callback.message.edit_reply_markup(
-        reply_markup=get_calendar_keyboard(year, month)
+        reply_markup=get_calendar_keyboard(callback_data.year, callback_data.month)
     )
     await callback.answer()
 
 
 # Игнорируемые callback
-@dp.callback_query(F.data == "ignore")
-async def process_ignore(callback: types.CallbackQuery):
+@callbacks.route(Ignore)
+async def process_ignore(callback: types.CallbackQuery, callback_data: Ignore):
     await callback.answer()
 
 
 # Отмена
-@dp.callback_query(F.data == "cancel")
-async def process_cancel(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.route(Cancel)
+async def process_cancel(callback: types.CallbackQuery, callback_data: Cancel, state: FSMContext):
     await state.clear()
     await callback.message.edit_text("Отменено")
     await callback.message.answer("Главное меню:", reply_markup=get_main_keyboard())
@@ -387,70 +625,141 @@ async def btn_tasks(message: types.Message):
 # 📅 Сегодня
 @dp.message(F.text == "📅 Сегодня")
 async def btn_today(message: types.Message):
-    tasks = db.get_today_tasks()
+    tasks = await db.get_today_tasks(message.from_user.id)
     
     if not tasks:
         await message.answer("На сегодня задач нет! ✅", reply_markup=get_main_keyboard())
         return
     
-    text = "📅 Задачи на сегодня:\n\n"
-    for task in tasks:
-        status_emoji = {"pending": "⏳", "running": "▶️", "completed": "✅"}.get(task["status"], "❓")
-        deadline_str = task["deadline"].split(".")[0]  # Убираем микросекунды
-        deadline = datetime.strptime(deadline_str, "%Y-%m-%d %H:%M:%S")
-        text += f"{status_emoji} [{task['id']}] {task['title']}\n"
-        text += f"   ⏰ {deadline.strftime('%H:%M')}\n\n"
-    
-    await message.answer(text, reply_markup=get_main_keyboard())
+    chunks = render_tasks(tasks, TODAY_LINE, "📅 Задачи на сегодня:\n\n", MAX_LIST_MESSAGES)
+    await answer_chunks(message, chunks, reply_markup=get_main_keyboard())
 
 
 # ⚠️ Просроченные
 @dp.message(F.text == "⚠️ Просроченные")
 async def btn_overdue(message: types.Message):
-    tasks = db.get_overdue_tasks()
+    tasks = await db.get_overdue_tasks(message.from_user.id)
     
     if not tasks:
         await message.answer("Нет просроченных задач! ✅", reply_markup=get_main_keyboard())
         return
     
-    text = "⚠️ Просроченные задачи:\n\n"
-    for task in tasks:
-        deadline_str = task["deadline"].split(".")[0]  # Убираем микросекунды
-        deadline = datetime.strptime(deadline_str, "%Y-%m-%d %H:%M:%S")
-        text += f"❌ [{task['id']}] {task['title']}\n"
-        text += f"   ⏰ Было: {deadline.strftime('%d.%m.%Y %H:%M')}\n\n"
-    
-    await message.answer(text, reply_markup=get_main_keyboard())
+    chunks = render_tasks(tasks, OVERDUE_LINE, "⚠️ Просроченные задачи:\n\n", MAX_LIST_MESSAGES)
+    await answer_chunks(message, chunks, reply_markup=get_main_keyboard())
 
 
 # 📋 Все задачи
+def format_tasks_page(page) -> str:
+    return render_page(page.tasks, PAGE_LINE, "📋 Все активные задачи:\n\n")
+
+
+def get_page_keyboard(page):
+    # Страница начинается сразу «после» (deadline, id - 1) своей первой задачи
+    first = page.tasks[0]
+    select_cursor = (to_timestamp(first.deadline), first.id - 1)
+
+    return get_pagination_keyboard(page.prev_cursor, page.next_cursor, select_cursor)
+
+
 @dp.message(F.text == "📋 Все задачи")
 async def btn_all_tasks(message: types.Message):
-    tasks = db.get_all_tasks()
+    page = await db.get_tasks_page(message.from_user.id)
     
-    if not tasks:
+    if not page.tasks:
         await message.answer("Активных задач нет! ✅", reply_markup=get_main_keyboard())
         return
-    
-    text = "📋 Все активные задачи:\n\n"
-    for task in tasks[:20]:  # Показываем первые 20
-        status_emoji = {"pending": "⏳", "running": "▶️", "completed": "✅"}.get(task["status"], "❓")
-        deadline_str = task["deadline"].split(".")[0]  # Убираем микросекунды
-        deadline = datetime.strptime(deadline_str, "%Y-%m-%d %H:%M:%S")
-        text += f"{status_emoji} [{task['id']}] {task['title']}\n"
-        text += f"   ⏰ {deadline.strftime('%d.%m.%Y %H:%M')}\n\n"
-    
-    if len(tasks) > 20:
-        text += f"... и ещё {len(tasks) - 20} задач"
-    
-    await message.answer(text, reply_markup=get_main_keyboard())
+
+    await message.answer(format_tasks_page(page), reply_markup=get_page_keyboard(page))
+    await message.answer("Главное меню:", reply_markup=get_main_keyboard())
+
+
+# Листание списка задач (inline callback)
+@callbacks.route(PageNav)
+async def process_page(callback: types.CallbackQuery, callback_data: PageNav):
+    cursor = (callback_data.deadline, callback_data.task_id)
+
+    if callback_data.direction is Direction.NEXT:
+        page = await db.get_tasks_page(callback.from_user.id, after=cursor)
+    else:
+        page = await db.get_tasks_page(callback.from_user.id, before=cursor)
+
+    if not page.tasks:
+        await callback.answer("Больше задач нет")
+        return
+
+    await callback.message.edit_text(format_tasks_page(page), reply_markup=get_page_keyboard(page))
+    await callback.answer()
+
+
+# Множественный выбор задач текущей страницы
+@callbacks.route(SelectPage)
+async def process_select(callback: types.CallbackQuery, callback_data: SelectPage):
+    page = await db.get_tasks_page(callback.from_user.id, after=(callback_data.deadline, callback_data.task_id))
+
+    if not page.tasks:
+        await callback.answer("Задач нет")
+        return
+
+    await callback.message.edit_text(
+        "☑️ Отметьте задачи и выберите действие:",
+        reply_markup=get_selection_keyboard(page.tasks)
+    )
+    await callback.answer()
+
+
+@callbacks.route(ToggleTask)
+async def process_toggle(callback: types.CallbackQuery, callback_data: ToggleTask):
+    await callback.message.edit_reply_markup(
+        reply_markup=toggle_selection(callback.message.reply_markup, callback_data.task_id)
+    )
+    await callback.answer()
+
+
+def next_deadline(task: Task) -> datetime:
+    """Дедлайн повторяющейся задачи после выполнения текущего вхождения"""
+    return Rule.parse(task.recurrence).next_after(task.deadline, max(task.deadline, datetime.now()))
+
+
+async def complete_tasks(user_id: int, task_ids: List[int]) -> int:
+    """Выполнить задачи: разовые — одним UPDATE, повторяющиеся переходят на следующее вхождение"""
+    tasks = await asyncio.gather(*(db.get_task_by_id(user_id, task_id) for task_id in task_ids))
+    series = [task for task in tasks if task is not None and task.recurrence]
+    rescheduled = await asyncio.gather(*(db.reschedule_task(user_id, task.id, next_deadline(task)) for task in series))
+
+    recurring = {task.id for task in series}
+    once = [task_id for task_id in task_ids if task_id not in recurring]
+    return await db.update_tasks_status(user_id, once, "completed") + sum(rescheduled)
+
+
+# Действие над отмеченными задачами — один UPDATE/DELETE (повторяющиеся при выполнении — по одной)
+@callbacks.route(BulkAction)
+async def process_bulk(callback: types.CallbackQuery, callback_data: BulkAction):
+    task_ids = selected_ids(callback.message.reply_markup)
+
+    if not task_ids:
+        await callback.answer("Ничего не выбрано")
+        return
+
+    user_id = callback.from_user.id
+
+    if callback_data.op is BulkOp.DELETE:
+        count = await db.delete_tasks(user_id, task_ids)
+        text = f"🗑 Удалено задач: {count}"
+    elif callback_data.op is BulkOp.DONE:
+        count = await complete_tasks(user_id, task_ids)
+        text = f"✅ Выполнено задач: {count}"
+    else:
+        count = await db.update_tasks_status(user_id, task_ids, "running")
+        text = f"▶️ В работе задач: {count}"
+
+    await callback.message.edit_text(text)
+    await callback.answer()
 
 
 # 📊 Статистика
 @dp.message(F.text == "📊 Статистика")
 async def btn_stats(message: types.Message):
-    stats = db.get_stats()
-    weekly = db.get_weekly_stats()
+    stats = await db.get_dashboard_stats(message.from_user.id)
 
     text = "📊 <b>Статистика:</b>\n\n"
 
@@ -464,9 +773,9 @@ async def btn_stats(message: types.Message):
 
     # Статистика за неделю
     text += "<b>За неделю:</b>\n"
-    text += f"✅ Выполнено: {weekly['completed_week']}\n"
-    text += f"📝 Создано: {weekly['created_week']}\n"
-    text += f"📅 Сегодня выполнено: {weekly['completed_today']}"
+    text += f"✅ Выполнено: {stats['completed_week']}\n"
+    text += f"📝 Создано: {stats['created_week']}\n"
+    text += f"📅 Сегодня выполнено: {stats['completed_today']}"
 
     await message.answer(text, parse_mode="HTML", reply_markup=get_main_keyboard())
 
@@ -488,11 +797,17 @@ async def btn_settings(message: types.Message):
 
 
 # Обработка inline кнопок (done, start, delete)
-@dp.callback_query(F.data.startswith("done_"))
-async def process_done(callback: types.CallbackQuery):
-    task_id = int(callback.data.split("_")[1])
-    
-    if db.update_task_status(task_id, "completed"):
+@callbacks.route(DoneTask)
+async def process_done(callback: types.CallbackQuery, callback_data: DoneTask):
+    task_id = callback_data.task_id
+    task = await db.get_task_by_id(callback.from_user.id, task_id)
+
+    if task is not None and task.recurrence:
+        # Повторяющаяся задача не закрывается: дедлайн переходит на следующее вхождение
+        deadline = next_deadline(task)
+        await db.reschedule_task(callback.from_user.id, task_id, deadline)
+        await callback.message.edit_text(f"✅ Выполнено! Следующий раз: {deadline.strftime('%d.%m.%Y %H:%M')}")
+    elif await db.update_task_status(callback.from_user.id, task_id, "completed"):
         await callback.message.edit_text("✅ Задача выполнена!")
     else:
         await callback.answer("❌ Задача не найдена")
@@ -500,11 +815,11 @@ async def process_done(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@dp.callback_query(F.data.startswith("start_"))
-async def process_start(callback: types.CallbackQuery):
-    task_id = int(callback.data.split("_")[1])
+@callbacks.route(StartTask)
+async def process_start(callback: types.CallbackQuery, callback_data: StartTask):
+    task_id = callback_data.task_id
     
-    if db.update_task_status(task_id, "running"):
+    if await db.update_task_status(callback.from_user.id, task_id, "running"):
         await callback.message.edit_text("▶️ Задача в работе!")
     else:
         await callback.answer("❌ Задача не найдена")
@@ -512,11 +827,11 @@ async def process_start(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@dp.callback_query(F.data.startswith("delete_"))
-async def process_delete(callback: types.CallbackQuery):
-    task_id = int(callback.data.split("_")[1])
+@callbacks.route(DeleteTask)
+async def process_delete(callback: types.CallbackQuery, callback_data: DeleteTask):
+    task_id = callback_data.task_id
     
-    if db.delete_task(task_id):
+    if await db.delete_task(callback.from_user.id, task_id):
         await callback.message.edit_text("🗑 Задача удалена!")
     else:
         await callback.answer("❌ Задача не найдена")
@@ -524,10 +839,134 @@ async def process_delete(callback: types.CallbackQuery):
     await callback.answer()
 
 
+# Жизненный цикл соединения с БД и планировщика напоминаний
+# (хранилище FSM закрывает сам Dispatcher при остановке)
+async def start_jobs():
+    """Фоновые задачи, которые должны идти в одном процессе"""
+    await reminders.start()
+    if ARCHIVE_AFTER_DAYS > 0:
+        archiver.start()
+
+
+async def stop_jobs():
+    reminders.shutdown()
+    archiver.shutdown()
+
+
+leader = LeaderLease(
+    lease_path(DB_PATH), holder=f"worker{WORKER_ID}:{os.getpid()}", ttl=timedelta(seconds=LEASE_TTL_SECONDS),
+    on_elected=start_jobs, on_demoted=stop_jobs
+) if WORKER_PORT else None
+if leader is not None:
+    register_gauge("taskflow_leader", lambda: int(leader.is_leader))
+
+
+async def on_startup():
+    sender.start()
+    await db.connect()
+    await storage.connect()
+    if ADMIN_USER_ID:
+        claimed = await db.claim_orphan_tasks(int(ADMIN_USER_ID))
+        if claimed:
+            logger.info("Assigned %d tasks without owner to admin %s", claimed, ADMIN_USER_ID)
+    if leader is not None:
+        await leader.start()
+    else:
+        await start_jobs()
+
+
+async def on_shutdown():
+    if leader is not None:
+        await leader.close()
+    await stop_jobs()
+    await sender.close()
+    await db.close()
+    if slow_log is not None:
+        logger.info("Top queries by total time:\n%s", slow_log.report())
+        slow_log.close()
+
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
+
+
+# Webhook: Telegram получает ответ сразу, апдейт обрабатывается в фоне
+def build_webhook_app(metrics: bool = False) -> web.Application:
+    """metrics — добавить /metrics (только для приложения на 127.0.0.1)"""
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    if metrics:
+        setup_routes(app)
+    return app
+
+
+async def start_metrics_server() -> Optional[web.AppRunner]:
+    if not METRICS_PORT:
+        return None
+
+    app = web.Application()
+    setup_routes(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    logger.info("Metrics available on http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+    return runner
+
+
+async def run_webhook():
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    metrics_runner = await start_metrics_server()
+    try:
+        await serve_webhook_app(WEBHOOK_HOST, WEBHOOK_PORT)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+async def serve_webhook_app(host: str, port: int, metrics: bool = False):
+    runner = web.AppRunner(build_webhook_app(metrics))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Webhook server listening on %s:%d%s", host, port, WEBHOOK_PATH)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
 # Запуск бота
 async def main():
     logger.info("Starting TaskFlow Scheduler Bot...")
-    await dp.start_polling(bot)
+    if WORKER_PORT:
+        # Адрес webhook в Telegram ставит supervisor, воркер только принимает пересланное
+        logger.info("Worker %s", WORKER_ID)
+        # Порт воркера локальный: метрики отдаются на нём же (METRICS_PORT у воркеров совпадал бы)
+        await serve_webhook_app("127.0.0.1", WORKER_PORT, metrics=True)
+        return
+
+    if WEBHOOK_URL:
+        await run_webhook()
+        return
+
+    runner = await start_metrics_server()
+
+    # Оставшийся от webhook-режима адрес не даст получать апдейты через polling
+    await bot.delete_webhook()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""Read-through кэш выборок «Сегодня», «Просроченные» и «Предстоящие».
+
+Результат этих выборок меняется только при записи задач пользователя или
+когда время пересекает границу: полночь для «Сегодня», ближайший дедлайн
+ожидающей задачи для «Просроченных» и края окна для «Предстоящих». Каждая
+запись кэша живёт ровно до такой границы, а изменения задач (TaskChange)
+сбрасывают все записи пользователя.
+"""
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from database import Task, TaskChange
+from timeutil import day_bounds, now_timestamp, to_timestamp
+
+NEVER = float("inf")
+
+
+class TaskCache:
+    """Обёртка над AsyncDatabase/ShardedDatabase; остальные методы проксируются как есть"""
+
+    def __init__(self, db, max_users: int = 10000):
+        self.db = db
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, Dict[tuple, Tuple[float, List[Task]]]]" = OrderedDict()
+        # Меняется при каждой инвалидации: результат, прочитанный до записи, не кэшируется
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        db.add_listener(self.on_task_change)
+
+    def __getattr__(self, name: str):
+        return getattr(self.db, name)
+
+    def on_task_change(self, change: TaskChange):
+        self.invalidate(change.user_id)
+
+    def invalidate(self, user_id: int):
+        self._version += 1
+        self._entries.pop(user_id, None)
+
+    async def _get(self, user_id: int, key: tuple, load: Callable[[int], Awaitable[Tuple[List[Task], float]]]) -> List[Task]:
+        now = now_timestamp()
+        user_entries = self._entries.get(user_id)
+
+        if user_entries is not None:
+            entry = user_entries.get(key)
+            if entry is not None and now < entry[0]:
+                self.hits += 1
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        self.misses += 1
+        version = self._version
+        tasks, expires_at = await load(now)
+
+        if version == self._version:
+            self._entries.setdefault(user_id, {})[key] = (expires_at, tasks)
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+        return tasks
+
+    async def get_today_tasks(self, user_id: int) -> List[Task]:
+        """Задачи на сегодня; до полуночи меняются только записью"""
+        async def load(now: int):
+            _, day_end = day_bounds()
+            return await self.db.get_today_tasks(user_id), day_end + 1
+
+        return await self._get(user_id, ("today",), load)
+
+    async def get_overdue_tasks(self, user_id: int) -> List[Task]:
+        """Просроченные; следующая задача становится просроченной через секунду после своего дедлайна"""
+        async def load(now: int):
+            next_deadline = await self.db.get_next_pending_deadline(user_id, now)
+            tasks = await self.db.get_overdue_tasks(user_id)
+            return tasks, _after(next_deadline, 1)
+
+        return await self._get(user_id, ("overdue",), load)
+
+    async def get_upcoming_tasks(self, user_id: int, hours: int = 24) -> List[Task]:
+        """Предстоящие за hours часов; окно сдвигается: первая задача уходит, следующая входит"""
+        window = hours * 3600
+
+        async def load(now: int):
+            next_deadline = await self.db.get_next_pending_deadline(user_id, now + window + 1)
+            tasks = await self.db.get_upcoming_tasks(user_id, hours)
+
+            expires_at = _after(next_deadline, -window)
+            if tasks:
+                expires_at = min(expires_at, _after(to_timestamp(tasks[0].deadline), 1))
+            return tasks, expires_at
+
+        return await self._get(user_id, ("upcoming", hours), load)
+
+
+def _after(deadline: Optional[float], offset: int) -> float:
+    return NEVER if deadline is None else deadline + offset
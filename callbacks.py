@@ -0,0 +1,168 @@
+"""callback_data inline-кнопок: типизированные схемы и таблица обработчиков.
+
+Каждая кнопка кодируется классом CallbackData с коротким префиксом
+("d:42" вместо "done_42"), поля проверяются pydantic при разборе, так что
+обработчик получает готовые int/date, а подделанные или устаревшие данные
+отсекаются до него. Маршрутизация — один обработчик callback_query и
+словарь префикс -> обработчик: стоимость не зависит от числа кнопок.
+"""
+import inspect
+import logging
+from datetime import date
+from enum import Enum
+from typing import Annotated, Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from aiogram import types
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.context import FSMContext
+from pydantic import Field, model_validator
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = ":"
+STALE_ANSWER = "Кнопка устарела, откройте список заново"
+
+Month = Annotated[int, Field(ge=1, le=12)]
+Hour = Annotated[int, Field(ge=0, le=23)]
+Minute = Annotated[int, Field(ge=0, le=59)]
+TaskId = Annotated[int, Field(ge=1)]
+
+
+# --- задача ---
+
+class DoneTask(CallbackData, prefix="d"):
+    task_id: TaskId
+
+
+class StartTask(CallbackData, prefix="s"):
+    task_id: TaskId
+
+
+class DeleteTask(CallbackData, prefix="x"):
+    task_id: TaskId
+
+
+# --- список и множественный выбор ---
+
+class Direction(str, Enum):
+    NEXT = "n"
+    PREV = "p"
+
+
+class PageNav(CallbackData, prefix="p"):
+    """Листание; курсор — (deadline, id) крайней задачи страницы"""
+    direction: Direction
+    deadline: int
+    task_id: int
+
+
+class SelectPage(CallbackData, prefix="m"):
+    deadline: int
+    task_id: int
+
+
+class ToggleTask(CallbackData, prefix="t"):
+    task_id: TaskId
+
+
+class BulkOp(str, Enum):
+    DONE = "d"
+    START = "s"
+    DELETE = "x"
+
+
+class BulkAction(CallbackData, prefix="b"):
+    op: BulkOp
+
+
+# --- мастер добавления ---
+
+class PickDate(CallbackData, prefix="D"):
+    year: int
+    month: Month
+    day: int
+
+    @model_validator(mode="after")
+    def _valid_date(self) -> "PickDate":
+        date(self.year, self.month, self.day)
+        return self
+
+    @property
+    def date(self) -> date:
+        return date(self.year, self.month, self.day)
+
+
+class CalendarNav(CallbackData, prefix="C"):
+    year: int
+    month: Month
+
+
+class PickTime(CallbackData, prefix="h"):
+    """Время из списка; без полей — «ввести вручную»"""
+    hour: Optional[Hour] = None
+    minute: Optional[Minute] = None
+
+    @property
+    def manual(self) -> bool:
+        return self.hour is None or self.minute is None
+
+
+# --- служебные ---
+
+class Ignore(CallbackData, prefix="i"):
+    pass
+
+
+class Cancel(CallbackData, prefix="q"):
+    pass
+
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class CallbackTable:
+    """Префикс callback_data -> (схема, обработчик)"""
+
+    def __init__(self):
+        self._routes: Dict[str, Tuple[Type[CallbackData], Handler, bool]] = {}
+
+    def route(self, schema: Type[CallbackData]) -> Callable[[Handler], Handler]:
+        """Декоратор: обработчик (callback, callback_data[, state]) для кнопок схемы"""
+        if schema.__separator__ != SEPARATOR:
+            raise ValueError(f"{schema.__name__}: разделитель должен быть {SEPARATOR!r}")
+
+        def register(handler: Handler) -> Handler:
+            prefix = schema.__prefix__
+            if prefix in self._routes:
+                raise ValueError(f"Префикс {prefix!r} уже занят {self._routes[prefix][0].__name__}")
+            wants_state = "state" in inspect.signature(handler).parameters
+            self._routes[prefix] = (schema, handler, wants_state)
+            return handler
+
+        return register
+
+    def label(self, data: str) -> str:
+        """Имя обработчика для метрик (неизвестные данные — одним лейблом)"""
+        route = self._routes.get(data.partition(SEPARATOR)[0])
+        return route[1].__name__ if route else "unknown"
+
+    async def dispatch(self, callback: types.CallbackQuery, state: FSMContext):
+        """Единственный обработчик callback_query в Dispatcher"""
+        data = callback.data or ""
+        route = self._routes.get(data.partition(SEPARATOR)[0])
+        if route is None:
+            # Кнопки старых сообщений (до смены формата) и чужие данные
+            await callback.answer(STALE_ANSWER)
+            return
+
+        schema, handler, wants_state = route
+        try:
+            callback_data = schema.unpack(data)
+        except (TypeError, ValueError):
+            logger.warning("Invalid callback data %r for %s", data, schema.__name__)
+            await callback.answer(STALE_ANSWER)
+            return
+
+        if wants_state:
+            return await handler(callback, callback_data, state)
+        return await handler(callback, callback_data)
@@ -1,155 +1,456 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import os
+import re
 import sqlite3
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Dict, Sequence, Tuple
 
+import aiosqlite
 
-class Database:
+from recurrence import next_occurrence, occurrence_at_or_after, with_occurrences
+from schema import migrate_path
+from stats import COUNTERS_SQL, STATS_KEYS, WEEKLY_KEYS, WINDOW_COUNTERS_SQL, build_stats, pick, window_params
+from timeutil import day_bounds, now_timestamp, to_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Task:
+    """Задача (строка таблицы task)"""
+    id: int
+    title: str
+    description: Optional[str]
+    deadline: datetime
+    status: str
+    created_at: datetime
+    user_id: int
+    recurrence: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "Task":
+        """Строка выборки TASK_COLUMNS -> Task"""
+        return cls(
+            row[0], row[1], row[2],
+            datetime.fromtimestamp(row[3]),
+            row[4],
+            datetime.fromtimestamp(row[5]),
+            row[6], row[7]
+        )
+
+
+@dataclass(slots=True)
+class TaskChange:
+    """Изменение задачи, о котором AsyncDatabase сообщает подписчикам"""
+    # "created", "status", "deleted", "updated" (дедлайн или повтор) или "imported" (массовая вставка, task_id = 0)
+    action: str
+    user_id: int
+    task_id: int
+    status: Optional[str] = None
+    task: Optional[Task] = None
+
+
+@dataclass(slots=True)
+class WriteResult:
+    """Результат записи из пакетного коммита (поля как у курсора)"""
+    rowcount: int
+    lastrowid: Optional[int]
+
+
+@dataclass(slots=True)
+class TaskPage:
+    """Страница активных задач; курсоры — (deadline, id) крайних задач страницы"""
+    tasks: List[Task]
+    prev_cursor: Optional[Tuple[int, int]] = None
+    next_cursor: Optional[Tuple[int, int]] = None
+
+
+TASK_COLUMNS = (
+    "task.id, task.title, task.description, task.deadline, task.status, task.created_at, task.user_id, task.recurrence"
+)
+
+# Все выборки ограничены владельцем задачи (user_id = ?), индексы начинаются с user_id
+TASKS_BY_STATUS_SQL = f"SELECT {TASK_COLUMNS} FROM task WHERE user_id = ? AND status = ? ORDER BY deadline"
+
+# Выполненные лежат в task и в архиве; task_archive AS task — чтобы подошёл TASK_COLUMNS.
+# Обе ветки упорядочены индексами, UNION ALL сливается без сортировки
+COMPLETED_TASKS_SQL = f"""SELECT {TASK_COLUMNS} FROM task WHERE user_id = ? AND status = 'completed'
+                          UNION ALL
+                          SELECT {TASK_COLUMNS} FROM task_archive AS task WHERE user_id = ?
+                          ORDER BY deadline"""
+
+ACTIVE_TASKS_SQL = f"SELECT {TASK_COLUMNS} FROM task WHERE user_id = ? AND status != 'completed' ORDER BY deadline"
+
+# Выборки окна берут только разовые задачи; повторяющиеся — RECURRING_TASKS_SQL
+TODAY_TASKS_SQL = f"""SELECT {TASK_COLUMNS}
+                      FROM task
+                      WHERE user_id = ?
+                      AND status != 'completed'
+                      AND deadline >= ?
+                      AND deadline <= ?
+                      AND recurrence IS NULL
+                      ORDER BY deadline"""
+
+OVERDUE_TASKS_SQL = f"""SELECT {TASK_COLUMNS}
+                        FROM task
+                        WHERE user_id = ?
+                        AND status = 'pending'
+                        AND deadline < ?
+                        ORDER BY deadline"""
+
+UPCOMING_TASKS_SQL = f"""SELECT {TASK_COLUMNS}
+                         FROM task
+                         WHERE user_id = ?
+                         AND status = 'pending'
+                         AND deadline >= ?
+                         AND deadline <= ?
+                         AND recurrence IS NULL
+                         ORDER BY deadline"""
+
+# Повторяющиеся задачи, текущее вхождение которых не позже конца окна
+# (по частичному индексу idx_task_user_recurring; вхождения строит recurrence.expand)
+RECURRING_TASKS_SQL = f"""SELECT {TASK_COLUMNS}
+                          FROM task
+                          WHERE user_id = ?
+                          AND recurrence IS NOT NULL
+                          AND deadline <= ?
+                          AND status = ?"""
+
+RECURRING_ACTIVE_SQL = f"""SELECT {TASK_COLUMNS}
+                           FROM task
+                           WHERE user_id = ?
+                           AND recurrence IS NOT NULL
+                           AND deadline <= ?
+                           AND status IN ('pending', 'running')"""
+
+# Ближайший дедлайн ожидающей задачи не раньше момента — граница, на которой
+# меняются просроченные/предстоящие (для TaskCache)
+NEXT_PENDING_DEADLINE_SQL = """SELECT MIN(deadline)
+                               FROM task
+                               WHERE user_id = ?
+                               AND status = 'pending'
+                               AND deadline >= ?"""
+
+# Постраничный вывод активных задач по ключу (deadline, id): каждая страница
+# читает только limit + 1 строк из idx_task_user_active_deadline, без OFFSET
+PAGE_FIRST_SQL = f"""SELECT {TASK_COLUMNS}
+                     FROM task
+                     WHERE user_id = ?
+                     AND status != 'completed'
+                     ORDER BY deadline, id
+                     LIMIT ?"""
+
+PAGE_AFTER_SQL = f"""SELECT {TASK_COLUMNS}
+                     FROM task
+                     WHERE user_id = ?
+                     AND status != 'completed'
+                     AND (deadline, id) > (?, ?)
+                     ORDER BY deadline, id
+                     LIMIT ?"""
+
+PAGE_BEFORE_SQL = f"""SELECT {TASK_COLUMNS}
+                      FROM task
+                      WHERE user_id = ?
+                      AND status != 'completed'
+                      AND (deadline, id) < (?, ?)
+                      ORDER BY deadline DESC, id DESC
+                      LIMIT ?"""
+
+# Для планировщика напоминаний: задачи всех пользователей
+PENDING_FROM_SQL = f"""SELECT {TASK_COLUMNS}
+                       FROM task
+                       WHERE status = 'pending'
+                       AND deadline >= ?
+                       AND recurrence IS NULL
+                       ORDER BY deadline"""
+
+# Повторяющиеся ожидающие задачи всех пользователей (их немного: частичный индекс
+# idx_task_recurring_status_deadline)
+RECURRING_PENDING_SQL = f"""SELECT {TASK_COLUMNS}
+                            FROM task
+                            WHERE recurrence IS NOT NULL
+                            AND status = 'pending'"""
+
+# Уже отправленные напоминания о ещё не наступивших дедлайнах (reminders.py)
+REMINDED_SQL = """SELECT user_id, id, reminded_deadline
+                  FROM task
+                  WHERE reminded_deadline >= ?"""
+
+MARK_REMINDED_SQL = "UPDATE task SET reminded_deadline = ? WHERE id = ? AND user_id = ?"
+
+# Водяной знак изменений (reminders.py): последний id и последняя ревизия
+CHANGE_WATERMARK_SQL = "SELECT IFNULL((SELECT MAX(id) FROM task), 0), IFNULL((SELECT MAX(revision) FROM task), 0)"
+
+# Задачи, созданные или изменённые (статус, дедлайн, повтор) после водяного знака
+CHANGED_TASKS_SQL = f"""SELECT {TASK_COLUMNS}, task.revision
+                        FROM task
+                        WHERE id > ? OR revision > ?"""
+
+TASK_BY_ID_SQL = f"SELECT {TASK_COLUMNS} FROM task WHERE id = ? AND user_id = ?"
+
+SEARCH_SQL = f"""SELECT {TASK_COLUMNS}
+                 FROM task_fts
+                 JOIN task ON task.id = task_fts.rowid
+                 WHERE task_fts MATCH ?
+                 AND task.user_id = ?
+                 AND task.status != 'completed'
+                 ORDER BY task_fts.rank"""
+
+CREATE_TASK_SQL = """INSERT INTO task (title, description, deadline, status, created_at, user_id, recurrence)
+                     VALUES (?, ?, ?, 'pending', ?, ?, ?)"""
+
+IMPORT_TASKS_SQL = """INSERT INTO task (title, description, deadline, status, created_at, user_id)
+                      VALUES (?, ?, ?, ?, ?, ?)"""
+
+# Экспорт (вместе с архивом) идёт по индексам (user_id, created_at) обеих таблиц, без сортировки в памяти
+EXPORT_TASKS_SQL = f"""SELECT {TASK_COLUMNS} FROM task WHERE user_id = ?
+                       UNION ALL
+                       SELECT {TASK_COLUMNS} FROM task_archive AS task WHERE user_id = ?
+                       ORDER BY created_at"""
+
+IMPORT_CHUNK = 1000
+EXPORT_BATCH = 500
+
+UPDATE_STATUS_SQL = "UPDATE task SET status = ? WHERE id = ? AND user_id = ?"
+
+DELETE_TASK_SQL = "DELETE FROM task WHERE id = ? AND user_id = ?"
+
+SET_RECURRENCE_SQL = "UPDATE task SET recurrence = ? WHERE id = ? AND user_id = ?"
+
+# Выполнение вхождения повторяющейся задачи: дедлайн переходит на следующее
+RESCHEDULE_TASK_SQL = "UPDATE task SET deadline = ?, status = 'pending' WHERE id = ? AND user_id = ?"
+
+# Массовые действия: список id подставляется плейсхолдерами (bulk_query)
+BULK_UPDATE_STATUS_SQL = "UPDATE task SET status = ? WHERE user_id = ? AND id IN ({ids})"
+
+BULK_DELETE_SQL = "DELETE FROM task WHERE user_id = ? AND id IN ({ids})"
+
+# Перенос пачки выполненных задач с дедлайном раньше порога в архив (всех
+# пользователей, по idx_task_status_deadline). Пачка материализуется до вставки:
+# триггер task_archive_after_insert удаляет перенесённые строки из task
+ARCHIVE_COMPLETED_SQL = """INSERT INTO task_archive
+                               (id, title, description, deadline, status, created_at, user_id, recurrence, archived_at)
+                           WITH batch AS MATERIALIZED (
+                               SELECT id, title, description, deadline, status, created_at, user_id, recurrence
+                               FROM task
+                               WHERE status = 'completed'
+                               AND deadline < ?
+                               ORDER BY deadline
+                               LIMIT ?
+                           )
+                           SELECT *, ? FROM batch"""
+
+ARCHIVE_BATCH = 1000
+
+# Пачка group commit, не получившая блокировку записи за busy timeout
+# (другой процесс или соединение пишут дольше), повторяется целиком
+BATCH_RETRIES = 3
+BATCH_RETRY_DELAY = 0.05
+
+# Задачи, созданные до появления user_id, получают владельца при старте
+CLAIM_ORPHANS_SQL = "UPDATE task SET user_id = ? WHERE user_id = 0"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def is_busy(error: sqlite3.Error) -> bool:
+    """SQLITE_BUSY/SQLITE_LOCKED (в том числе расширенные коды): запись можно повторить"""
+    return getattr(error, "sqlite_errorcode", 0) & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+def bulk_query(sql: str, task_ids: Sequence[int]) -> str:
+    """Подставить в BULK_*_SQL по плейсхолдеру на каждый id"""
+    return sql.format(ids=", ".join("?" * len(task_ids)))
+
+
+def iter_chunks(rows: Iterable, size: int) -> Iterator[list]:
+    """Разбить поток строк на списки по size элементов"""
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """Файлы шардов ShardedDatabase"""
+    base, ext = os.path.splitext(db_path)
+    return [f"{base}.shard{i}{ext}" for i in range(shards)]
+
+
+def changed_tasks(rows: List[tuple], watermark: Tuple[int, int]) -> Tuple[List[Task], Tuple[int, int]]:
+    """Строки CHANGED_TASKS_SQL -> задачи и сдвинутый водяной знак"""
+    max_id, revision = watermark
+    for row in rows:
+        max_id = max(max_id, row[0])
+        revision = max(revision, row[-1])
+    return [Task.from_row(row) for row in rows], (max_id, revision)
+
+
+def earliest(deadline: Optional[int], occurrence: Optional[datetime]) -> Optional[int]:
+    """Меньший из дедлайна разовой задачи и вхождения повторяющейся"""
+    if occurrence is None:
+        return deadline
+    occurrence = to_timestamp(occurrence)
+    return occurrence if deadline is None else min(deadline, occurrence)
+
+
+def merge_occurrences(tasks: List[Task], series: Iterable[Task], since: datetime) -> List[Task]:
+    """Задачи по дедлайну вместе с ближайшими (не раньше since) вхождениями повторяющихся"""
+    occurrences = sorted((occurrence_at_or_after(task, since) for task in series), key=lambda task: task.deadline)
+
+    return list(heapq.merge(tasks, occurrences, key=lambda task: task.deadline))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Запрос пользователя -> выражение FTS5 MATCH: все слова, каждое как префикс"""
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def page_query(user_id: int, after: Optional[Tuple[int, int]], before: Optional[Tuple[int, int]],
+               limit: int) -> Tuple[str, tuple]:
+    """SQL и параметры для страницы (на одну строку больше, чтобы узнать, есть ли продолжение)"""
+    if after is not None:
+        return PAGE_AFTER_SQL, (user_id, *after, limit + 1)
+    if before is not None:
+        return PAGE_BEFORE_SQL, (user_id, *before, limit + 1)
+
+    return PAGE_FIRST_SQL, (user_id, limit + 1)
+
+
+def build_page(tasks: List[Task], after: Optional[Tuple[int, int]], before: Optional[Tuple[int, int]],
+               limit: int) -> TaskPage:
+    """Собрать TaskPage из результата page_query"""
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+
+    if before is not None:
+        # Назад читали в обратном порядке
+        tasks.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+
+    if not tasks:
+        return TaskPage(tasks)
+
+    first, last = tasks[0], tasks[-1]
+    return TaskPage(
+        tasks,
+        prev_cursor=(to_timestamp(first.deadline), first.id) if has_prev else None,
+        next_cursor=(to_timestamp(last.deadline), last.id) if has_next else None
+    )
+
+
+class QueryHooks:
+    """Хуки замера запросов: hook(sql, параметры, секунды, строк возвращено или затронуто).
+
+    Используются метриками (metrics.observe_query) и журналом медленных
+    запросов (slowlog.SlowQueryLog); без хуков замер ничего не стоит.
+    """
+
+    _query_hooks: List[Callable]
+
+    def add_query_hook(self, hook: Callable):
+        self._query_hooks.append(hook)
+
+    def _observe(self, sql: str, params, started: float, rows: int):
+        if self._query_hooks:
+            elapsed = time.perf_counter() - started
+            for hook in self._query_hooks:
+                hook(sql, params, elapsed, rows)
+
+
+class Database(QueryHooks):
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._query_hooks = []
     
     def _get_connection(self):
         return sqlite3.connect(self.db_path)
+
+    def _fetch_tasks(self, sql: str, params: tuple = ()) -> List[Task]:
+        conn = self._get_connection()
+        try:
+            started = time.perf_counter()
+            rows = conn.execute(sql, params).fetchall()
+            self._observe(sql, params, started, len(rows))
+        finally:
+            conn.close()
+
+        return [Task.from_row(row) for row in rows]
     
-    def get_all_tasks(self, status: str = None) -> List[Dict]:
+    def get_all_tasks(self, user_id: int, status: str = None) -> List[Task]:
         """Получить все задачи или по статусу"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
+        if status == "completed":
+            return self._fetch_tasks(COMPLETED_TASKS_SQL, (user_id, user_id))
         if status:
-            cursor.execute(
-                "SELECT id, title, description, deadline, status, created_at FROM task WHERE status = ? ORDER BY deadline",
-                (status,)
-            )
-        else:
-            cursor.execute(
-                "SELECT id, title, description, deadline, status, created_at FROM task WHERE status != 'completed' ORDER BY deadline"
-            )
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        tasks = []
-        for row in rows:
-            tasks.append({
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "deadline": row[3],
-                "status": row[4],
-                "created_at": row[5]
-            })
-        
-        return tasks
+            return self._fetch_tasks(TASKS_BY_STATUS_SQL, (user_id, status))
+
+        return self._fetch_tasks(ACTIVE_TASKS_SQL, (user_id,))
     
-    def get_today_tasks(self) -> List[Dict]:
-        """Получить задачи на сегодня"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        tomorrow = datetime.now().strftime("%Y-%m-%d") + " 23:59:59"
-        
-        cursor.execute(
-            """SELECT id, title, description, deadline, status, created_at 
-               FROM task 
-               WHERE status != 'completed' 
-               AND deadline >= ? 
-               AND deadline <= ? 
-               ORDER BY deadline""",
-            (today + " 00:00:00", tomorrow)
-        )
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        tasks = []
-        for row in rows:
-            tasks.append({
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "deadline": row[3],
-                "status": row[4],
-                "created_at": row[5]
-            })
-        
-        return tasks
+    def get_tasks_page(self, user_id: int, after: Tuple[int, int] = None, before: Tuple[int, int] = None,
+                       limit: int = 20) -> TaskPage:
+        """Страница активных задач после/до курсора (deadline, id)"""
+        sql, params = page_query(user_id, after, before, limit)
+
+        return build_page(self._fetch_tasks(sql, params), after, before, limit)
     
-    def get_overdue_tasks(self) -> List[Dict]:
+    def get_today_tasks(self, user_id: int) -> List[Task]:
+        """Получить задачи на сегодня (с сегодняшними вхождениями повторяющихся)"""
+        start, end = day_bounds()
+        tasks = self._fetch_tasks(TODAY_TASKS_SQL, (user_id, start, end))
+        series = self._fetch_tasks(RECURRING_ACTIVE_SQL, (user_id, end))
+
+        return with_occurrences(tasks, series, start, end)
+    
+    def get_overdue_tasks(self, user_id: int) -> List[Task]:
         """Получить просроченные задачи"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        cursor.execute(
-            """SELECT id, title, description, deadline, status, created_at 
-               FROM task 
-               WHERE status = 'pending' 
-               AND deadline < ? 
-               ORDER BY deadline""",
-            (now,)
-        )
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        tasks = []
-        for row in rows:
-            tasks.append({
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "deadline": row[3],
-                "status": row[4],
-                "created_at": row[5]
-            })
-        
-        return tasks
+        return self._fetch_tasks(OVERDUE_TASKS_SQL, (user_id, now_timestamp()))
     
-    def get_stats(self) -> Dict:
-        """Получить статистику"""
+    def get_dashboard_stats(self, user_id: int) -> Dict:
+        """Вся статистика: счётчики статусов из task_stats и временные окна одним запросом"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM task")
-        total = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM task WHERE status = 'pending'")
-        pending = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM task WHERE status = 'running'")
-        running = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM task WHERE status = 'completed'")
-        completed = cursor.fetchone()[0]
-        
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("SELECT COUNT(*) FROM task WHERE status = 'pending' AND deadline < ?", (now,))
-        overdue = cursor.fetchone()[0]
-        
+
+        started = time.perf_counter()
+        cursor.execute(COUNTERS_SQL, (user_id,))
+        counters = cursor.fetchall()
+        self._observe(COUNTERS_SQL, (user_id,), started, len(counters))
+
+        params = window_params(user_id)
+        started = time.perf_counter()
+        cursor.execute(WINDOW_COUNTERS_SQL, params)
+        window_row = cursor.fetchone()
+        self._observe(WINDOW_COUNTERS_SQL, params, started, 1)
         conn.close()
-        
-        return {
-            "total": total,
-            "pending": pending,
-            "running": running,
-            "completed": completed,
-            "overdue": overdue
-        }
+
+        return build_stats(counters, window_row)
+
+    def get_stats(self, user_id: int) -> Dict:
+        """Получить статистику"""
+        return pick(self.get_dashboard_stats(user_id), STATS_KEYS)
     
-    def create_task(self, title: str, description: str, deadline: datetime) -> int:
+    def create_task(self, user_id: int, title: str, description: str, deadline: datetime,
+                    recurrence: Optional[str] = None) -> int:
         """Создать задачу"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
-        deadline_str = deadline.strftime("%Y-%m-%d %H:%M:%S")
-        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        created_at = now_timestamp()
         
-        cursor.execute(
-            "INSERT INTO task (title, description, deadline, status, created_at) VALUES (?, ?, ?, 'pending', ?)",
-            (title, description, deadline_str, created_at)
-        )
+        params = (title, description, to_timestamp(deadline), created_at, user_id, recurrence)
+        started = time.perf_counter()
+        cursor.execute(CREATE_TASK_SQL, params)
+        self._observe(CREATE_TASK_SQL, params, started, cursor.rowcount)
         
         task_id = cursor.lastrowid
         conn.commit()
@@ -157,15 +458,14 @@ class Database:
         
         return task_id
     
-    def update_task_status(self, task_id: int, status: str) -> bool:
+    def update_task_status(self, user_id: int, task_id: int, status: str) -> bool:
         """Обновить статус задачи"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
-        cursor.execute(
-            "UPDATE task SET status = ? WHERE id = ?",
-            (status, task_id)
-        )
+        started = time.perf_counter()
+        cursor.execute(UPDATE_STATUS_SQL, (status, task_id, user_id))
+        self._observe(UPDATE_STATUS_SQL, (status, task_id, user_id), started, cursor.rowcount)
         
         success = cursor.rowcount > 0
         conn.commit()
@@ -173,147 +473,756 @@ class Database:
         
         return success
     
-    def delete_task(self, task_id: int) -> bool:
+    def delete_task(self, user_id: int, task_id: int) -> bool:
         """Удалить задачу"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("DELETE FROM task WHERE id = ?", (task_id,))
+        started = time.perf_counter()
+        cursor.execute(DELETE_TASK_SQL, (task_id, user_id))
+        self._observe(DELETE_TASK_SQL, (task_id, user_id), started, cursor.rowcount)
         
         success = cursor.rowcount > 0
         conn.commit()
         conn.close()
         
         return success
+
+    def update_tasks_status(self, user_id: int, task_ids: Sequence[int], status: str) -> int:
+        """Обновить статус нескольких задач одним UPDATE, вернуть число затронутых строк"""
+        if not task_ids:
+            return 0
+
+        sql, params = bulk_query(BULK_UPDATE_STATUS_SQL, task_ids), (status, user_id, *task_ids)
+        conn = self._get_connection()
+        try:
+            with conn:
+                started = time.perf_counter()
+                cursor = conn.execute(sql, params)
+                self._observe(sql, params, started, cursor.rowcount)
+        finally:
+            conn.close()
+
+        return cursor.rowcount
+
+    def delete_tasks(self, user_id: int, task_ids: Sequence[int]) -> int:
+        """Удалить несколько задач одним DELETE, вернуть число удалённых строк"""
+        if not task_ids:
+            return 0
+
+        sql, params = bulk_query(BULK_DELETE_SQL, task_ids), (user_id, *task_ids)
+        conn = self._get_connection()
+        try:
+            with conn:
+                started = time.perf_counter()
+                cursor = conn.execute(sql, params)
+                self._observe(sql, params, started, cursor.rowcount)
+        finally:
+            conn.close()
+
+        return cursor.rowcount
     
-    def get_task_by_id(self, task_id: int) -> Optional[Dict]:
+    def get_task_by_id(self, user_id: int, task_id: int) -> Optional[Task]:
         """Получить задачу по ID"""
+        tasks = self._fetch_tasks(TASK_BY_ID_SQL, (task_id, user_id))
+
+        return tasks[0] if tasks else None
+
+    def get_upcoming_tasks(self, user_id: int, hours: int = 24) -> List[Task]:
+        """Получить задачи на ближайшие N часов"""
+        now = now_timestamp()
+        end = now + hours * 3600
+        tasks = self._fetch_tasks(UPCOMING_TASKS_SQL, (user_id, now, end))
+        series = self._fetch_tasks(RECURRING_TASKS_SQL, (user_id, end, "pending"))
+
+        return with_occurrences(tasks, series, now, end)
+
+    def get_next_pending_deadline(self, user_id: int, since: int) -> Optional[int]:
+        """Timestamp ближайшего дедлайна ожидающей задачи (или вхождения), не раньше since"""
         conn = self._get_connection()
-        cursor = conn.cursor()
+        try:
+            started = time.perf_counter()
+            deadline = conn.execute(NEXT_PENDING_DEADLINE_SQL, (user_id, since)).fetchone()[0]
+            self._observe(NEXT_PENDING_DEADLINE_SQL, (user_id, since), started, 1)
+        finally:
+            conn.close()
 
-        cursor.execute(
-            "SELECT id, title, description, deadline, status, created_at FROM task WHERE id = ?",
-            (task_id,)
-        )
+        series = self._fetch_tasks(RECURRING_TASKS_SQL, (user_id, since, "pending"))
+        return earliest(deadline, next_occurrence(series, datetime.fromtimestamp(since)))
 
-        row = cursor.fetchone()
-        conn.close()
+    def get_pending_tasks_from(self, since: datetime) -> List[Task]:
+        """Ожидающие задачи с дедлайном не раньше since; повторяющиеся — ближайшим вхождением"""
+        tasks = self._fetch_tasks(PENDING_FROM_SQL, (to_timestamp(since),))
+        series = self._fetch_tasks(RECURRING_PENDING_SQL)
 
-        if row:
-            return {
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "deadline": row[3],
-                "status": row[4],
-                "created_at": row[5]
-            }
+        return merge_occurrences(tasks, series, since)
 
-        return None
+    def get_reminded(self, since: datetime) -> List[Tuple[int, int, int]]:
+        """(user_id, id, дедлайн) напоминаний, уже отправленных о дедлайнах не раньше since"""
+        conn = self._get_connection()
+        try:
+            started = time.perf_counter()
+            rows = conn.execute(REMINDED_SQL, (to_timestamp(since),)).fetchall()
+            self._observe(REMINDED_SQL, (to_timestamp(since),), started, len(rows))
+        finally:
+            conn.close()
 
-    def get_upcoming_tasks(self, hours: int = 24) -> List[Dict]:
-        """Получить задачи на ближайшие N часов"""
+        return rows
+
+    def change_watermark(self) -> Tuple[int, int]:
+        """(последний id, последняя ревизия) — начало отсчёта для get_changed_tasks"""
         conn = self._get_connection()
-        cursor = conn.cursor()
+        try:
+            started = time.perf_counter()
+            watermark = conn.execute(CHANGE_WATERMARK_SQL).fetchone()
+            self._observe(CHANGE_WATERMARK_SQL, (), started, 1)
+        finally:
+            conn.close()
 
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        future = (datetime.now() + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
-
-        cursor.execute(
-            """SELECT id, title, description, deadline, status, created_at
-               FROM task
-               WHERE status = 'pending'
-               AND deadline >= ?
-               AND deadline <= ?
-               ORDER BY deadline""",
-            (now, future)
-        )
+        return watermark
 
-        rows = cursor.fetchall()
-        conn.close()
+    def get_changed_tasks(self, watermark: Tuple[int, int]) -> Tuple[List[Task], Tuple[int, int]]:
+        """Задачи, созданные или изменённые после watermark, и новый водяной знак"""
+        conn = self._get_connection()
+        try:
+            started = time.perf_counter()
+            rows = conn.execute(CHANGED_TASKS_SQL, watermark).fetchall()
+            self._observe(CHANGED_TASKS_SQL, watermark, started, len(rows))
+        finally:
+            conn.close()
+
+        return changed_tasks(rows, watermark)
+
+    def mark_reminded(self, tasks: Iterable[Task]) -> int:
+        """Запомнить, что о дедлайне (вхождении) задач напомнили"""
+        params = [(to_timestamp(task.deadline), task.id, task.user_id) for task in tasks]
+        conn = self._get_connection()
+        try:
+            with conn:
+                started = time.perf_counter()
+                cursor = conn.executemany(MARK_REMINDED_SQL, params)
+                self._observe(MARK_REMINDED_SQL, params, started, cursor.rowcount)
+        finally:
+            conn.close()
+
+        return cursor.rowcount
+
+    def set_recurrence(self, user_id: int, task_id: int, recurrence: Optional[str]) -> bool:
+        """Задать правило повтора (None — сделать задачу разовой)"""
+        return self._execute(SET_RECURRENCE_SQL, (recurrence, task_id, user_id)) > 0
 
-        tasks = []
-        for row in rows:
-            tasks.append({
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "deadline": row[3],
-                "status": row[4],
-                "created_at": row[5]
-            })
+    def reschedule_task(self, user_id: int, task_id: int, deadline: datetime) -> bool:
+        """Перенести дедлайн и вернуть задачу в ожидание (следующее вхождение)"""
+        return self._execute(RESCHEDULE_TASK_SQL, (to_timestamp(deadline), task_id, user_id)) > 0
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        conn = self._get_connection()
+        try:
+            with conn:
+                started = time.perf_counter()
+                cursor = conn.execute(sql, params)
+                self._observe(sql, params, started, cursor.rowcount)
+        finally:
+            conn.close()
 
-        return tasks
+        return cursor.rowcount
 
-    def get_weekly_stats(self) -> Dict:
+    def get_weekly_stats(self, user_id: int) -> Dict:
         """Статистика за неделю"""
+        return pick(self.get_dashboard_stats(user_id), WEEKLY_KEYS)
+
+    def search_tasks(self, user_id: int, query: str) -> List[Task]:
+        """Полнотекстовый поиск задач (по релевантности, слова ищутся как префиксы)"""
+        match = build_match_query(query)
+        if match is None:
+            return []
+
+        return self._fetch_tasks(SEARCH_SQL, (match, user_id))
+
+    def import_tasks(self, user_id: int, rows: Iterable[Tuple], chunk_size: int = IMPORT_CHUNK) -> int:
+        """Вставить задачи (title, description, deadline_ts, status) кусками, транзакция на кусок"""
+        created_at = now_timestamp()
+        total = 0
         conn = self._get_connection()
-        cursor = conn.cursor()
+        try:
+            for chunk in iter_chunks(rows, chunk_size):
+                params = [(*row, created_at, user_id) for row in chunk]
+                with conn:
+                    started = time.perf_counter()
+                    conn.executemany(IMPORT_TASKS_SQL, params)
+                    self._observe(IMPORT_TASKS_SQL, params, started, len(params))
+                total += len(chunk)
+        finally:
+            conn.close()
 
-        week_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+        return total
 
-        # Выполнено за неделю
-        cursor.execute(
-            "SELECT COUNT(*) FROM task WHERE status = 'completed' AND created_at >= ?",
-            (week_ago,)
-        )
-        completed_week = cursor.fetchone()[0]
+    def iter_tasks(self, user_id: int) -> Iterator[Task]:
+        """Все задачи пользователя потоком с курсора (в памяти — одна пачка строк)"""
+        # В замер идёт только чтение пачек, не обработка задач потребителем
+        elapsed, total = 0.0, 0
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute(EXPORT_TASKS_SQL, (user_id, user_id))
+            while True:
+                started = time.perf_counter()
+                rows = cursor.fetchmany(EXPORT_BATCH)
+                elapsed += time.perf_counter() - started
+                if not rows:
+                    break
 
-        # Создано за неделю
-        cursor.execute(
-            "SELECT COUNT(*) FROM task WHERE created_at >= ?",
-            (week_ago,)
-        )
-        created_week = cursor.fetchone()[0]
-
-        # Задачи на сегодня
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_start = today + " 00:00:00"
-        today_end = today + " 23:59:59"
-
-        cursor.execute(
-            """SELECT COUNT(*) FROM task
-               WHERE status = 'completed'
-               AND deadline >= ?
-               AND deadline <= ?""",
-            (today_start, today_end)
-        )
-        completed_today = cursor.fetchone()[0]
+                total += len(rows)
+                for row in rows:
+                    yield Task.from_row(row)
+        finally:
+            conn.close()
 
-        conn.close()
+        self._observe(EXPORT_TASKS_SQL, (user_id, user_id), time.perf_counter() - elapsed, total)
 
-        return {
-            "completed_week": completed_week,
-            "created_week": created_week,
-            "completed_today": completed_today
-        }
+    def archive_completed(self, before: int, limit: int = ARCHIVE_BATCH) -> int:
+        """Перенести в task_archive до limit выполненных задач с дедлайном раньше before"""
+        params = (before, limit, now_timestamp())
+        conn = self._get_connection()
+        try:
+            with conn:
+                started = time.perf_counter()
+                cursor = conn.execute(ARCHIVE_COMPLETED_SQL, params)
+                self._observe(ARCHIVE_COMPLETED_SQL, params, started, cursor.rowcount)
+        finally:
+            conn.close()
+
+        return cursor.rowcount
 
-    def search_tasks(self, query: str) -> List[Dict]:
-        """Поиск задач по названию"""
+    def compact(self, vacuum: bool = False):
+        """Обновить статистику планировщика (PRAGMA optimize), с vacuum — пересобрать файл"""
         conn = self._get_connection()
-        cursor = conn.cursor()
+        try:
+            conn.execute("PRAGMA optimize")
+            if vacuum:
+                conn.execute("VACUUM")
+        finally:
+            conn.close()
 
-        cursor.execute(
-            """SELECT id, title, description, deadline, status, created_at
-               FROM task
-               WHERE status != 'completed'
-               AND (title LIKE ? OR description LIKE ?)
-               ORDER BY deadline""",
-            (f"%{query}%", f"%{query}%")
-        )
 
-        rows = cursor.fetchall()
-        conn.close()
+class AsyncDatabase(QueryHooks):
+    """Асинхронный доступ к задачам через одно долгоживущее соединение aiosqlite.
+
+    Запросы выполняются в фоновом потоке aiosqlite, поэтому обработчики
+    не блокируют event loop на дисковом вводе-выводе. После каждой записи
+    подписчики (add_listener) получают TaskChange, а хуки запросов
+    (add_query_hook) — время и число строк каждого SQL.
+
+    Записи идут через одну фоновую задачу (group commit): изменения,
+    накопившиеся, пока коммитилась предыдущая пачка (плюс commit_interval
+    секунд ожидания, если он задан; не больше max_batch), выполняются одной
+    транзакцией с одним fsync. Ошибка отдельного запроса откатывает
+    только его (атомарность на уровне оператора SQLite) и достаётся только
+    его вызывающему; если SQLite откатил всю транзакцию (SQLITE_FULL, IOERR),
+    ошибку получает вся пачка.
+
+    Пачка начинается с BEGIN IMMEDIATE на отдельном соединении записи, а
+    чтения идут через своё соединение: снимок чтения не попадает в
+    транзакцию записи, и коммит другого соединения (FSM, другой воркер)
+    не делает её запись невозможной. Занятая блокировка записи ждётся
+    busy timeout, затем пачка повторяется (BATCH_RETRIES).
+    """
+
+    def __init__(self, db_path: str, commit_interval: float = 0.0, max_batch: int = 256):
+        self.db_path = db_path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._reader: Optional[aiosqlite.Connection] = None
+        self._listeners: List[Callable] = []
+        self._writes: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._query_hooks: List[Callable] = []
+        # Записи, вызывающий которых получил ошибку (метрика taskflow_failed_writes)
+        self.failed_writes = 0
+        # VACUUM нельзя выполнить внутри транзакции пачки
+        self._batch_lock = asyncio.Lock()
+
+    def add_listener(self, listener: Callable):
+        """Подписаться на изменения задач: listener(TaskChange), может быть корутиной"""
+        self._listeners.append(listener)
+
+    async def _notify(self, change: TaskChange):
+        for listener in self._listeners:
+            result = listener(change)
+            if inspect.isawaitable(result):
+                await result
+
+    async def connect(self):
+        """Применить миграции схемы и открыть соединение (повторный вызов ничего не делает)"""
+        if self._conn is None:
+            await asyncio.to_thread(migrate_path, self.db_path)
+            self._conn = await aiosqlite.connect(self.db_path)
+            self._reader = await aiosqlite.connect(self.db_path)
+            self._writes = asyncio.Queue()
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self):
+        """Дописать очередь записей и закрыть соединение"""
+        if self._writer is not None:
+            await self._writes.join()
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+
+        if self._conn is not None:
+            await self._reader.close()
+            await self._conn.close()
+            self._conn = self._reader = None
+
+    @property
+    def conn(self) -> aiosqlite.Connection:
+        """Соединение записи (только для фоновой задачи group commit и compact)"""
+        if self._conn is None:
+            raise RuntimeError("AsyncDatabase не подключена: вызовите connect()")
+        return self._conn
+
+    @property
+    def reader(self) -> aiosqlite.Connection:
+        """Соединение чтения: каждый запрос видит последние закоммиченные данные"""
+        if self._reader is None:
+            raise RuntimeError("AsyncDatabase не подключена: вызовите connect()")
+        return self._reader
+
+    async def _fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        started = time.perf_counter()
+        async with self.reader.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+
+        self._observe(sql, params, started, len(rows))
+        return rows
+
+    async def _fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        started = time.perf_counter()
+        async with self.reader.execute(sql, params) as cursor:
+            row = await cursor.fetchone()
+
+        self._observe(sql, params, started, row is not None)
+        return row
+
+    async def _write(self, sql: str, params=(), many: bool = False) -> WriteResult:
+        """Поставить запись в очередь group commit и дождаться её коммита (many — executemany)"""
+        if self._writer is None:
+            raise RuntimeError("AsyncDatabase не подключена: вызовите connect()")
+
+        future = asyncio.get_running_loop().create_future()
+        self._writes.put_nowait((sql, params, many, future))
+        return await future
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._writes.get()]
+            # Дать одновременным обработчикам поставить свои записи в ту же пачку
+            await asyncio.sleep(self.commit_interval)
+            while len(batch) < self.max_batch and not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+
+            try:
+                async with self._batch_lock:
+                    await self._commit_batch(batch)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    async def _commit_batch(self, batch: list):
+        for attempt in range(BATCH_RETRIES + 1):
+            try:
+                results = await self._run_batch(batch)
+            except sqlite3.Error as e:
+                if not is_busy(e) or attempt == BATCH_RETRIES:
+                    results = [e] * len(batch)
+                    break
+                logger.warning("Write batch of %d is busy (%s), retry %d", len(batch), e, attempt + 1)
+                await asyncio.sleep(BATCH_RETRY_DELAY * 2 ** attempt)
+            except Exception as e:
+                results = [e] * len(batch)
+                break
+            else:
+                break
+
+        self.failed_writes += sum(isinstance(result, Exception) for result in results)
+        for (*_, future), result in zip(batch, results):
+            if future.done():
+                continue  # вызывающий отменил ожидание, запись при этом выполнена
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run_batch(self, batch: list) -> list:
+        """Одна попытка пачки; исключение — пачка целиком откатилась"""
+        results = []
+        await self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params, many, _ in batch:
+                started = time.perf_counter()
+                try:
+                    if many:
+                        cursor = await self.conn.executemany(sql, params)
+                    else:
+                        cursor = await self.conn.execute(sql, params)
+                except sqlite3.Error as e:
+                    if not self.conn.in_transaction:
+                        raise  # SQLite откатил всю транзакцию вместе с предыдущими запросами
+                    results.append(e)
+                else:
+                    results.append(WriteResult(cursor.rowcount, cursor.lastrowid))
+                    self._observe(sql, params, started, cursor.rowcount)
+
+            started = time.perf_counter()
+            await self.conn.commit()
+            self._observe("COMMIT", (), started, len(batch))
+        except BaseException:
+            if self.conn.in_transaction:
+                await self.conn.rollback()
+            raise
+
+        return results
+
+    async def _fetch_tasks(self, sql: str, params: tuple = ()) -> List[Task]:
+        return [Task.from_row(row) for row in await self._fetchall(sql, params)]
+
+    async def claim_orphan_tasks(self, user_id: int) -> int:
+        """Назначить владельца задачам без user_id (созданным до миграции 6)"""
+        result = await self._write(CLAIM_ORPHANS_SQL, (user_id,))
+
+        return result.rowcount
+
+    async def get_all_tasks(self, user_id: int, status: str = None) -> List[Task]:
+        """Получить все задачи или по статусу"""
+        if status == "completed":
+            return await self._fetch_tasks(COMPLETED_TASKS_SQL, (user_id, user_id))
+        if status:
+            return await self._fetch_tasks(TASKS_BY_STATUS_SQL, (user_id, status))
+
+        return await self._fetch_tasks(ACTIVE_TASKS_SQL, (user_id,))
+
+    async def get_tasks_page(self, user_id: int, after: Tuple[int, int] = None, before: Tuple[int, int] = None,
+                             limit: int = 20) -> TaskPage:
+        """Страница активных задач после/до курсора (deadline, id)"""
+        sql, params = page_query(user_id, after, before, limit)
+
+        return build_page(await self._fetch_tasks(sql, params), after, before, limit)
+
+    async def get_today_tasks(self, user_id: int) -> List[Task]:
+        """Получить задачи на сегодня (с сегодняшними вхождениями повторяющихся)"""
+        start, end = day_bounds()
+        tasks = await self._fetch_tasks(TODAY_TASKS_SQL, (user_id, start, end))
+        series = await self._fetch_tasks(RECURRING_ACTIVE_SQL, (user_id, end))
+
+        return with_occurrences(tasks, series, start, end)
+
+    async def get_overdue_tasks(self, user_id: int) -> List[Task]:
+        """Получить просроченные задачи"""
+        return await self._fetch_tasks(OVERDUE_TASKS_SQL, (user_id, now_timestamp()))
+
+    async def get_dashboard_stats(self, user_id: int) -> Dict:
+        """Вся статистика: счётчики статусов из task_stats и временные окна одним запросом"""
+        counters = await self._fetchall(COUNTERS_SQL, (user_id,))
+        window_row = await self._fetchone(WINDOW_COUNTERS_SQL, window_params(user_id))
+
+        return build_stats(counters, window_row)
+
+    async def get_stats(self, user_id: int) -> Dict:
+        """Получить статистику"""
+        return pick(await self.get_dashboard_stats(user_id), STATS_KEYS)
+
+    async def create_task(self, user_id: int, title: str, description: str, deadline: datetime,
+                          recurrence: Optional[str] = None) -> int:
+        """Создать задачу"""
+        row = (title, description, to_timestamp(deadline), now_timestamp(), user_id, recurrence)
+        result = await self._write(CREATE_TASK_SQL, row)
+        task_id = result.lastrowid
+
+        task = Task.from_row((task_id, title, description, row[2], "pending", row[3], user_id, recurrence))
+        await self._notify(TaskChange("created", user_id, task_id, task.status, task))
+
+        return task_id
+
+    async def update_task_status(self, user_id: int, task_id: int, status: str) -> bool:
+        """Обновить статус задачи"""
+        result = await self._write(UPDATE_STATUS_SQL, (status, task_id, user_id))
+
+        success = result.rowcount > 0
+        if success:
+            await self._notify(TaskChange("status", user_id, task_id, status))
+
+        return success
+
+    async def delete_task(self, user_id: int, task_id: int) -> bool:
+        """Удалить задачу"""
+        result = await self._write(DELETE_TASK_SQL, (task_id, user_id))
+
+        success = result.rowcount > 0
+        if success:
+            await self._notify(TaskChange("deleted", user_id, task_id))
+
+        return success
+
+    async def update_tasks_status(self, user_id: int, task_ids: Sequence[int], status: str) -> int:
+        """Обновить статус нескольких задач одним UPDATE, вернуть число затронутых строк"""
+        if not task_ids:
+            return 0
+
+        result = await self._write(bulk_query(BULK_UPDATE_STATUS_SQL, task_ids), (status, user_id, *task_ids))
+
+        # Какие именно id совпали, UPDATE не сообщает; лишние события подписчики игнорируют
+        if result.rowcount:
+            for task_id in task_ids:
+                await self._notify(TaskChange("status", user_id, task_id, status))
+
+        return result.rowcount
+
+    async def delete_tasks(self, user_id: int, task_ids: Sequence[int]) -> int:
+        """Удалить несколько задач одним DELETE, вернуть число удалённых строк"""
+        if not task_ids:
+            return 0
+
+        result = await self._write(bulk_query(BULK_DELETE_SQL, task_ids), (user_id, *task_ids))
+
+        if result.rowcount:
+            for task_id in task_ids:
+                await self._notify(TaskChange("deleted", user_id, task_id))
+
+        return result.rowcount
+
+    async def get_task_by_id(self, user_id: int, task_id: int) -> Optional[Task]:
+        """Получить задачу по ID"""
+        tasks = await self._fetch_tasks(TASK_BY_ID_SQL, (task_id, user_id))
+
+        return tasks[0] if tasks else None
+
+    async def get_upcoming_tasks(self, user_id: int, hours: int = 24) -> List[Task]:
+        """Получить задачи на ближайшие N часов"""
+        now = now_timestamp()
+        end = now + hours * 3600
+        tasks = await self._fetch_tasks(UPCOMING_TASKS_SQL, (user_id, now, end))
+        series = await self._fetch_tasks(RECURRING_TASKS_SQL, (user_id, end, "pending"))
+
+        return with_occurrences(tasks, series, now, end)
+
+    async def get_next_pending_deadline(self, user_id: int, since: int) -> Optional[int]:
+        """Timestamp ближайшего дедлайна ожидающей задачи (или вхождения), не раньше since"""
+        deadline = (await self._fetchone(NEXT_PENDING_DEADLINE_SQL, (user_id, since)))[0]
+        series = await self._fetch_tasks(RECURRING_TASKS_SQL, (user_id, since, "pending"))
+
+        return earliest(deadline, next_occurrence(series, datetime.fromtimestamp(since)))
+
+    async def get_pending_tasks_from(self, since: datetime) -> List[Task]:
+        """Ожидающие задачи с дедлайном не раньше since; повторяющиеся — ближайшим вхождением"""
+        tasks = await self._fetch_tasks(PENDING_FROM_SQL, (to_timestamp(since),))
+        series = await self._fetch_tasks(RECURRING_PENDING_SQL)
+
+        return merge_occurrences(tasks, series, since)
+
+    async def get_reminded(self, since: datetime) -> List[Tuple[int, int, int]]:
+        """(user_id, id, дедлайн) напоминаний, уже отправленных о дедлайнах не раньше since"""
+        return await self._fetchall(REMINDED_SQL, (to_timestamp(since),))
+
+    async def change_watermark(self) -> Tuple[int, int]:
+        """(последний id, последняя ревизия) — начало отсчёта для get_changed_tasks"""
+        return tuple(await self._fetchone(CHANGE_WATERMARK_SQL))
+
+    async def get_changed_tasks(self, watermark: Tuple[int, int]) -> Tuple[List[Task], Tuple[int, int]]:
+        """Задачи, созданные или изменённые после watermark (в том числе другими процессами), и новый водяной знак"""
+        return changed_tasks(await self._fetchall(CHANGED_TASKS_SQL, watermark), watermark)
+
+    async def mark_reminded(self, tasks: Iterable[Task]) -> int:
+        """Запомнить, что о дедлайне (вхождении) задач напомнили; подписчики не уведомляются"""
+        params = [(to_timestamp(task.deadline), task.id, task.user_id) for task in tasks]
+        if not params:
+            return 0
+
+        result = await self._write(MARK_REMINDED_SQL, params, many=True)
+        return result.rowcount
+
+    async def set_recurrence(self, user_id: int, task_id: int, recurrence: Optional[str]) -> bool:
+        """Задать правило повтора (None — сделать задачу разовой)"""
+        result = await self._write(SET_RECURRENCE_SQL, (recurrence, task_id, user_id))
+
+        success = result.rowcount > 0
+        if success:
+            await self._notify(TaskChange("updated", user_id, task_id))
+
+        return success
+
+    async def reschedule_task(self, user_id: int, task_id: int, deadline: datetime) -> bool:
+        """Перенести дедлайн и вернуть задачу в ожидание (следующее вхождение)"""
+        result = await self._write(RESCHEDULE_TASK_SQL, (to_timestamp(deadline), task_id, user_id))
+
+        success = result.rowcount > 0
+        if success:
+            await self._notify(TaskChange("updated", user_id, task_id, "pending"))
+
+        return success
+
+    async def get_weekly_stats(self, user_id: int) -> Dict:
+        """Статистика за неделю"""
+        return pick(await self.get_dashboard_stats(user_id), WEEKLY_KEYS)
+
+    async def search_tasks(self, user_id: int, query: str) -> List[Task]:
+        """Полнотекстовый поиск задач (по релевантности, слова ищутся как префиксы)"""
+        match = build_match_query(query)
+        if match is None:
+            return []
+
+        return await self._fetch_tasks(SEARCH_SQL, (match, user_id))
+
+    async def import_tasks(self, user_id: int, rows: Iterable[Tuple], chunk_size: int = IMPORT_CHUNK) -> int:
+        """Вставить задачи (title, description, deadline_ts, status) кусками через очередь записи.
+
+        rows читаются в отдельном потоке: разбор файла не блокирует event loop.
+        """
+        created_at = now_timestamp()
+        total = 0
+        chunks = iter_chunks(rows, chunk_size)
+
+        while chunk := await asyncio.to_thread(next, chunks, None):
+            params = [(*row, created_at, user_id) for row in chunk]
+            result = await self._write(IMPORT_TASKS_SQL, params, many=True)
+            total += result.rowcount
+
+        if total:
+            await self._notify(TaskChange("imported", user_id, 0))
+
+        return total
+
+    async def iter_tasks(self, user_id: int) -> AsyncIterator[Task]:
+        """Все задачи пользователя потоком с курсора (в памяти — одна пачка строк)"""
+        # В замер идёт только чтение пачек, не обработка задач потребителем
+        elapsed, total = 0.0, 0
+        async with self.reader.execute(EXPORT_TASKS_SQL, (user_id, user_id)) as cursor:
+            while True:
+                started = time.perf_counter()
+                rows = await cursor.fetchmany(EXPORT_BATCH)
+                elapsed += time.perf_counter() - started
+                if not rows:
+                    break
+
+                total += len(rows)
+                for row in rows:
+                    yield Task.from_row(row)
+
+        self._observe(EXPORT_TASKS_SQL, (user_id, user_id), time.perf_counter() - elapsed, total)
+
+    async def archive_completed(self, before: int, limit: int = ARCHIVE_BATCH) -> int:
+        """Перенести в task_archive до limit выполненных задач с дедлайном раньше before.
+
+        Выполненные задачи не входят ни в кэшируемые выборки, ни в напоминания,
+        поэтому подписчики не уведомляются.
+        """
+        result = await self._write(ARCHIVE_COMPLETED_SQL, (before, limit, now_timestamp()))
+        return result.rowcount
+
+    async def compact(self, vacuum: bool = False):
+        """PRAGMA optimize, с vacuum — ещё и VACUUM (между пачками group commit)"""
+        async with self._batch_lock:
+            started = time.perf_counter()
+            await self.conn.execute("PRAGMA optimize")
+            self._observe("PRAGMA optimize", (), started, 0)
+            if vacuum:
+                started = time.perf_counter()
+                await self.conn.execute("VACUUM")
+                self._observe("VACUUM", (), started, 0)
+
+    async def data_version(self) -> int:
+        """PRAGMA data_version: меняется, когда файл изменило другое соединение (другой процесс)"""
+        return (await self._fetchone("PRAGMA data_version"))[0]
+
+
+class ShardedDatabase:
+    """Пользователи, разнесённые по нескольким файлам SQLite.
+
+    Пользователь закреплён за шардом user_id % shards, поэтому тяжёлый
+    пользователь нагружает только свой файл и своё соединение. Методы с
+    user_id первым аргументом вызываются у соответствующего AsyncDatabase.
+    """
+
+    USER_METHODS = {
+        "get_all_tasks", "get_tasks_page", "get_today_tasks", "get_overdue_tasks",
+        "get_dashboard_stats", "get_stats", "get_weekly_stats", "create_task",
+        "update_task_status", "delete_task", "get_task_by_id", "get_upcoming_tasks",
+        "search_tasks", "claim_orphan_tasks", "import_tasks", "iter_tasks",
+        "update_tasks_status", "delete_tasks", "get_next_pending_deadline",
+        "set_recurrence", "reschedule_task",
+    }
+
+    def __init__(self, db_path: str, shards: int):
+        self.shards = [AsyncDatabase(path) for path in shard_paths(db_path, shards)]
+
+    def for_user(self, user_id: int) -> AsyncDatabase:
+        return self.shards[user_id % len(self.shards)]
+
+    @property
+    def failed_writes(self) -> int:
+        return sum(shard.failed_writes for shard in self.shards)
+
+    def __getattr__(self, name: str):
+        if name not in self.USER_METHODS:
+            raise AttributeError(name)
+
+        def call(user_id: int, *args, **kwargs):
+            return getattr(self.for_user(user_id), name)(user_id, *args, **kwargs)
+
+        return call
+
+    def add_listener(self, listener: Callable):
+        for shard in self.shards:
+            shard.add_listener(listener)
+
+    def add_query_hook(self, hook: Callable):
+        for shard in self.shards:
+            shard.add_query_hook(hook)
+
+    async def connect(self):
+        for shard in self.shards:
+            await shard.connect()
+
+    async def close(self):
+        for shard in self.shards:
+            await shard.close()
+
+    async def archive_completed(self, before: int, limit: int = ARCHIVE_BATCH) -> int:
+        """Перенос пачки в архив на каждом шарде; возвращает общее число задач"""
+        moved = await asyncio.gather(*(shard.archive_completed(before, limit) for shard in self.shards))
+        return sum(moved)
+
+    async def compact(self, vacuum: bool = False):
+        for shard in self.shards:
+            await shard.compact(vacuum)
+
+    async def data_version(self) -> tuple:
+        return tuple([await shard.data_version() for shard in self.shards])
+
+    async def get_pending_tasks_from(self, since: datetime) -> List[Task]:
+        """Ожидающие задачи всех шардов с дедлайном не раньше since"""
+        results = await asyncio.gather(*(shard.get_pending_tasks_from(since) for shard in self.shards))
+
+        return list(heapq.merge(*results, key=lambda task: task.deadline))
+
+    async def get_reminded(self, since: datetime) -> List[Tuple[int, int, int]]:
+        results = await asyncio.gather(*(shard.get_reminded(since) for shard in self.shards))
+        return [row for rows in results for row in rows]
+
+    async def change_watermark(self) -> tuple:
+        return tuple([await shard.change_watermark() for shard in self.shards])
+
+    async def get_changed_tasks(self, watermark: tuple) -> Tuple[List[Task], tuple]:
+        results = await asyncio.gather(*(
+            shard.get_changed_tasks(mark) for shard, mark in zip(self.shards, watermark)
+        ))
+        return [task for tasks, _ in results for task in tasks], tuple(mark for _, mark in results)
 
-        tasks = []
-        for row in rows:
-            tasks.append({
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "deadline": row[3],
-                "status": row[4],
-                "created_at": row[5]
-            })
-
-        return tasks
+    async def mark_reminded(self, tasks: Iterable[Task]) -> int:
+        by_shard: Dict[int, List[Task]] = {}
+        for task in tasks:
+            by_shard.setdefault(task.user_id % len(self.shards), []).append(task)
+        marked = await asyncio.gather(*(self.shards[index].mark_reminded(group) for index, group in by_shard.items()))
+        return sum(marked)
@@ -1,9 +1,34 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from functools import lru_cache
 import calendar
 
+from callbacks import (
+    BulkAction, BulkOp, CalendarNav, Cancel, DeleteTask, Direction, DoneTask, Ignore, PageNav, PickDate,
+    PickTime, SelectPage, StartTask, ToggleTask
+)
 
+# Клавиатуры неизменяемы после сборки, поэтому статические строятся один раз,
+# а календари кэшируются по (год, месяц, сегодня) в ограниченном LRU.
+
+MONTH_NAMES = {
+    1: "Январь", 2: "Февраль", 3: "Март", 4: "Апрель",
+    5: "Май", 6: "Июнь", 7: "Июль", 8: "Август",
+    9: "Сентябрь", 10: "Октябрь", 11: "Ноябрь", 12: "Декабрь"
+}
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+CALENDAR = calendar.Calendar(firstweekday=0)  # Понедельник первый
+
+CALENDAR_CACHE_SIZE = 64
+
+IGNORE = Ignore().pack()
+CANCEL = Cancel().pack()
+
+
+@lru_cache(maxsize=None)
 def get_main_keyboard():
     """Главное меню"""
     kb = [
@@ -13,6 +38,7 @@ def get_main_keyboard():
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, one_time_keyboard=False)
 
 
+@lru_cache(maxsize=None)
 def get_tasks_keyboard():
     """Меню задач"""
     kb = [
@@ -22,89 +48,201 @@ def get_tasks_keyboard():
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, one_time_keyboard=True)
 
 
+def menu_button_texts():
+    """Тексты кнопок главного меню и меню задач"""
+    return [
+        button.text
+        for markup in (get_main_keyboard(), get_tasks_keyboard())
+        for row in markup.keyboard
+        for button in row
+    ]
+
+
 def get_task_actions_keyboard(task_id: int):
     """Действия с задачей"""
     builder = InlineKeyboardBuilder()
     
     builder.row(
-        InlineKeyboardButton(text="✅ Выполнить", callback_data=f"done_{task_id}"),
-        InlineKeyboardButton(text="▶️ В работу", callback_data=f"start_{task_id}")
+        InlineKeyboardButton(text="✅ Выполнить", callback_data=DoneTask(task_id=task_id).pack()),
+        InlineKeyboardButton(text="▶️ В работу", callback_data=StartTask(task_id=task_id).pack())
     )
     builder.row(
-        InlineKeyboardButton(text="🗑 Удалить", callback_data=f"delete_{task_id}"),
-        InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")
+        InlineKeyboardButton(text="🗑 Удалить", callback_data=DeleteTask(task_id=task_id).pack()),
+        InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL)
     )
     
     return builder.as_markup()
 
 
+def get_pagination_keyboard(prev_cursor=None, next_cursor=None, select_cursor=None):
+    """Листание списка задач; курсор — (deadline, id) крайней задачи страницы.
+
+    select_cursor открывает множественный выбор для задач этой же страницы
+    (курсор «после», с которого страница начинается).
+    """
+    buttons = []
+
+    if prev_cursor:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=PageNav(
+            direction=Direction.PREV, deadline=prev_cursor[0], task_id=prev_cursor[1]
+        ).pack()))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=PageNav(
+            direction=Direction.NEXT, deadline=next_cursor[0], task_id=next_cursor[1]
+        ).pack()))
+
+    if not buttons and not select_cursor:
+        return None
+
+    builder = InlineKeyboardBuilder()
+    if buttons:
+        builder.row(*buttons)
+    if select_cursor:
+        builder.row(InlineKeyboardButton(
+            text="☑️ Выбрать несколько",
+            callback_data=SelectPage(deadline=select_cursor[0], task_id=select_cursor[1]).pack()
+        ))
+
+    return builder.as_markup()
+
+
+SELECTED = "✅"
+UNSELECTED = "⬜"
+TOGGLE_PREFIX = ToggleTask.__prefix__ + ToggleTask.__separator__
+
+
+def get_selection_keyboard(tasks):
+    """Множественный выбор: задача на строку, внизу действия над отмеченными.
+
+    Отметки хранятся в самих кнопках сообщения, поэтому отдельное состояние не нужно.
+    """
+    builder = InlineKeyboardBuilder()
+
+    for task in tasks:
+        builder.row(InlineKeyboardButton(
+            text=f"{UNSELECTED} [{task.id}] {task.title[:30]}", callback_data=ToggleTask(task_id=task.id).pack()
+        ))
+
+    builder.row(
+        InlineKeyboardButton(text="✅ Выполнить", callback_data=BulkAction(op=BulkOp.DONE).pack()),
+        InlineKeyboardButton(text="▶️ В работу", callback_data=BulkAction(op=BulkOp.START).pack())
+    )
+    builder.row(
+        InlineKeyboardButton(text="🗑 Удалить", callback_data=BulkAction(op=BulkOp.DELETE).pack()),
+        InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL)
+    )
+
+    return builder.as_markup()
+
+
+def toggle_selection(markup: InlineKeyboardMarkup, task_id: int) -> InlineKeyboardMarkup:
+    """Переключить отметку задачи в клавиатуре выбора"""
+    callback_data = ToggleTask(task_id=task_id).pack()
+    rows = []
+
+    for row in markup.inline_keyboard:
+        buttons = []
+        for button in row:
+            if button.callback_data == callback_data:
+                mark, label = button.text.split(" ", 1)
+                mark = UNSELECTED if mark == SELECTED else SELECTED
+                button = InlineKeyboardButton(text=f"{mark} {label}", callback_data=callback_data)
+            buttons.append(button)
+        rows.append(buttons)
+
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def selected_ids(markup: InlineKeyboardMarkup) -> list:
+    """id отмеченных задач"""
+    return [
+        ToggleTask.unpack(button.callback_data).task_id
+        for row in markup.inline_keyboard
+        for button in row
+        if button.callback_data and button.callback_data.startswith(TOGGLE_PREFIX) and button.text.startswith(SELECTED)
+    ]
+
+
+@lru_cache(maxsize=None)
 def get_cancel_keyboard():
     """Кнопка отмены"""
     kb = [[KeyboardButton(text="❌ Отмена")]]
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, one_time_keyboard=True)
 
 
+_calendar_day = None
+
+
 def get_calendar_keyboard(year: int = None, month: int = None):
     """Inline календарь"""
+    global _calendar_day
+
+    today = date.today()
     if year is None or month is None:
-        now = datetime.now()
-        year = now.year
-        month = now.month
-    
+        year = today.year
+        month = today.month
+
+    # В полночь меняется подсветка и блокировка дней: старые записи больше не нужны
+    if today != _calendar_day:
+        _build_calendar_keyboard.cache_clear()
+        _calendar_day = today
+
+    return _build_calendar_keyboard(year, month, today)
+
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def _build_calendar_keyboard(year: int, month: int, today: date):
     builder = InlineKeyboardBuilder()
     
-    # Заголовок с месяцем и годом
-    month_name = {
-        1: "Январь", 2: "Февраль", 3: "Март", 4: "Апрель",
-        5: "Май", 6: "Июнь", 7: "Июль", 8: "Август",
-        9: "Сентябрь", 10: "Октябрь", 11: "Ноябрь", 12: "Декабрь"
-    }
-    
-    # Навигация по месяцам
+    # Навигация по месяцам (соседний месяц считается здесь: в данных всегда 1..12)
+    prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
     builder.row(
-        InlineKeyboardButton(text="◀️", callback_data=f"cal_{year}_{month-1}"),
-        InlineKeyboardButton(text=f"{month_name[month]} {year}", callback_data="ignore"),
-        InlineKeyboardButton(text="▶️", callback_data=f"cal_{year}_{month+1}")
+        InlineKeyboardButton(text="◀️", callback_data=CalendarNav(year=prev_year, month=prev_month).pack()),
+        InlineKeyboardButton(text=f"{MONTH_NAMES[month]} {year}", callback_data=IGNORE),
+        InlineKeyboardButton(text="▶️", callback_data=CalendarNav(year=next_year, month=next_month).pack())
     )
     
     # Дни недели
-    days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-    builder.row(*[InlineKeyboardButton(text=day, callback_data="ignore") for day in days])
+    builder.row(*[InlineKeyboardButton(text=day, callback_data=IGNORE) for day in WEEKDAYS])
     
     # Дни месяца
-    cal = calendar.Calendar(firstweekday=0)  # Понедельник первый
-    
-    today = datetime.now()
-    
-    for week in cal.monthdayscalendar(year, month):
+    for week in CALENDAR.monthdayscalendar(year, month):
         row = []
         for day in week:
             if day == 0:
-                row.append(InlineKeyboardButton(text=" ", callback_data="ignore"))
+                row.append(InlineKeyboardButton(text=" ", callback_data=IGNORE))
             else:
-                date = datetime(year, month, day)
+                day_date = date(year, month, day)
                 
                 # Блокируем прошедшие дни
-                if date.date() < today.date():
-                    row.append(InlineKeyboardButton(text="·", callback_data="ignore"))
-                elif date.date() == today.date():
+                if day_date < today:
+                    row.append(InlineKeyboardButton(text="·", callback_data=IGNORE))
+                elif day_date == today:
                     # Подсвечиваем сегодняшний день
-                    row.append(InlineKeyboardButton(text=f"•{day}•", callback_data=f"date_{year}_{month}_{day}"))
+                    row.append(InlineKeyboardButton(text=f"•{day}•", callback_data=_pick_date(day_date)))
                 else:
-                    row.append(InlineKeyboardButton(text=str(day), callback_data=f"date_{year}_{month}_{day}"))
+                    row.append(InlineKeyboardButton(text=str(day), callback_data=_pick_date(day_date)))
         
         builder.row(*row)
     
     # Быстрый выбор
+    tomorrow = today + timedelta(days=1)
+    next_week = today + timedelta(days=7)
     builder.row(
-        InlineKeyboardButton(text="Сегодня", callback_data=f"date_{today.year}_{today.month}_{today.day}"),
-        InlineKeyboardButton(text="Завтра", callback_data=f"date_{(today + timedelta(days=1)).year}_{(today + timedelta(days=1)).month}_{(today + timedelta(days=1)).day}"),
-        InlineKeyboardButton(text="Через неделю", callback_data=f"date_{(today + timedelta(days=7)).year}_{(today + timedelta(days=7)).month}_{(today + timedelta(days=7)).day}")
+        InlineKeyboardButton(text="Сегодня", callback_data=_pick_date(today)),
+        InlineKeyboardButton(text="Завтра", callback_data=_pick_date(tomorrow)),
+        InlineKeyboardButton(text="Через неделю", callback_data=_pick_date(next_week))
     )
     
     return builder.as_markup()
 
 
+def _pick_date(day: date) -> str:
+    return PickDate(year=day.year, month=day.month, day=day.day).pack()
+
+
+@lru_cache(maxsize=None)
 def get_time_keyboard():
     """Inline выбор времени"""
     builder = InlineKeyboardBuilder()
@@ -117,13 +255,17 @@ def get_time_keyboard():
     ]
     
     for row in times:
-        builder.row(*[InlineKeyboardButton(text=t, callback_data=f"time_{t}") for t in row])
+        builder.row(*[
+            InlineKeyboardButton(text=t, callback_data=PickTime(hour=int(t[:2]), minute=int(t[3:])).pack())
+            for t in row
+        ])
     
-    builder.row(InlineKeyboardButton(text="Вручную", callback_data="time_manual"))
+    builder.row(InlineKeyboardButton(text="Вручную", callback_data=PickTime().pack()))
     
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def get_back_keyboard():
     """Кнопка назад"""
     kb = [[KeyboardButton(text="🔙 Назад")]]
@@ -0,0 +1,126 @@
+"""Выбор ведущего процесса через аренду в SQLite.
+
+Несколько воркеров (supervisor.py) работают с одной БД, но напоминания и
+архивация должны идти ровно в одном из них. Роль закреплена строкой в
+таблице lease: воркер забирает её одним INSERT ... ON CONFLICT, если
+аренда свободна, истекла или уже его, и продлевает каждые ttl / 3. Упавший
+воркер перестаёт продлевать, и через ttl роль забирает другой.
+
+Аренда лежит в отдельном файле (lease_path): её продление не меняет
+PRAGMA data_version основной БД, по которой ведущий замечает чужие задачи.
+
+Ошибка продления (БД занята дольше busy timeout, диск) снимает роль сразу:
+лучше пропустить цикл, чем на время разделения держать двух ведущих.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+
+import aiosqlite
+
+from timeutil import now_timestamp
+
+logger = logging.getLogger(__name__)
+
+CREATE_LEASE_SQL = """CREATE TABLE IF NOT EXISTS lease (
+                          name TEXT PRIMARY KEY,
+                          holder TEXT NOT NULL,
+                          expires_at INTEGER NOT NULL
+                      )"""
+
+ACQUIRE_LEASE_SQL = """INSERT INTO lease (name, holder, expires_at) VALUES (?, ?, ?)
+                       ON CONFLICT(name) DO UPDATE SET
+                       holder = excluded.holder, expires_at = excluded.expires_at
+                       WHERE lease.holder = excluded.holder OR lease.expires_at < ?"""
+
+RELEASE_LEASE_SQL = "DELETE FROM lease WHERE name = ? AND holder = ?"
+
+
+def lease_path(db_path: str) -> str:
+    """Файл аренд рядом с основной БД"""
+    base, ext = os.path.splitext(db_path)
+    return f"{base}.lease{ext}"
+
+
+class LeaderLease:
+    """Аренда роли name в файле lease_path; on_elected/on_demoted — при её получении и потере"""
+
+    def __init__(
+        self,
+        db_path: str,
+        holder: str,
+        name: str = "scheduler",
+        ttl: timedelta = timedelta(seconds=30),
+        on_elected: Optional[Callable[[], Awaitable]] = None,
+        on_demoted: Optional[Callable[[], Awaitable]] = None
+    ):
+        self.db_path = db_path
+        self.holder = holder
+        self.name = name
+        self.ttl = max(int(ttl.total_seconds()), 3)
+        self.renew_interval = self.ttl / 3
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Открыть соединение и запустить цикл захвата/продления"""
+        if self._conn is None:
+            self._conn = await aiosqlite.connect(self.db_path)
+            await self._conn.execute(CREATE_LEASE_SQL)
+            await self._conn.commit()
+            self._loop_task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        """Отдать роль (следующий воркер получит её без ожидания ttl) и закрыть соединение"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+        if self._conn is not None:
+            if self.is_leader:
+                await self._set_leader(False)
+                try:
+                    await self._conn.execute(RELEASE_LEASE_SQL, (self.name, self.holder))
+                    await self._conn.commit()
+                except sqlite3.Error:
+                    logger.exception("Failed to release lease %s", self.name)
+            await self._conn.close()
+            self._conn = None
+
+    async def _loop(self):
+        while True:
+            try:
+                leading = await self._acquire()
+            except sqlite3.Error:
+                logger.exception("Lease %s renewal failed", self.name)
+                leading = False
+
+            await self._set_leader(leading)
+            await asyncio.sleep(self.renew_interval)
+
+    async def _acquire(self) -> bool:
+        now = now_timestamp()
+        cursor = await self._conn.execute(ACQUIRE_LEASE_SQL, (self.name, self.holder, now + self.ttl, now))
+        await self._conn.commit()
+        return cursor.rowcount > 0
+
+    async def _set_leader(self, leading: bool):
+        if leading == self.is_leader:
+            return
+
+        self.is_leader = leading
+        logger.info("%s %s lease %s", self.holder, "acquired" if leading else "lost", self.name)
+        callback = self.on_elected if leading else self.on_demoted
+        if callback is not None:
+            await callback()
@@ -0,0 +1,228 @@
+"""Метрики обработчиков и SQL-запросов в формате Prometheus.
+
+HandlerMetricsMiddleware замеряет обработчики aiogram, observe_query
+подключается к AsyncDatabase.add_query_hook и замеряет каждый запрос.
+Гистограммы отдаются на /metrics (text exposition format 0.0.4) и кратко —
+в админской команде /perf. Внешних зависимостей нет.
+"""
+import re
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.filters import CommandObject
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from aiohttp import web
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами по одному лейблу"""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...] = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        # значение лейбла -> [счётчики корзин..., +Inf], сумма
+        self._series: Dict[str, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, label_value: str, seconds: float):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, seconds)] += 1
+        series[1][0] += seconds
+
+    def stats(self) -> List[Tuple[str, int, float, float]]:
+        """(лейбл, число, сумма секунд, p95 — верхняя граница корзины)"""
+        result = []
+        for label_value, (counts, total) in self._series.items():
+            count = sum(counts)
+            rank, seen, p95 = count * 0.95, 0, float("inf")
+            for bound, bucket_count in zip(self.buckets, counts):
+                seen += bucket_count
+                if seen >= rank:
+                    p95 = bound
+                    break
+            result.append((label_value, count, total[0], p95))
+        return result
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label_value, (counts, total) in sorted(self._series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}'
+            cumulative += counts[-1]
+            yield f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}'
+            yield f"{self.name}_sum{{{label}}} {total[0]}"
+            yield f"{self.name}_count{{{label}}} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[str, float] = {}
+
+    def inc(self, label_value: str, amount: float = 1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def get(self, label_value: str) -> float:
+        return self._values.get(label_value, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for label_value, value in sorted(self._values.items()):
+            yield f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+HANDLER_LATENCY = Histogram("taskflow_handler_duration_seconds", "Время обработки апдейта", "handler")
+HANDLER_ERRORS = Counter("taskflow_handler_errors_total", "Исключения в обработчиках", "handler")
+QUERY_LATENCY = Histogram("taskflow_sql_duration_seconds", "Время выполнения SQL", "query")
+QUERY_ROWS = Counter("taskflow_sql_rows_total", "Строк возвращено (для записей — затронуто)", "query")
+
+METRICS = (HANDLER_LATENCY, HANDLER_ERRORS, QUERY_LATENCY, QUERY_ROWS)
+
+# Дополнительные показатели (очередь отправки, кэш): имя -> функция без аргументов
+_gauges: Dict[str, Callable[[], float]] = {}
+
+
+def register_gauge(name: str, read: Callable[[], float]):
+    _gauges[name] = read
+
+
+# --- SQL ---
+
+_query_names: Dict[str, str] = {}
+_SPACES_RE = re.compile(r"\s+")
+
+
+def name_queries(namespace: Dict[str, Any]):
+    """Подписывать запросы именами констант *_SQL модуля (например, globals() database.py)"""
+    for name, value in namespace.items():
+        if name.endswith("_SQL") and isinstance(value, str):
+            _query_names[value] = name
+
+
+@lru_cache(maxsize=256)
+def query_label(sql: str) -> str:
+    # Запросы, собранные на лету (bulk, страницы), подписываются началом текста
+    return _query_names.get(sql) or _SPACES_RE.sub(" ", sql).strip()[:60]
+
+
+def observe_query(sql: str, params, seconds: float, rows: int):
+    """Хук AsyncDatabase.add_query_hook"""
+    label = query_label(sql)
+    QUERY_LATENCY.observe(label, seconds)
+    QUERY_ROWS.inc(label, rows)
+
+
+# --- обработчики ---
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время обработчиков по команде, тексту кнопки или callback_data.
+
+    Произвольный текст (название задачи в мастере) и незарегистрированные
+    команды в лейбл не попадают — вместо них используется имя обработчика,
+    так что число рядов ограничено.
+    callback_data подписывается callback_label (CallbackTable.label — имя
+    обработчика), по умолчанию — префиксом до ":".
+    """
+
+    def __init__(self, button_texts: Iterable[str] = (), callback_label: Optional[Callable[[str], str]] = None):
+        self.button_texts = frozenset(button_texts)
+        self.callback_label = callback_label or (lambda data: data.partition(":")[0])
+
+    def label(self, event: TelegramObject, data: Dict[str, Any]) -> str:
+        if isinstance(event, Message) and event.text:
+            # Только команды, прошедшие фильтр Command: «/что-угодно» уходит в имя обработчика
+            command = data.get("command")
+            if isinstance(command, CommandObject):
+                return command.prefix + command.command
+            if event.text in self.button_texts:
+                return event.text
+        elif isinstance(event, CallbackQuery) and event.data:
+            return "cb:" + self.callback_label(event.data)
+
+        handler = data.get("handler")
+        return getattr(getattr(handler, "callback", None), "__name__", type(event).__name__)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        label = self.label(event, data)
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(label)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(label, time.perf_counter() - started)
+
+
+# --- вывод ---
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, read in sorted(_gauges.items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {read()}")
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+def setup_routes(app: web.Application, path: str = "/metrics"):
+    app.router.add_get(path, metrics_handler)
+
+
+def perf_report(top: int = 10) -> str:
+    """Сводка для /perf: самые медленные обработчики и самые дорогие запросы"""
+    lines = ["⏱ <b>Обработчики</b> (p95 / среднее / вызовов):"]
+    handlers = sorted(HANDLER_LATENCY.stats(), key=lambda item: item[2] / item[1], reverse=True)
+    for label, count, total, p95 in handlers[:top]:
+        lines.append(f"• {_html(label)}: ≤{_ms(p95)} / {total / count * 1000:.1f}мс / {count}")
+
+    lines.append("\n🗄 <b>SQL</b> (всего / среднее / вызовов / строк):")
+    queries = sorted(QUERY_LATENCY.stats(), key=lambda item: item[2], reverse=True)
+    for label, count, total, _ in queries[:top]:
+        lines.append(
+            f"• {_html(label)}: {total * 1000:.0f}мс / {total / count * 1000:.2f}мс / {count} / {QUERY_ROWS.get(label):.0f}"
+        )
+
+    if _gauges:
+        lines.append("")
+        lines.extend(f"{name}: {read():g}" for name, read in sorted(_gauges.items()))
+
+    return "\n".join(lines)
+
+
+def _ms(seconds: float) -> str:
+    return "∞" if seconds == float("inf") else f"{seconds * 1000:g}мс"
+
+
+def _html(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -0,0 +1,126 @@
+"""Повторяющиеся задачи.
+
+Правило хранится в task.recurrence строкой: "daily", "weekly" или "monthly",
+через двоеточие — интервал ("daily:2" — через день) и для monthly день
+месяца ("monthly:1:31": в коротких месяцах — последний день). Сами вхождения
+не хранятся: дедлайн задачи — текущее вхождение, выполнение переносит его
+на следующее.
+
+Вхождения в окне выборки (сегодня, ближайшие 24 часа) строит генератор:
+номер первого вхождения в окне вычисляется арифметически от дедлайна, так
+что прошлые и будущие вхождения за окном ничего не стоят.
+"""
+import calendar
+import heapq
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    # database импортирует этот модуль
+    from database import Task
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+STEP_DAYS = {"daily": 1, "weekly": 7}
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    freq: str
+    interval: int = 1
+    day: Optional[int] = None  # для monthly: день месяца, к которому привязан повтор
+
+    @classmethod
+    def parse(cls, text: str) -> "Rule":
+        freq, *rest = text.strip().lower().split(":")
+        if freq not in FREQUENCIES or len(rest) > 2:
+            raise ValueError(f"неизвестное правило повтора {text!r}")
+
+        try:
+            numbers = [int(part) for part in rest]
+        except ValueError:
+            raise ValueError(f"неизвестное правило повтора {text!r}") from None
+        interval = numbers[0] if numbers else 1
+        day = numbers[1] if len(numbers) > 1 else None
+        if interval < 1 or (day is not None and not 1 <= day <= 31):
+            raise ValueError(f"неверный интервал повтора {text!r}")
+
+        return cls(freq, interval, day)
+
+    def anchored(self, deadline: datetime) -> "Rule":
+        """Привязать monthly к дню дедлайна, чтобы 31-е не сползало на 28-е после февраля"""
+        if self.freq == "monthly" and self.day is None:
+            return replace(self, day=deadline.day)
+        return self
+
+    def __str__(self) -> str:
+        if self.day is not None:
+            return f"{self.freq}:{self.interval}:{self.day}"
+        return self.freq if self.interval == 1 else f"{self.freq}:{self.interval}"
+
+    def nth(self, start: datetime, n: int) -> datetime:
+        """n-е вхождение, считая start нулевым"""
+        if self.freq != "monthly":
+            return start + timedelta(days=STEP_DAYS[self.freq] * self.interval * n)
+
+        year, month = divmod(start.month - 1 + self.interval * n, 12)
+        year += start.year
+        day = min(self.day or start.day, calendar.monthrange(year, month + 1)[1])
+        return start.replace(year=year, month=month + 1, day=day)
+
+    def first_index(self, start: datetime, moment: datetime) -> int:
+        """Номер первого вхождения не раньше moment — без перебора предыдущих"""
+        if moment <= start:
+            return 0
+
+        if self.freq == "monthly":
+            months = (moment.year - start.year) * 12 + moment.month - start.month
+            n = max(0, months // self.interval)
+        else:
+            step = timedelta(days=STEP_DAYS[self.freq] * self.interval)
+            n = (moment - start) // step
+
+        # Деление даёт вхождение не позже moment; следующее — уже не раньше
+        return n if self.nth(start, n) >= moment else n + 1
+
+    def occurrences(self, start: datetime, window_start: datetime, window_end: datetime) -> Iterator[datetime]:
+        """Вхождения в [window_start, window_end], начиная с start"""
+        n = self.first_index(start, window_start)
+        while (moment := self.nth(start, n)) <= window_end:
+            yield moment
+            n += 1
+
+    def next_after(self, start: datetime, moment: datetime) -> datetime:
+        """Первое вхождение строго позже moment"""
+        return self.nth(start, self.first_index(start, moment + timedelta(seconds=1)))
+
+
+def occurrence_at_or_after(task: "Task", moment: datetime) -> "Task":
+    """Повторяющаяся задача с дедлайном ближайшего вхождения не раньше moment"""
+    rule = Rule.parse(task.recurrence)
+    return replace(task, deadline=rule.nth(task.deadline, rule.first_index(task.deadline, moment)))
+
+
+def expand(series: Iterable["Task"], window_start: datetime, window_end: datetime) -> Iterator["Task"]:
+    """Вхождения повторяющихся задач в окне, по каждой задаче — по возрастанию"""
+    for task in series:
+        rule = Rule.parse(task.recurrence)
+        for moment in rule.occurrences(task.deadline, window_start, window_end):
+            yield replace(task, deadline=moment)
+
+
+def with_occurrences(tasks: List["Task"], series: Iterable["Task"], window_start: int, window_end: int) -> List["Task"]:
+    """Обычные задачи окна (отсортированы по дедлайну) вместе с вхождениями повторяющихся"""
+    occurrences = sorted(
+        expand(series, datetime.fromtimestamp(window_start), datetime.fromtimestamp(window_end)),
+        key=lambda task: task.deadline
+    )
+    if not occurrences:
+        return tasks
+
+    return list(heapq.merge(tasks, occurrences, key=lambda task: task.deadline))
+
+
+def next_occurrence(series: Iterable["Task"], since: datetime) -> Optional[datetime]:
+    """Ближайшее вхождение не раньше since среди повторяющихся задач"""
+    return min((occurrence_at_or_after(task, since).deadline for task in series), default=None)
@@ -0,0 +1,222 @@
+"""Push-напоминания о дедлайнах.
+
+Вместо опроса БД планировщик держит в памяти min-heap моментов
+напоминаний и один таймер APScheduler на ближайший из них. Куча
+обновляется по событиям AsyncDatabase (создание, смена статуса,
+удаление), каждое изменение стоит O(log n). Удалённые и изменённые
+задачи вычищаются из кучи лениво, при подходе к вершине. Повторяющаяся
+задача держит в куче одно ближайшее вхождение; после напоминания в кучу
+кладётся следующее.
+
+Отправленные напоминания запоминаются в task.reminded_deadline, поэтому
+перезапуск или смена ведущего не повторяют напоминания о задачах, чей
+момент напоминания уже прошёл.
+
+При нескольких воркерах (supervisor.py) планировщик работает только у
+ведущего, а задачи создают все: с sync_interval он раз в интервал
+сверяет PRAGMA data_version и, если файл изменил другой процесс,
+дочитывает только задачи с id или task.revision больше уже виденных.
+Удаление ревизию не оставляет, поэтому перед отправкой задачи
+перечитываются по id.
+"""
+import asyncio
+import heapq
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import AsyncDatabase, Task, TaskChange
+from recurrence import occurrence_at_or_after
+from sender import bulk_lane
+from timeutil import now_timestamp, to_timestamp
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "next_reminder"
+
+
+class ReminderScheduler:
+    """Напоминания владельцам задач (чат с пользователем = user_id)"""
+
+    def __init__(self, bot: Bot, db: AsyncDatabase, remind_before: timedelta = timedelta(hours=1),
+                 sync_interval: Optional[timedelta] = None):
+        self.bot = bot
+        self.db = db
+        self.remind_before = int(remind_before.total_seconds())
+        self.sync_interval = sync_interval
+        self.scheduler = AsyncIOScheduler()
+        self._data_version = None
+        self._watermark = None
+
+        # (момент напоминания, user_id, id задачи); актуальные записи — в self._entries
+        self._heap: List[Tuple[int, int, int]] = []
+        self._entries: Dict[Tuple[int, int], Tuple[int, Task]] = {}
+        self._timer_at: Optional[int] = None
+        # (user_id, id задачи, дедлайн) уже отправленных (копия task.reminded_deadline):
+        # перечитывание задач не повторяет напоминание
+        self._reminded: Set[Tuple[int, int, int]] = set()
+
+    async def start(self):
+        """Загрузить ожидающие задачи и запустить таймер (повторно — после shutdown)"""
+        if self.sync_interval:
+            self._data_version = await self.db.data_version()
+        self._reminded.update(await self.db.get_reminded(datetime.now()))
+        # Водяной знак берётся до загрузки: изменения между ними дочитаются повторно
+        self._watermark = await self.db.change_watermark()
+        await self._load()
+
+        self._timer_at = None
+        self.scheduler.start()
+        if self.sync_interval:
+            self.scheduler.add_job(self._sync, "interval", seconds=self.sync_interval.total_seconds(),
+                                   id="sync", replace_existing=True, max_instances=1, coalesce=True)
+        self._reschedule()
+        logger.info("Reminder scheduler started with %d pending tasks", len(self._entries))
+
+    async def _load(self):
+        tasks = await self.db.get_pending_tasks_from(datetime.now())
+        self._entries = {}
+        self._heap = []
+        for task in tasks:
+            self._push(task)
+
+    def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    async def _apply_changes(self):
+        """Дочитать задачи, созданные или изменённые после водяного знака"""
+        tasks, self._watermark = await self.db.get_changed_tasks(self._watermark)
+        for task in tasks:
+            self._entries.pop((task.user_id, task.id), None)
+            if task.status == "pending":
+                self._push(task)
+
+    async def _sync(self):
+        """Дочитать задачи, если их меняли другие воркеры"""
+        version = await self.db.data_version()
+        if version != self._data_version:
+            self._data_version = version
+            await self._apply_changes()
+            self._reschedule()
+
+    async def _still_due(self, task: Task) -> bool:
+        """Задачу могли удалить или изменить другие воркеры после последней сверки"""
+        current = await self.db.get_task_by_id(task.user_id, task.id)
+        return current is not None and current.status == "pending" and (
+            current.recurrence is not None or current.deadline == task.deadline
+        )
+
+    def _fire_at(self, task: Task) -> int:
+        return to_timestamp(task.deadline) - self.remind_before
+
+    def _push(self, task: Task):
+        if task.recurrence:
+            task = occurrence_at_or_after(task, datetime.now())
+        deadline = to_timestamp(task.deadline)
+        if deadline < now_timestamp():
+            return  # дедлайн уже прошёл, напоминать поздно
+        if (task.user_id, task.id, deadline) in self._reminded:
+            return
+
+        fire_at = self._fire_at(task)
+        self._entries[task.user_id, task.id] = (fire_at, task)
+        heapq.heappush(self._heap, (fire_at, task.user_id, task.id))
+
+    def _is_current(self, fire_at: int, user_id: int, task_id: int) -> bool:
+        entry = self._entries.get((user_id, task_id))
+        return entry is not None and entry[0] == fire_at
+
+    def _drop_stale(self):
+        while self._heap and not self._is_current(*self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _reschedule(self):
+        """Переставить таймер на вершину кучи, если она изменилась"""
+        self._drop_stale()
+        next_at = self._heap[0][0] if self._heap else None
+
+        if next_at == self._timer_at:
+            return
+
+        self._timer_at = next_at
+        if next_at is None:
+            if self.scheduler.get_job(JOB_ID):
+                self.scheduler.remove_job(JOB_ID)
+            return
+
+        self.scheduler.add_job(
+            self._fire, "date",
+            run_date=datetime.fromtimestamp(next_at),
+            id=JOB_ID, replace_existing=True, misfire_grace_time=None
+        )
+
+    async def on_task_change(self, change: TaskChange):
+        """Подписчик AsyncDatabase"""
+        if not self.scheduler.running:
+            return  # не ведущий воркер: при старте задачи всё равно загружаются заново
+
+        if change.action == "created":
+            self._push(change.task)
+        elif change.action == "imported":
+            # Массовая вставка без списка id: новые задачи — это id после водяного знака
+            await self._apply_changes()
+        elif change.action == "deleted" or change.status not in ("pending", None):
+            self._entries.pop((change.user_id, change.task_id), None)
+        else:
+            # Задача вернулась в ожидание или изменилась (повтор, перенос): нужен её дедлайн
+            task = await self.db.get_task_by_id(change.user_id, change.task_id)
+            self._entries.pop((change.user_id, change.task_id), None)
+            if task is not None and task.status == "pending":
+                self._push(task)
+
+        self._reschedule()
+
+    async def _fire(self):
+        self._timer_at = None
+        now = now_timestamp()
+        due = []
+
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, user_id, task_id = heapq.heappop(self._heap)
+            if self._is_current(fire_at, user_id, task_id):
+                due.append(self._entries.pop((user_id, task_id))[1])
+
+        if self.sync_interval and due:
+            checks = await asyncio.gather(*(self._still_due(task) for task in due))
+            due = [task for task, ok in zip(due, checks) if ok]
+
+        # Прошедшие дедлайны из get_pending_tasks_from не вернутся — их ключи не нужны
+        self._reminded = {key for key in self._reminded if key[2] >= now}
+        self._reminded.update((task.user_id, task.id, to_timestamp(task.deadline)) for task in due)
+
+        # Рассылка идёт низким приоритетом, темп держит OutboundSender
+        with bulk_lane():
+            await asyncio.gather(*(self._send(task) for task in due))
+        try:
+            await self.db.mark_reminded(due)
+        except sqlite3.Error:
+            logger.exception("Failed to save %d sent reminders", len(due))
+
+        for task in due:
+            if task.recurrence:
+                self._push(occurrence_at_or_after(task, task.deadline + timedelta(seconds=1)))
+
+        self._reschedule()
+
+    async def _send(self, task: Task):
+        text = (
+            f"🔔 Скоро дедлайн!\n\n"
+            f"📋 {task.title}\n"
+            f"⏰ {task.deadline.strftime('%d.%m.%Y %H:%M')}"
+        )
+
+        try:
+            await self.bot.send_message(task.user_id, text)
+        except TelegramAPIError:
+            logger.exception("Failed to send reminder for task %s", task.id)
@@ -0,0 +1,138 @@
+"""Отрисовка списков задач в сообщения Telegram с учётом лимита 4096 символов.
+
+Строка задачи строится по шаблону, заранее подготовленному для каждого
+статуса (эмодзи подставлен, остаётся один вызов str.format). Задачи берутся
+из итератора по одной, текст собирается через список частей и "".join и
+режется на сообщения по границам задач, поэтому время линейно по числу
+задач, а в памяти держится не больше одного сообщения.
+"""
+import html
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from aiogram import types
+
+from database import Task
+
+MESSAGE_LIMIT = 4096
+STATUS_EMOJI = {"pending": "⏳", "running": "▶️", "completed": "✅"}
+UNKNOWN_STATUS = "❓"
+REPEAT_MARK = " 🔁"
+
+
+def text_length(text: str) -> int:
+    """Длина в единицах UTF-16 — так считает лимит Telegram"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+class LineTemplate:
+    """Шаблон строки задачи: поля {emoji}, {index}, {id}, {title}, {repeat}, {deadline}.
+
+    {emoji} подставляется один раз на статус при создании; title экранируется
+    для parse_mode="HTML" и обрезается до max_title символов, если задано;
+    {repeat} — отметка повторяющейся задачи.
+    """
+
+    def __init__(self, fmt: str, date_format: str, emoji: Optional[Dict[str, str]] = None,
+                 escape: bool = False, max_title: Optional[int] = None):
+        emoji = STATUS_EMOJI if emoji is None else emoji
+        self._formats: Dict[str, Callable[..., str]] = {
+            status: fmt.replace("{emoji}", mark).format for status, mark in emoji.items()
+        }
+        self._unknown = fmt.replace("{emoji}", UNKNOWN_STATUS).format
+        self.date_format = date_format
+        self.escape = escape
+        self.max_title = max_title
+
+    def __call__(self, task: Task, index: int = 0) -> str:
+        title = task.title
+        if self.max_title is not None and len(title) > self.max_title:
+            title = title[:self.max_title - 1] + "…"
+        if self.escape:
+            title = html.escape(title, quote=False)
+
+        return self._formats.get(task.status, self._unknown)(
+            index=index, id=task.id, title=title, repeat=REPEAT_MARK if task.recurrence else "",
+            deadline=task.deadline.strftime(self.date_format)
+        )
+
+
+TODAY_LINE = LineTemplate("{emoji} [{id}] {title}{repeat}\n   ⏰ {deadline}\n\n", "%H:%M")
+OVERDUE_LINE = LineTemplate(
+    "{emoji} [{id}] {title}\n   ⏰ Было: {deadline}\n\n", "%d.%m.%Y %H:%M",
+    emoji={"pending": "❌", "running": "❌"}
+)
+# Страница редактируется на месте и должна уместиться в одно сообщение
+PAGE_LINE = LineTemplate("{emoji} [{id}] {title}{repeat}\n   ⏰ {deadline}\n\n", "%d.%m.%Y %H:%M", max_title=150)
+SEARCH_LINE = LineTemplate("{index}. {emoji} {title}{repeat}\n   ⏰ {deadline}\n\n", "%d.%m.%Y %H:%M", escape=True)
+
+
+def render_chunks(lines: Iterable[str], header: str = "", limit: int = MESSAGE_LIMIT) -> Iterator[str]:
+    """Склеить строки в сообщения не длиннее limit; строка длиннее limit режется"""
+    parts, size = [header], text_length(header)
+
+    for line in lines:
+        length = text_length(line)
+        if size + length > limit and size:
+            yield "".join(parts)
+            parts, size = [], 0
+
+        while length > limit:
+            # Одна задача больше сообщения: отрезать по лимиту (суррогатные пары не рвём)
+            cut = _cut_index(line, limit)
+            yield line[:cut]
+            line = line[cut:]
+            length = text_length(line)
+
+        parts.append(line)
+        size += length
+
+    if size:
+        yield "".join(parts)
+
+
+def _cut_index(line: str, limit: int) -> int:
+    units = 0
+    for i, char in enumerate(line):
+        units += 2 if ord(char) > 0xFFFF else 1
+        if units > limit:
+            return i
+    return len(line)
+
+
+def render_tasks(tasks: Iterable[Task], template: LineTemplate, header: str = "",
+                 max_messages: Optional[int] = None, limit: int = MESSAGE_LIMIT) -> Iterator[str]:
+    """Сообщения со списком задач; после max_messages — сводка по оставшимся"""
+    tasks = iter(tasks)
+    exhausted = False
+
+    def lines():
+        nonlocal exhausted
+        for index, task in enumerate(tasks, 1):
+            yield template(task, index)
+        exhausted = True
+
+    for number, chunk in enumerate(render_chunks(lines(), header, limit), 1):
+        yield chunk
+        if number == max_messages:
+            # Сообщение отдаётся, когда следующая строка уже не влезла: она тоже в остатке
+            rest = (0 if exhausted else 1) + sum(1 for _ in tasks)
+            if rest:
+                yield f"... и ещё {rest} задач"
+            return
+
+
+def render_page(tasks: Iterable[Task], template: LineTemplate, header: str = "") -> str:
+    """Текст одного сообщения (страница списка); не уместившееся отбрасывается"""
+    return next(render_tasks(tasks, template, header), header)
+
+
+async def answer_chunks(message: types.Message, chunks: Iterable[str], reply_markup=None, **kwargs):
+    """Отправить сообщения по порядку; клавиатура прикрепляется к последнему"""
+    previous = None
+    for chunk in chunks:
+        if previous is not None:
+            await message.answer(previous, **kwargs)
+        previous = chunk
+
+    if previous is not None:
+        await message.answer(previous, reply_markup=reply_markup, **kwargs)
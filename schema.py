@@ -0,0 +1,283 @@
+"""Версионированная схема БД.
+
+Номер применённой миграции хранится в PRAGMA user_version. Каждая миграция
+выполняется один раз, в собственной транзакции, вместе с обновлением версии.
+Новые изменения схемы добавляются только в конец MIGRATIONS.
+"""
+import sqlite3
+from typing import List
+
+MIGRATIONS: List[str] = [
+    # 1. Таблица задач
+    """
+    CREATE TABLE IF NOT EXISTS task (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        deadline TIMESTAMP NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_at TIMESTAMP NOT NULL
+    );
+    """,
+
+    # 2. Счётчики статусов для статистики (поддерживаются триггерами)
+    """
+    CREATE TABLE IF NOT EXISTS task_stats (
+        status TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    );
+
+    INSERT INTO task_stats (status, count)
+    SELECT status, COUNT(*) FROM task
+    WHERE NOT EXISTS (SELECT 1 FROM task_stats)
+    GROUP BY status;
+
+    CREATE TRIGGER IF NOT EXISTS task_stats_after_insert AFTER INSERT ON task
+    BEGIN
+        INSERT INTO task_stats (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_stats_after_delete AFTER DELETE ON task
+    BEGIN
+        UPDATE task_stats SET count = count - 1 WHERE status = OLD.status;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_stats_after_update AFTER UPDATE OF status ON task
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        UPDATE task_stats SET count = count - 1 WHERE status = OLD.status;
+        INSERT INTO task_stats (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    END;
+    """,
+
+    # 3. Индексы под выборки Database:
+    #    просроченные/предстоящие/по статусу — (status, deadline),
+    #    активные задачи (status != 'completed') — частичный индекс по deadline,
+    #    недельная статистика — (created_at, status)
+    """
+    CREATE INDEX IF NOT EXISTS idx_task_status_deadline ON task (status, deadline);
+    CREATE INDEX IF NOT EXISTS idx_task_active_deadline ON task (deadline) WHERE status != 'completed';
+    CREATE INDEX IF NOT EXISTS idx_task_created_at ON task (created_at, status);
+    """,
+
+    # 4. Полнотекстовый поиск: FTS5 поверх task (external content), синхронизируется триггерами
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(
+        title, description,
+        content='task', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    );
+    INSERT INTO task_fts (task_fts) VALUES ('rebuild');
+
+    CREATE TRIGGER IF NOT EXISTS task_fts_after_insert AFTER INSERT ON task
+    BEGIN
+        INSERT INTO task_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_fts_after_delete AFTER DELETE ON task
+    BEGIN
+        INSERT INTO task_fts (task_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_fts_after_update AFTER UPDATE OF title, description ON task
+    BEGIN
+        INSERT INTO task_fts (task_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        INSERT INTO task_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+    END;
+    """,
+
+    # 5. Дедлайны и created_at — целые Unix timestamp вместо строк.
+    #    Строки хранились в локальном времени, модификатор 'utc' переводит их в UTC.
+    #    Тип TIMESTAMP из миграции 1 имеет NUMERIC affinity, так что целые хранятся как есть.
+    """
+    UPDATE task
+    SET deadline = CAST(strftime('%s', substr(deadline, 1, 19), 'utc') AS INTEGER)
+    WHERE typeof(deadline) = 'text';
+
+    UPDATE task
+    SET created_at = CAST(strftime('%s', substr(created_at, 1, 19), 'utc') AS INTEGER)
+    WHERE typeof(created_at) = 'text';
+    """,
+
+    # 6. Владелец задачи. Выборки пользователя идут по индексам с user_id в начале,
+    #    счётчики статистики ведутся по парам (user_id, status).
+    #    idx_task_status_deadline остаётся для планировщика напоминаний (все пользователи).
+    #    Существующие задачи получают user_id = 0 и назначаются администратору при старте.
+    """
+    ALTER TABLE task ADD COLUMN user_id INTEGER NOT NULL DEFAULT 0;
+
+    DROP INDEX IF EXISTS idx_task_active_deadline;
+    DROP INDEX IF EXISTS idx_task_created_at;
+    CREATE INDEX IF NOT EXISTS idx_task_user_status_deadline ON task (user_id, status, deadline);
+    CREATE INDEX IF NOT EXISTS idx_task_user_active_deadline ON task (user_id, deadline) WHERE status != 'completed';
+    CREATE INDEX IF NOT EXISTS idx_task_user_created_at ON task (user_id, created_at, status);
+
+    DROP TRIGGER IF EXISTS task_stats_after_insert;
+    DROP TRIGGER IF EXISTS task_stats_after_delete;
+    DROP TRIGGER IF EXISTS task_stats_after_update;
+    DROP TABLE IF EXISTS task_stats;
+
+    CREATE TABLE task_stats (
+        user_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, status)
+    ) WITHOUT ROWID;
+
+    INSERT INTO task_stats (user_id, status, count)
+    SELECT user_id, status, COUNT(*) FROM task GROUP BY user_id, status;
+
+    CREATE TRIGGER task_stats_after_insert AFTER INSERT ON task
+    BEGIN
+        INSERT INTO task_stats (user_id, status, count) VALUES (NEW.user_id, NEW.status, 1)
+        ON CONFLICT(user_id, status) DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER task_stats_after_delete AFTER DELETE ON task
+    BEGIN
+        UPDATE task_stats SET count = count - 1 WHERE user_id = OLD.user_id AND status = OLD.status;
+    END;
+
+    CREATE TRIGGER task_stats_after_update AFTER UPDATE OF status, user_id ON task
+    WHEN OLD.status IS NOT NEW.status OR OLD.user_id IS NOT NEW.user_id
+    BEGIN
+        UPDATE task_stats SET count = count - 1 WHERE user_id = OLD.user_id AND status = OLD.status;
+        INSERT INTO task_stats (user_id, status, count) VALUES (NEW.user_id, NEW.status, 1)
+        ON CONFLICT(user_id, status) DO UPDATE SET count = count + 1;
+    END;
+    """,
+
+    # 7. Состояния FSM (мастер добавления задачи) переживают перезапуск бота.
+    #    Индекс по updated_at — для удаления брошенных состояний по TTL.
+    """
+    CREATE TABLE IF NOT EXISTS fsm_state (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT NOT NULL DEFAULT '{}',
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_fsm_state_updated_at ON fsm_state(updated_at);
+    """,
+
+    # 8. Архив выполненных задач (холодная таблица). Вставка в task_archive
+    #    удаляет задачу из task тем же оператором, поэтому перенос
+    #    (INSERT ... SELECT) атомарен. Счётчики task_stats учитывают обе таблицы:
+    #    перенос их не меняет. id сохраняется — AUTOINCREMENT не выдаст его повторно.
+    """
+    CREATE TABLE IF NOT EXISTS task_archive (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        deadline INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        archived_at INTEGER NOT NULL
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_task_archive_user_created_at ON task_archive (user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_task_archive_user_deadline ON task_archive (user_id, deadline);
+
+    CREATE TRIGGER IF NOT EXISTS task_archive_after_insert AFTER INSERT ON task_archive
+    BEGIN
+        INSERT INTO task_stats (user_id, status, count) VALUES (NEW.user_id, NEW.status, 1)
+        ON CONFLICT(user_id, status) DO UPDATE SET count = count + 1;
+        DELETE FROM task WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_archive_after_delete AFTER DELETE ON task_archive
+    BEGIN
+        UPDATE task_stats SET count = count - 1 WHERE user_id = OLD.user_id AND status = OLD.status;
+    END;
+    """,
+
+    # 9. Правило повтора (recurrence.py); NULL — разовая задача. Вхождения не хранятся:
+    #    выборки окна берут повторяющиеся задачи частичным индексом и разворачивают их в коде.
+    """
+    ALTER TABLE task ADD COLUMN recurrence TEXT;
+    ALTER TABLE task_archive ADD COLUMN recurrence TEXT;
+
+    CREATE INDEX IF NOT EXISTS idx_task_user_recurring ON task (user_id, status, deadline) WHERE recurrence IS NOT NULL;
+    """,
+
+    # 10. Повторяющиеся ожидающие задачи всех пользователей (планировщик напоминаний):
+    #     idx_task_user_recurring начинается с user_id и для выборки без пользователя не годится
+    """
+    CREATE INDEX IF NOT EXISTS idx_task_recurring_status_deadline ON task (status, deadline) WHERE recurrence IS NOT NULL;
+    """,
+
+    # 11. Дедлайн (вхождение), о котором уже напомнили: после перезапуска или смены
+    #     ведущего напоминание не повторяется. Частичный индекс — только такие задачи.
+    """
+    ALTER TABLE task ADD COLUMN reminded_deadline INTEGER;
+
+    CREATE INDEX IF NOT EXISTS idx_task_reminded_deadline ON task (reminded_deadline) WHERE reminded_deadline IS NOT NULL;
+    """,
+
+    # 12. Номер изменения задачи для планировщика напоминаний при нескольких воркерах:
+    #     ведущий дочитывает только задачи с id или revision больше уже виденных.
+    #     Записи сериализованы блокировкой записи, поэтому номера растут в порядке коммитов.
+    """
+    ALTER TABLE task ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
+
+    CREATE INDEX IF NOT EXISTS idx_task_revision ON task (revision);
+
+    CREATE TRIGGER IF NOT EXISTS task_revision_after_update AFTER UPDATE OF status, deadline, recurrence ON task
+    BEGIN
+        UPDATE task SET revision = (SELECT MAX(revision) FROM task) + 1 WHERE id = NEW.id;
+    END;
+    """,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применить недостающие миграции, вернуть итоговую версию схемы"""
+    version = get_version(conn)
+
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Версия схемы БД ({version}) новее, чем поддерживает код ({SCHEMA_VERSION})"
+        )
+
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        script = MIGRATIONS[number - 1]
+        try:
+            conn.executescript(
+                f"BEGIN IMMEDIATE;\n{script};\nPRAGMA user_version = {number};\nCOMMIT;"
+            )
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    return SCHEMA_VERSION
+
+
+def migrate_path(db_path: str) -> int:
+    """Применить миграции к файлу БД через отдельное соединение"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
+
+
+def enable_wal(db_path: str) -> str:
+    """Перевести файл БД в режим WAL (сохраняется в файле): читатели других процессов не ждут писателя"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,254 @@
+"""Исходящая очередь сообщений с учётом лимитов Telegram.
+
+OutboundSender подключается к сессии бота как request-middleware, поэтому
+message.answer, edit_text и bot.send_message проходят через неё без
+изменений в обработчиках. Запросы с chat_id ставятся в очередь с
+приоритетом: ответы пользователю (INTERACTIVE) идут раньше рассылок (BULK,
+см. bulk_lane). Глобальный token bucket ограничивает общий темп отправки,
+bucket на чат — темп в одном чате. TelegramRetryAfter приостанавливает чат
+(или всю отправку, если ошибка не привязана к чату) и повторяет запрос.
+"""
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+LANES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+_lane: contextvars.ContextVar[int] = contextvars.ContextVar("outbound_lane", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk_lane():
+    """Отправлять запросы внутри блока с низким приоритетом (рассылки, напоминания)"""
+    token = _lane.set(BULK)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    """Token bucket с резервированием: reserve() возвращает, сколько ждать до отправки.
+
+    Токены могут уходить в минус — так очередь ожидающих в одном чате
+    сохраняет порядок: каждая следующая резервация ждёт дольше предыдущей.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        self._refill(now)
+        self.tokens -= 1
+        delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(delay, self.blocked_until - now)
+
+    def block(self, now: float, seconds: float):
+        """Flood control: не отправлять ничего ближайшие seconds секунд"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+@dataclass(order=True)
+class _Job:
+    lane: int
+    seq: int
+    chat_id: Any = field(compare=False)
+    method: TelegramMethod = field(compare=False)
+    make_request: NextRequestMiddlewareType = field(compare=False)
+    bot: Bot = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class OutboundSender(BaseRequestMiddleware):
+    """Приоритетная очередь исходящих запросов с лимитами на чат и глобально"""
+
+    # Лимиты Telegram: ~30 сообщений/с на бота, ~1 сообщение/с в чат (короткие всплески допустимы)
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+        latency_window: int = 1000
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._queue: "asyncio.PriorityQueue[_Job]" = asyncio.PriorityQueue()
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._seq = itertools.count()
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._latency: Dict[int, Deque[float]] = {lane: deque(maxlen=latency_window) for lane in LANES}
+
+    # --- middleware ---
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or self._worker is None:
+            # answerCallbackQuery, getUpdates, setWebhook и т.п. идут напрямую
+            return await make_request(bot, method)
+
+        loop = asyncio.get_running_loop()
+        job = _Job(
+            _lane.get(), next(self._seq), chat_id, method, make_request, bot,
+            loop.create_future(), loop.time()
+        )
+        self._queue.put_nowait(job)
+        return await job.future
+
+    # --- жизненный цикл ---
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._dispatch())
+
+    async def close(self, timeout: float = 10.0):
+        """Дождаться отправки поставленного в очередь и остановить диспетчер"""
+        if self._worker is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbound queue not drained: %d requests dropped", self.queue_depth)
+
+        self._worker.cancel()
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(self._worker, *self._in_flight, return_exceptions=True)
+        self._worker = None
+
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("OutboundSender остановлен"))
+
+    async def _drain(self):
+        while self._queue.qsize() or self._in_flight:
+            await asyncio.sleep(0.05)
+
+    # --- отправка ---
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= 10000:
+                self._prune(time.monotonic())
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _prune(self, now: float):
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    async def _dispatch(self):
+        # Глобальный лимит соблюдается здесь, по порядку приоритетов;
+        # ожидание лимита чата не задерживает остальные чаты
+        while True:
+            job = await self._queue.get()
+            delay = self.global_bucket.reserve(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            chat_delay = self._chat_bucket(job.chat_id).reserve(time.monotonic())
+            task = asyncio.create_task(self._send(job, chat_delay))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, job: _Job, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await job.make_request(job.bot, job.method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    self._finish(job, exception=e)
+                    return
+
+                self.retried += 1
+                now = time.monotonic()
+                bucket = self._chat_bucket(job.chat_id) if getattr(e.method, "chat_id", None) else self.global_bucket
+                bucket.block(now, e.retry_after)
+                logger.warning("Flood control for chat %s, retry in %ss", job.chat_id, e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                self._finish(job, exception=e)
+                return
+            else:
+                self._finish(job, result=result)
+                return
+
+    def _finish(self, job: _Job, result: Any = None, exception: Optional[BaseException] = None):
+        if exception is None:
+            self.sent += 1
+            self._latency[job.lane].append(asyncio.get_running_loop().time() - job.enqueued_at)
+        else:
+            self.failed += 1
+
+        if job.future.done():
+            return  # вызывающий уже отменил ожидание
+        if exception is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(exception)
+
+    # --- метрики ---
+
+    @property
+    def queue_depth(self) -> int:
+        """Запросы в очереди плюс ожидающие лимита чата или повтора"""
+        return self._queue.qsize() + len(self._in_flight)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Глубина очереди, счётчики и задержка (очередь + отправка) по приоритетам, мс"""
+        result = {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+        for lane, name in LANES.items():
+            values = sorted(self._latency[lane])
+            if values:
+                result[f"{name}_p50_ms"] = values[len(values) // 2] * 1000
+                result[f"{name}_p95_ms"] = values[min(len(values) - 1, int(len(values) * 0.95))] * 1000
+        return result
@@ -0,0 +1,151 @@
+"""Журнал медленных запросов с планом выполнения.
+
+SlowQueryLog подключается хуком запросов (Database/AsyncDatabase.add_query_hook)
+и копит сводку по всем запросам: число вызовов, суммарное и максимальное время,
+строки. Запрос дольше threshold записывается в ротируемый лог вместе с
+параметрами, числом строк и EXPLAIN QUERY PLAN, так что новый фильтр в get_*,
+ушедший в полный просмотр task, виден по первой же записи с «SCAN task».
+
+План строится на отдельном соединении только для чтения: рабочее соединение
+в этот момент может держать транзакцию group commit. План кэшируется по
+тексту запроса.
+"""
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional, Sequence
+
+# «SCAN task» без индекса — полный просмотр таблицы задач (SCAN CONSTANT ROW,
+# материализованные CTE вроде «SCAN batch» и таблицы FTS сюда не попадают)
+FULL_SCAN_RE = re.compile(r"\s*SCAN (task|task_archive)$")
+# IN (?, ?, ?) переменной длины сводится к одному виду запроса
+_PLACEHOLDERS_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACES_RE = re.compile(r"\s+")
+
+# Служебные команды транзакций план не имеют
+_NO_PLAN = ("BEGIN", "COMMIT", "ROLLBACK")
+
+
+def normalize_sql(sql: str) -> str:
+    return _PLACEHOLDERS_RE.sub("?, ...", _SPACES_RE.sub(" ", sql).strip())
+
+
+@dataclass(slots=True)
+class QueryStats:
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    slow: int = 0
+
+
+class SlowQueryLog:
+    """Хук запросов: сводка по времени и журнал запросов дольше threshold_ms"""
+
+    def __init__(
+        self,
+        db_path: str,
+        threshold_ms: float = 100,
+        log_path: str = "slow_queries.log",
+        max_bytes: int = 1024 * 1024,
+        backups: int = 3,
+        max_params: int = 200
+    ):
+        self.db_path = db_path
+        self.threshold = threshold_ms / 1000
+        self.max_params = max_params
+        self.stats: Dict[str, QueryStats] = {}
+        self._plans: Dict[str, List[str]] = {}
+        self._explain_conn: Optional[sqlite3.Connection] = None
+
+        self.logger = logging.getLogger(f"{__name__}.{id(self)}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self.logger.addHandler(handler)
+
+    def __call__(self, sql: str, params, seconds: float, rows: int):
+        key = normalize_sql(sql)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = QueryStats()
+        stats.calls += 1
+        stats.total += seconds
+        stats.max = max(stats.max, seconds)
+        stats.rows += max(rows, 0)
+
+        if seconds >= self.threshold:
+            stats.slow += 1
+            self._log(key, sql, params, seconds, rows)
+
+    def _log(self, key: str, sql: str, params, seconds: float, rows: int):
+        plan = self.explain(key, sql, params)
+        full_scan = any(FULL_SCAN_RE.match(step) for step in plan)
+        lines = [
+            f"{seconds * 1000:.1f}ms rows={rows}{' FULL SCAN' if full_scan else ''}",
+            f"  sql: {key}",
+            f"  params: {self._format_params(params)}",
+        ]
+        lines.extend(f"  plan: {step}" for step in plan)
+        self.logger.info("\n".join(lines))
+
+    def _format_params(self, params) -> str:
+        text = repr(params)
+        return text if len(text) <= self.max_params else text[:self.max_params] + "..."
+
+    def explain(self, key: str, sql: str, params) -> List[str]:
+        """Шаги EXPLAIN QUERY PLAN с отступами по вложенности (кэш по виду запроса)"""
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        if sql.lstrip().upper().startswith(_NO_PLAN):
+            plan = []
+        else:
+            try:
+                plan = self._explain(sql, _first_params(params))
+            except sqlite3.Error as e:
+                plan = [f"<EXPLAIN failed: {e}>"]
+
+        self._plans[key] = plan
+        return plan
+
+    def _explain(self, sql: str, params: Sequence) -> List[str]:
+        if self._explain_conn is None:
+            self._explain_conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+        depth: Dict[int, int] = {0: -1}
+        steps = []
+        for node_id, parent, _, detail in self._explain_conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            depth[node_id] = depth.get(parent, -1) + 1
+            steps.append("  " * depth[node_id] + detail)
+        return steps
+
+    def report(self, top: int = 10) -> str:
+        """Самые дорогие запросы по суммарному времени"""
+        lines = [f"{'total ms':>10} {'calls':>7} {'avg ms':>8} {'max ms':>8} {'slow':>5}  query"]
+        ranked = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)
+        for key, stats in ranked[:top]:
+            lines.append(
+                f"{stats.total * 1000:10.1f} {stats.calls:7d} {stats.total / stats.calls * 1000:8.2f} "
+                f"{stats.max * 1000:8.2f} {stats.slow:5d}  {key[:100]}"
+            )
+        return "\n".join(lines)
+
+    def close(self):
+        if self._explain_conn is not None:
+            self._explain_conn.close()
+            self._explain_conn = None
+        for handler in self.logger.handlers[:]:
+            handler.close()
+            self.logger.removeHandler(handler)
+
+
+def _first_params(params) -> Sequence:
+    # executemany передаёт список строк: для плана достаточно первой
+    if isinstance(params, list):
+        return params[0] if params else ()
+    return params
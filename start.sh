@@ -22,13 +22,21 @@ if grep -q 'BOT_TOKEN = os.getenv("TASKFLOW_BOT_TOKEN", "")' config.py; then
     exit 1
 fi
 
-# Запускаем бота
+# Запускаем бота: TASKFLOW_WORKERS > 1 — несколько процессов под supervisor.py
+# (общая БД в режиме WAL, апдейты по chat_id, напоминания — у одного воркера)
 echo "🚀 Запуск TaskFlow Scheduler Bot..."
-nohup python bot.py > bot.log 2>&1 &
+if [ "${TASKFLOW_WORKERS:-1}" -gt 1 ]; then
+    echo "👷 Воркеров: $TASKFLOW_WORKERS"
+    nohup python supervisor.py --workers "$TASKFLOW_WORKERS" > bot.log 2>&1 &
+    PROCESS="taskflow-bot/supervisor.py"
+else
+    nohup python bot.py > bot.log 2>&1 &
+    PROCESS="taskflow-bot/bot.py"
+fi
 
 sleep 2
 
-if pgrep -f "taskflow-bot/bot.py" > /dev/null; then
+if pgrep -f "$PROCESS" > /dev/null; then
     echo "✅ Бот успешно запущен!"
     echo "📋 Логи: /root/.openclaw/workspace/taskflow-bot/bot.log"
 else
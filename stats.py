@@ -0,0 +1,74 @@
+"""Статистика по задачам.
+
+Счётчики по статусам каждого пользователя поддерживаются триггерами
+в таблице task_stats (см. schema.py) и включают архив, поэтому их чтение не зависит
+от размера таблицы task. Счётчики, которые зависят от текущего времени
+(просрочено, за неделю, за сегодня), считаются одним запросом: каждый
+подзапрос — диапазонный поиск по индексу, так что стоимость зависит
+от размера окна, а не всей таблицы.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from timeutil import day_bounds, to_timestamp
+
+COUNTERS_SQL = "SELECT status, count FROM task_stats WHERE user_id = ?"
+
+# Все счётчики, зависящие от времени, одним запросом. Выполненные задачи
+# могут быть уже в task_archive (там только выполненные), поэтому окна
+# с ними считаются по обеим таблицам
+WINDOW_COUNTERS_SQL = """
+SELECT
+    (SELECT COUNT(*) FROM task
+     WHERE user_id = :user_id AND status = 'pending' AND deadline < :now),
+    (SELECT COUNT(*) FROM task
+     WHERE user_id = :user_id AND created_at >= :week_ago AND status = 'completed')
+    + (SELECT COUNT(*) FROM task_archive
+       WHERE user_id = :user_id AND created_at >= :week_ago),
+    (SELECT COUNT(*) FROM task
+     WHERE user_id = :user_id AND created_at >= :week_ago)
+    + (SELECT COUNT(*) FROM task_archive
+       WHERE user_id = :user_id AND created_at >= :week_ago),
+    (SELECT COUNT(*) FROM task
+     WHERE user_id = :user_id AND status = 'completed' AND deadline >= :today_start AND deadline <= :today_end)
+    + (SELECT COUNT(*) FROM task_archive
+       WHERE user_id = :user_id AND deadline >= :today_start AND deadline <= :today_end)
+"""
+
+STATS_KEYS = ("total", "pending", "running", "completed", "overdue")
+WEEKLY_KEYS = ("completed_week", "created_week", "completed_today")
+
+
+def window_params(user_id: int, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Параметры для WINDOW_COUNTERS_SQL"""
+    now = now or datetime.now()
+    today_start, today_end = day_bounds(now)
+
+    return {
+        "user_id": user_id,
+        "now": to_timestamp(now),
+        "week_ago": to_timestamp(now - timedelta(days=7)),
+        "today_start": today_start,
+        "today_end": today_end,
+    }
+
+
+def build_stats(counters: Iterable[Tuple[str, int]], window_row: Tuple) -> Dict:
+    """Собрать словарь статистики из счётчиков и результата WINDOW_COUNTERS_SQL"""
+    by_status = dict(counters)
+    overdue, completed_week, created_week, completed_today = window_row
+
+    return {
+        "total": sum(by_status.values()),
+        "pending": by_status.get("pending", 0),
+        "running": by_status.get("running", 0),
+        "completed": by_status.get("completed", 0),
+        "overdue": overdue,
+        "completed_week": completed_week,
+        "created_week": created_week,
+        "completed_today": completed_today,
+    }
+
+
+def pick(stats: Dict, keys: Tuple[str, ...]) -> Dict:
+    return {key: stats[key] for key in keys}
@@ -0,0 +1,244 @@
+"""FSM-хранилище aiogram поверх SQLite бота.
+
+Состояния мастеров живут в горячем слое в памяти (LRU ограниченного
+размера), изменения накапливаются и сбрасываются в таблицу fsm_state
+одной транзакцией раз в flush_interval (write-behind). Состояния, которых
+не трогали дольше ttl, считаются брошенными и удаляются из памяти и БД.
+"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Mapping, Optional
+
+import aiosqlite
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from schema import migrate_path
+from timeutil import now_timestamp
+
+logger = logging.getLogger(__name__)
+
+LOAD_STATE_SQL = "SELECT state, data, updated_at FROM fsm_state WHERE key = ?"
+
+UPSERT_STATE_SQL = """INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                      ON CONFLICT(key) DO UPDATE SET
+                      state = excluded.state, data = excluded.data, updated_at = excluded.updated_at"""
+
+DELETE_STATE_SQL = "DELETE FROM fsm_state WHERE key = ?"
+
+EXPIRE_STATES_SQL = "DELETE FROM fsm_state WHERE updated_at < ?"
+
+
+def _encode(value: Any) -> Any:
+    # В данных мастера лежит datetime выбранной даты
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def dump_data(data: Mapping[str, Any]) -> str:
+    return json.dumps(data, default=_encode, ensure_ascii=False)
+
+
+def load_data(raw: str) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_decode)
+
+
+@dataclass(slots=True)
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """Персистентное FSM-хранилище с горячим слоем и отложенной записью"""
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl: timedelta = timedelta(days=1),
+        flush_interval: float = 1.0,
+        max_hot: int = 10000,
+        key_builder: Optional[DefaultKeyBuilder] = None
+    ):
+        self.db_path = db_path
+        self.ttl = int(ttl.total_seconds())
+        self.flush_interval = flush_interval
+        self.max_hot = max_hot
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._hot: "OrderedDict[str, _Record]" = OrderedDict()
+        self._dirty: set = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_expire = 0
+
+    async def connect(self):
+        """Применить миграции, открыть соединение и запустить фоновый сброс"""
+        if self._conn is None:
+            await asyncio.to_thread(migrate_path, self.db_path)
+            self._conn = await aiosqlite.connect(self.db_path)
+            await self._expire()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Сбросить накопленные изменения и закрыть соединение"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+
+        if self._conn is not None:
+            await self.flush()
+            await self._conn.close()
+            self._conn = None
+
+    @property
+    def conn(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            raise RuntimeError("SQLiteStorage не подключено: вызовите connect()")
+        return self._conn
+
+    # --- горячий слой ---
+
+    def _expired(self, record: _Record) -> bool:
+        return record.updated_at < now_timestamp() - self.ttl
+
+    async def _get(self, key: StorageKey) -> _Record:
+        name = self.key_builder.build(key)
+        record = self._hot.get(name)
+
+        if record is None:
+            async with self.conn.execute(LOAD_STATE_SQL, (name,)) as cursor:
+                row = await cursor.fetchone()
+
+            # Пока шло чтение, запись могла появиться в горячем слое
+            record = self._hot.get(name)
+            if record is None:
+                record = _Record(row[0], load_data(row[1]), row[2]) if row else _Record()
+                self._hot[name] = record
+                self._evict(keep=name)
+
+        self._hot.move_to_end(name)
+        if not record.empty and self._expired(record):
+            record.state, record.data = None, {}
+            self._dirty.add(name)
+
+        return record
+
+    def _touch(self, key: StorageKey, record: _Record):
+        record.updated_at = now_timestamp()
+        self._dirty.add(self.key_builder.build(key))
+
+    def _evict(self, keep: Optional[str] = None):
+        """Вытеснить самые давние записи, уже сброшенные в БД"""
+        excess = len(self._hot) - self.max_hot
+        if excess <= 0:
+            return
+
+        for name in list(self._hot):
+            if excess <= 0:
+                break
+            if name != keep and name not in self._dirty:
+                del self._hot[name]
+                excess -= 1
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = await self._get(key)
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(key)).data.copy()
+
+    # --- запись в БД ---
+
+    async def flush(self):
+        """Записать все изменённые состояния одной транзакцией"""
+        if not self._dirty:
+            return
+
+        names, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for name in names:
+            record = self._hot.get(name)
+            if record is None or record.empty:
+                deletes.append((name,))
+            else:
+                upserts.append((name, record.state, dump_data(record.data), record.updated_at))
+
+        try:
+            if upserts:
+                await self.conn.executemany(UPSERT_STATE_SQL, upserts)
+            if deletes:
+                await self.conn.executemany(DELETE_STATE_SQL, deletes)
+            await self.conn.commit()
+        except Exception:
+            await self.conn.rollback()
+            self._dirty |= names  # повторим при следующем сбросе
+            raise
+
+        self._evict()
+
+    async def _expire(self):
+        """Удалить брошенные состояния из БД и горячего слоя"""
+        now = now_timestamp()
+        self._last_expire = now
+        cutoff = now - self.ttl
+
+        for name in [name for name, record in self._hot.items() if record.updated_at < cutoff]:
+            if name not in self._dirty:
+                del self._hot[name]
+
+        await self.conn.execute(EXPIRE_STATES_SQL, (cutoff,))
+        await self.conn.commit()
+
+    async def _flush_loop(self):
+        # Брошенные состояния чистятся не чаще раза в минуту
+        expire_every = min(self.ttl, 60)
+
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if now_timestamp() - self._last_expire >= expire_every:
+                    await self._expire()
+            except Exception:
+                logger.exception("Failed to flush FSM states")
@@ -0,0 +1,321 @@
+"""Несколько процессов бота на одной БД SQLite.
+
+Supervisor запускает N воркеров (bot.py с TASKFLOW_WORKER_PORT) и сам
+получает апдейты: long polling или, если задан TASKFLOW_WEBHOOK_URL,
+webhook. Каждый апдейт пересылается на локальный порт воркера
+chat_id % N, поэтому все апдейты чата обрабатывает один процесс: его
+кэш задач, состояние мастеров и temp_data остаются согласованными без
+общей памяти. Упавший воркер перезапускается с нарастающей паузой.
+
+Перед запуском воркеров supervisor применяет миграции и переводит файлы
+БД в режим WAL. Напоминания и архивация идут только у воркера,
+держащего аренду в файле рядом с БД (leader.py).
+
+Настройки (переменные окружения):
+    TASKFLOW_WORKERS           — число воркеров (по умолчанию — число ядер)
+    TASKFLOW_WORKER_BASE_PORT  — порт первого воркера, далее по порядку (8100)
+
+Примеры:
+    python supervisor.py
+    python supervisor.py --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import aiohttp
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from aiohttp import web
+
+from database import shard_paths
+from schema import enable_wal, migrate_path
+
+logger = logging.getLogger(__name__)
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Типы апдейтов, которые обрабатывает bot.py (dp.resolve_used_update_types())
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+# Пересылка воркеру, который перезапускается: повторы в пределах FORWARD_TIMEOUT
+FORWARD_TIMEOUT = 30.0
+FORWARD_RETRY_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+STARTUP_TIMEOUT = 120.0
+# Повтор getUpdates после сетевой ошибки или 5xx (как в Dispatcher.start_polling)
+POLL_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+
+def chat_id_of(update: dict) -> int:
+    """Чат апдейта (для callback_query — чат сообщения с кнопкой), иначе отправитель"""
+    for payload in update.values():
+        if not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        sender = payload.get("from") or payload.get("user")
+        if sender:
+            return sender["id"]
+    return 0
+
+
+def prepare_database(db_path: str, shards: int = 1):
+    """Миграции и WAL до старта воркеров: иначе они мигрировали бы один файл наперегонки"""
+    paths = [db_path] + (shard_paths(db_path, shards) if shards > 1 else [])
+    for path in paths:
+        migrate_path(path)
+        mode = enable_wal(path)
+        if mode.lower() != "wal":
+            raise RuntimeError(f"{path}: не удалось включить WAL (journal_mode={mode})")
+
+
+@dataclass
+class Worker:
+    index: int
+    port: int
+    process: Optional[asyncio.subprocess.Process] = None
+    restarts: int = 0
+
+
+class Supervisor:
+    """Процессы-воркеры и пересылка им апдейтов по chat_id"""
+
+    def __init__(
+        self,
+        workers: int,
+        base_port: int = 8100,
+        path: str = "/webhook",
+        command: Sequence[str] = (sys.executable, BOT_SCRIPT),
+        env: Optional[Dict[str, str]] = None
+    ):
+        self.workers = [Worker(index, base_port + index) for index in range(workers)]
+        self.path = path
+        self.command = list(command)
+        self.env = dict(os.environ if env is None else env)
+        # Воркеры принимают апдейты только от supervisor
+        self.secret = secrets.token_urlsafe(16)
+
+        self.forwarded = 0
+        self.dropped = 0
+        self._stopping = False
+        self._watchers: List[asyncio.Task] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def worker_for(self, chat_id: int) -> Worker:
+        return self.workers[chat_id % len(self.workers)]
+
+    async def start(self):
+        """Запустить воркеров и дождаться, пока каждый откроет порт"""
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        for worker in self.workers:
+            await self._spawn(worker)
+            self._watchers.append(asyncio.create_task(self._watch(worker)))
+
+        await asyncio.wait_for(asyncio.gather(*(self._wait_port(worker) for worker in self.workers)),
+                               STARTUP_TIMEOUT)
+        logger.info("Started %d workers on ports %d-%d", len(self.workers),
+                    self.workers[0].port, self.workers[-1].port)
+
+    async def _wait_port(self, worker: Worker):
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", worker.port)
+            except OSError:
+                await asyncio.sleep(FORWARD_RETRY_DELAY)
+                continue
+            writer.close()
+            await writer.wait_closed()
+            return
+
+    async def _spawn(self, worker: Worker):
+        env = {
+            **self.env,
+            "TASKFLOW_WORKER_ID": str(worker.index),
+            "TASKFLOW_WORKER_PORT": str(worker.port),
+            "TASKFLOW_WORKERS": str(len(self.workers)),
+            "TASKFLOW_WEBHOOK_SECRET": self.secret,
+        }
+        worker.process = await asyncio.create_subprocess_exec(*self.command, env=env)
+
+    async def _watch(self, worker: Worker):
+        while True:
+            code = await worker.process.wait()
+            if self._stopping:
+                return
+
+            worker.restarts += 1
+            delay = min(MAX_RESTART_DELAY, FORWARD_RETRY_DELAY * 2 ** worker.restarts)
+            logger.warning("Worker %d exited with code %s, restarting in %.1fs", worker.index, code, delay)
+            await asyncio.sleep(delay)
+            if self._stopping:
+                return
+            await self._spawn(worker)
+
+    async def stop(self, timeout: float = 10.0):
+        """SIGINT воркерам (штатное завершение: сброс FSM, освобождение аренды), затем SIGKILL"""
+        self._stopping = True
+        for task in self._watchers:
+            task.cancel()
+
+        running = [worker.process for worker in self.workers
+                   if worker.process is not None and worker.process.returncode is None]
+        for process in running:
+            process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(asyncio.gather(*(process.wait() for process in running)), timeout)
+        except asyncio.TimeoutError:
+            for process in running:
+                if process.returncode is None:
+                    process.kill()
+
+        if self._session is not None:
+            await self._session.close()
+
+    async def forward(self, body: bytes, chat_id: int) -> bool:
+        """Отдать апдейт воркеру; пока он (пере)запускается — повторять"""
+        worker = self.worker_for(chat_id)
+        url = f"http://127.0.0.1:{worker.port}{self.path}"
+        headers = {SECRET_HEADER: self.secret, "Content-Type": "application/json"}
+
+        deadline = asyncio.get_running_loop().time() + FORWARD_TIMEOUT
+        while asyncio.get_running_loop().time() < deadline:
+            try:
+                async with self._session.post(url, data=body, headers=headers) as resp:
+                    if resp.status == 200:
+                        self.forwarded += 1
+                        return True
+                    logger.warning("Worker %d answered %d", worker.index, resp.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(FORWARD_RETRY_DELAY)
+
+        self.dropped += 1
+        logger.error("Update for chat %s dropped: worker %d unavailable", chat_id, worker.index)
+        return False
+
+    async def forward_batch(self, updates: List[dict]) -> int:
+        """Апдейты одного воркера — по порядку, разных воркеров — параллельно"""
+        queues: Dict[int, List[dict]] = {}
+        for update in updates:
+            queues.setdefault(self.worker_for(chat_id_of(update)).index, []).append(update)
+
+        async def send(queue: List[dict]) -> int:
+            sent = 0
+            for update in queue:
+                sent += await self.forward(json.dumps(update).encode(), chat_id_of(update))
+            return sent
+
+        return sum(await asyncio.gather(*(send(queue) for queue in queues.values())))
+
+    # --- приём апдейтов ---
+
+    def build_app(self, secret: Optional[str] = None) -> web.Application:
+        """Внешний webhook: Telegram получает 200, когда апдейт принят воркером"""
+        async def handle(request: web.Request) -> web.Response:
+            if secret and request.headers.get(SECRET_HEADER) != secret:
+                return web.Response(status=401)
+
+            body = await request.read()
+            try:
+                update = json.loads(body)
+            except ValueError:
+                return web.Response(status=400)
+
+            # 503 — Telegram повторит доставку позже
+            return web.Response(status=200 if await self.forward(body, chat_id_of(update)) else 503)
+
+        app = web.Application()
+        app.router.add_post(self.path, handle)
+        return app
+
+    async def poll(self, bot, timeout: int = 30):
+        """Long polling: смещение сдвигается только после пересылки пачки.
+
+        Сетевые ошибки и 5xx не останавливают приём: пачка запрашивается
+        заново с нарастающей паузой, при flood control — через retry_after.
+        """
+        await bot.delete_webhook()
+        backoff = Backoff(POLL_BACKOFF)
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=timeout, allowed_updates=ALLOWED_UPDATES)
+                if updates:
+                    await self.forward_batch([
+                        update.model_dump(mode="json", exclude_unset=True, by_alias=True) for update in updates
+                    ])
+                    offset = updates[-1].update_id + 1
+            except TelegramRetryAfter as e:
+                logger.warning("Flood control on getUpdates, retry in %ss", e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError, aiohttp.ClientError) as e:
+                logger.warning("Polling failed: %s, retry in %.1fs", e, backoff.next_delay)
+                await backoff.asleep()
+            else:
+                backoff.reset()
+
+
+async def run(workers: int, base_port: int):
+    from aiogram import Bot
+
+    from config import BOT_TOKEN, DB_PATH
+
+    if not BOT_TOKEN:
+        raise ValueError("Установите переменную окружения TASKFLOW_BOT_TOKEN с токеном бота")
+
+    prepare_database(DB_PATH, int(os.getenv("TASKFLOW_DB_SHARDS", "1")))
+
+    webhook_url = os.getenv("TASKFLOW_WEBHOOK_URL", "")
+    path = os.getenv("TASKFLOW_WEBHOOK_PATH", "/webhook")
+    supervisor = Supervisor(workers, base_port, path)
+    await supervisor.start()
+
+    bot = Bot(token=BOT_TOKEN)
+    runner = None
+    # SIGTERM (kill, systemd) — как Ctrl+C: воркеры останавливаются штатно
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        if webhook_url:
+            # Без заданного секрета — случайный: внешний webhook без проверки не принимаем
+            secret = os.getenv("TASKFLOW_WEBHOOK_SECRET", "") or secrets.token_urlsafe(32)
+            runner = web.AppRunner(supervisor.build_app(secret))
+            await runner.setup()
+            host = os.getenv("TASKFLOW_WEBHOOK_HOST", "0.0.0.0")
+            port = int(os.getenv("TASKFLOW_WEBHOOK_PORT", "8080"))
+            await web.TCPSite(runner, host, port).start()
+            await bot.set_webhook(webhook_url.rstrip("/") + path, secret_token=secret, allowed_updates=ALLOWED_UPDATES)
+            logger.info("Webhook server listening on %s:%d%s", host, port, path)
+            await asyncio.Event().wait()
+        else:
+            await supervisor.poll(bot)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await supervisor.stop()
+        await bot.session.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("TASKFLOW_WORKERS", "0")) or os.cpu_count())
+    parser.add_argument("--base-port", type=int, default=int(os.getenv("TASKFLOW_WORKER_BASE_PORT", "8100")))
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args.workers, args.base_port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""TaskCache: записи живут до ближайшей границы выборки и сбрасываются записью"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import cache
+from cache import TaskCache
+from database import Task, TaskChange
+from timeutil import to_timestamp
+
+NOW = to_timestamp(datetime(2026, 3, 10, 12, 0))
+HOUR = 3600
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def task(task_id: int, deadline: int) -> Task:
+    moment = datetime.fromtimestamp(deadline)
+    return Task(task_id, f"t{task_id}", None, moment, "pending", moment, 1)
+
+
+class FakeDatabase:
+    """Ожидающие задачи одного пользователя; считает обращения к выборкам"""
+
+    def __init__(self, deadlines):
+        self.tasks = [task(i, deadline) for i, deadline in enumerate(deadlines, 1)]
+        self.now = NOW
+        self.loads = 0
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    async def get_next_pending_deadline(self, user_id: int, since: int):
+        return min((to_timestamp(t.deadline) for t in self.tasks if to_timestamp(t.deadline) >= since), default=None)
+
+    async def get_overdue_tasks(self, user_id: int):
+        self.loads += 1
+        return [t for t in self.tasks if to_timestamp(t.deadline) < self.now]
+
+    async def get_upcoming_tasks(self, user_id: int, hours: int = 24):
+        self.loads += 1
+        return [t for t in self.tasks if self.now <= to_timestamp(t.deadline) <= self.now + hours * HOUR]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Общее «текущее время» кэша и FakeDatabase"""
+    db = FakeDatabase([NOW - HOUR, NOW + HOUR, NOW + 30 * HOUR])
+
+    def tick(seconds: int):
+        db.now += seconds
+
+    monkeypatch.setattr(cache, "now_timestamp", lambda: db.now)
+    return db, tick
+
+
+def test_overdue_cached_until_next_deadline_passes(clock):
+    db, tick = clock
+    tasks = TaskCache(db)
+
+    assert [t.id for t in run(tasks.get_overdue_tasks(1))] == [1]
+    tick(HOUR)  # ровно дедлайн задачи 2: ещё не просрочена
+    assert [t.id for t in run(tasks.get_overdue_tasks(1))] == [1]
+    assert db.loads == 1
+
+    tick(1)
+    assert [t.id for t in run(tasks.get_overdue_tasks(1))] == [1, 2]
+    assert db.loads == 2
+
+
+def test_upcoming_expires_when_window_edge_moves(clock):
+    db, tick = clock
+    tasks = TaskCache(db)
+
+    assert [t.id for t in run(tasks.get_upcoming_tasks(1))] == [2]
+    # Задача 3 входит в окно 24 часов за 6 часов до своего дедлайна
+    tick(6 * HOUR - 1)
+    run(tasks.get_upcoming_tasks(1))
+    assert db.loads == 2  # первая задача окна (2) ушла через час после NOW
+
+    tick(1)
+    assert [t.id for t in run(tasks.get_upcoming_tasks(1))] == [3]
+    assert db.loads == 3
+
+
+def test_change_invalidates_user(clock):
+    db, _ = clock
+    tasks = TaskCache(db)
+
+    run(tasks.get_overdue_tasks(1))
+    run(tasks.get_overdue_tasks(1))
+    assert (tasks.hits, tasks.misses) == (1, 1)
+
+    for listener in db.listeners:
+        listener(TaskChange("status", 1, 1, "completed"))
+    run(tasks.get_overdue_tasks(1))
+    assert (tasks.hits, tasks.misses) == (1, 2)
+
+
+def test_result_read_before_write_is_not_cached(clock):
+    db, _ = clock
+    tasks = TaskCache(db)
+    load = db.get_overdue_tasks
+
+    async def racing_load(user_id: int):
+        # Запись приходит, пока выборка читается
+        tasks.on_task_change(TaskChange("created", user_id, 4))
+        return await load(user_id)
+
+    db.get_overdue_tasks = racing_load
+    run(tasks.get_overdue_tasks(1))
+    run(tasks.get_overdue_tasks(1))
+    assert db.loads == 2
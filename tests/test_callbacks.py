@@ -0,0 +1,98 @@
+"""callback_data: упаковка/разбор схем, проверка полей и маршрутизация по префиксу"""
+import asyncio
+from datetime import date
+
+import pytest
+
+from callbacks import (
+    STALE_ANSWER, BulkAction, BulkOp, CallbackTable, Cancel, DeleteTask, Direction, DoneTask, PageNav,
+    PickDate, PickTime
+)
+
+
+class FakeCallback:
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+
+def test_pack_is_short_and_round_trips():
+    assert DoneTask(task_id=42).pack() == "d:42"
+    assert PageNav(direction=Direction.NEXT, deadline=1700000000, task_id=7).pack() == "p:n:1700000000:7"
+
+    for value in (
+        DeleteTask(task_id=1),
+        BulkAction(op=BulkOp.DELETE),
+        PickDate(year=2026, month=2, day=28),
+        PickTime(hour=9, minute=30),
+        PickTime(),
+        Cancel(),
+    ):
+        assert type(value).unpack(value.pack()) == value
+
+
+def test_pick_time_without_fields_is_manual():
+    assert PickTime.unpack(PickTime().pack()).manual
+    assert not PickTime(hour=0, minute=0).manual
+
+
+def test_pick_date_exposes_date():
+    assert PickDate.unpack("D:2024:2:29").date == date(2024, 2, 29)
+
+
+@pytest.mark.parametrize("schema, data", [
+    (DoneTask, "d:0"),
+    (DoneTask, "d:abc"),
+    (PickDate, "D:2026:2:30"),
+    (PickDate, "D:2026:13:1"),
+    (PickTime, "h:24:00"),
+    (BulkAction, "b:z"),
+])
+def test_unpack_rejects_invalid_fields(schema, data):
+    with pytest.raises((TypeError, ValueError)):
+        schema.unpack(data)
+
+
+def test_table_routes_by_prefix():
+    table = CallbackTable()
+    calls = []
+
+    @table.route(DoneTask)
+    async def done(callback, callback_data):
+        calls.append(("done", callback_data.task_id))
+
+    @table.route(Cancel)
+    async def cancel(callback, callback_data, state):
+        calls.append(("cancel", state))
+
+    asyncio.run(table.dispatch(FakeCallback("d:5"), "fsm"))
+    asyncio.run(table.dispatch(FakeCallback("q"), "fsm"))
+
+    assert calls == [("done", 5), ("cancel", "fsm")]
+    assert table.label("d:5") == "done"
+    assert table.label("done_5") == "unknown"
+
+
+@pytest.mark.parametrize("data", ["done_5", "d:-1", "", None])
+def test_stale_or_forged_data_is_answered_not_dispatched(data):
+    table = CallbackTable()
+
+    @table.route(DoneTask)
+    async def done(callback, callback_data):
+        raise AssertionError("не должен вызываться")
+
+    callback = FakeCallback(data)
+    asyncio.run(table.dispatch(callback, None))
+    assert callback.answers == [STALE_ANSWER]
+
+
+def test_duplicate_prefix_is_rejected():
+    table = CallbackTable()
+    register = table.route(DoneTask)
+    register(lambda *args: None)
+
+    with pytest.raises(ValueError):
+        register(lambda *args: None)
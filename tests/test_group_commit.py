@@ -0,0 +1,144 @@
+"""Group commit AsyncDatabase: пачки, ошибки отдельных запросов, конкурирующие соединения"""
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import AsyncDatabase
+from schema import enable_wal, migrate_path
+
+DEADLINE = datetime.now() + timedelta(days=1)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def connected(path, **kwargs) -> AsyncDatabase:
+    db = AsyncDatabase(str(path), **kwargs)
+    await db.connect()
+    return db
+
+
+def commits(db: AsyncDatabase) -> list:
+    log = []
+    db.add_query_hook(lambda sql, params, seconds, rows: sql == "COMMIT" and log.append(rows))
+    return log
+
+
+def test_concurrent_writes_share_one_commit(tmp_path):
+    async def scenario():
+        db = await connected(tmp_path / "t.db", commit_interval=0.01)
+        log = commits(db)
+        ids = await asyncio.gather(*(db.create_task(1, f"t{i}", None, DEADLINE) for i in range(20)))
+        await db.close()
+        return ids, log
+
+    ids, log = run(scenario())
+    assert len(set(ids)) == 20
+    assert log == [20]
+
+
+def test_max_batch_splits_queue(tmp_path):
+    async def scenario():
+        db = await connected(tmp_path / "t.db", commit_interval=0.01, max_batch=8)
+        log = commits(db)
+        await asyncio.gather(*(db.create_task(1, "t", None, DEADLINE) for _ in range(20)))
+        await db.close()
+        return log
+
+    assert run(scenario()) == [8, 8, 4]
+
+
+def test_failed_statement_fails_only_its_caller(tmp_path):
+    async def scenario():
+        db = await connected(tmp_path / "t.db", commit_interval=0.01)
+        # ABORT откатывает только оператор, транзакция пачки продолжается
+        await db.conn.execute(
+            "CREATE TEMP TRIGGER reject BEFORE INSERT ON task WHEN NEW.title = 'bad' "
+            "BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+        )
+        results = await asyncio.gather(
+            db.create_task(1, "ok", None, DEADLINE),
+            db.create_task(1, "bad", None, DEADLINE),
+            db.create_task(1, "ok2", None, DEADLINE),
+            return_exceptions=True
+        )
+        titles = sorted(task.title for task in await db.get_all_tasks(1))
+        await db.close()
+        return results, titles
+
+    results, titles = run(scenario())
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert isinstance(results[0], int) and isinstance(results[2], int)
+    assert titles == ["ok", "ok2"]
+
+
+def test_rolled_back_transaction_fails_whole_batch(tmp_path):
+    async def scenario():
+        db = await connected(tmp_path / "t.db", commit_interval=0.01)
+        # ROLLBACK (как SQLITE_FULL/IOERR) откатывает и уже выполненные запросы пачки
+        await db.conn.execute(
+            "CREATE TEMP TRIGGER rollback_all BEFORE INSERT ON task WHEN NEW.title = 'bad' "
+            "BEGIN SELECT RAISE(ROLLBACK, 'rolled back'); END"
+        )
+        results = await asyncio.gather(
+            db.create_task(1, "ok", None, DEADLINE),
+            db.create_task(1, "bad", None, DEADLINE),
+            return_exceptions=True
+        )
+        tasks = await db.get_all_tasks(1)
+        await db.close()
+        return results, tasks
+
+    results, tasks = run(scenario())
+    assert all(isinstance(result, sqlite3.Error) for result in results)
+    assert tasks == []
+
+
+@pytest.mark.parametrize("wal", [False, True])
+def test_writes_survive_commits_from_other_connection(tmp_path, wal):
+    """Регрессия: снимок чтения внутри пачки давал «database is locked»"""
+    path = str(tmp_path / "t.db")
+    migrate_path(path)
+    if wal:
+        enable_wal(path)
+
+    stop = threading.Event()
+
+    def other_writer():
+        # Как сброс SQLiteStorage или запись другого воркера
+        conn = sqlite3.connect(path, timeout=5)
+        n = 0
+        while not stop.is_set():
+            conn.execute("INSERT OR REPLACE INTO fsm_state VALUES (?, 's', '{}', 0)", (str(n % 10),))
+            conn.commit()
+            n += 1
+        conn.close()
+
+    async def scenario():
+        db = await connected(path)
+        ids = [await db.create_task(1, f"t{i}", None, datetime.now() - timedelta(hours=1)) for i in range(20)]
+        failed = []
+
+        async def user(offset: int):
+            for step in range(50):
+                try:
+                    await db.update_task_status(1, ids[(offset + step) % 20], "running" if step % 2 else "pending")
+                except sqlite3.Error as e:
+                    failed.append(e)
+                await db.get_overdue_tasks(1)
+
+        thread = threading.Thread(target=other_writer)
+        thread.start()
+        try:
+            await asyncio.gather(*(user(i) for i in range(10)))
+        finally:
+            stop.set()
+            thread.join()
+            await db.close()
+        return failed
+
+    assert run(scenario()) == []
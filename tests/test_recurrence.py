@@ -0,0 +1,73 @@
+"""Rule: разбор, nth/first_index/next_after и вхождения в окне"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import Task
+from recurrence import Rule, next_occurrence, occurrence_at_or_after
+
+START = datetime(2026, 1, 31, 9, 0)
+
+
+def test_parse_and_str_round_trip():
+    assert Rule.parse("daily") == Rule("daily")
+    assert Rule.parse(" Weekly:2 ") == Rule("weekly", 2)
+    assert Rule.parse("monthly:1:31") == Rule("monthly", 1, 31)
+    for text in ("daily", "weekly:2", "monthly:3:15"):
+        assert str(Rule.parse(text)) == text
+
+
+@pytest.mark.parametrize("text", ["yearly", "daily:0", "daily:x", "monthly:1:32", "daily:1:2:3"])
+def test_parse_rejects_bad_rules(text):
+    with pytest.raises(ValueError):
+        Rule.parse(text)
+
+
+def test_nth_daily_and_weekly():
+    assert Rule("daily", 2).nth(START, 3) == START + timedelta(days=6)
+    assert Rule("weekly").nth(START, 2) == START + timedelta(days=14)
+
+
+def test_monthly_clamps_to_month_end_and_returns_to_anchor():
+    rule = Rule.parse("monthly").anchored(START)
+    assert rule.day == 31
+    assert [rule.nth(START, n).date() for n in range(4)] == [
+        START.date(),
+        datetime(2026, 2, 28).date(),
+        datetime(2026, 3, 31).date(),
+        datetime(2026, 4, 30).date(),
+    ]
+    assert rule.nth(START, 13) == datetime(2027, 2, 28, 9, 0)
+
+
+@pytest.mark.parametrize("rule", [Rule("daily"), Rule("daily", 3), Rule("weekly", 2), Rule("monthly", 1, 31), Rule("monthly", 5, 31)])
+def test_first_index_matches_brute_force(rule):
+    for offset in range(0, 400, 7):
+        moment = START + timedelta(days=offset, hours=offset % 24)
+        n = rule.first_index(START, moment)
+        assert rule.nth(START, n) >= moment
+        assert n == 0 or rule.nth(START, n - 1) < moment
+
+
+def test_next_after_is_strictly_later():
+    rule = Rule("daily")
+    assert rule.next_after(START, START) == START + timedelta(days=1)
+    assert rule.next_after(START, START - timedelta(seconds=1)) == START
+    assert rule.next_after(START, START + timedelta(days=2, hours=1)) == START + timedelta(days=3)
+
+
+def test_occurrences_in_window():
+    rule = Rule("daily", 2)
+    moments = list(rule.occurrences(START, START + timedelta(days=3), START + timedelta(days=9)))
+    assert moments == [START + timedelta(days=days) for days in (4, 6, 8)]
+
+
+def test_task_occurrences():
+    daily = Task(1, "a", None, START, "pending", START, 1, "daily")
+    weekly = Task(2, "b", None, START + timedelta(hours=1), "pending", START, 1, "weekly")
+    since = START + timedelta(days=3, hours=12)
+
+    assert occurrence_at_or_after(daily, since).deadline == START + timedelta(days=4)
+    assert occurrence_at_or_after(weekly, since).deadline == START + timedelta(days=7, hours=1)
+    assert next_occurrence([daily, weekly], since) == START + timedelta(days=4)
+    assert next_occurrence([], since) is None
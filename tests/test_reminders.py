@@ -0,0 +1,90 @@
+"""ReminderScheduler: отправленное не повторяется после перезапуска, изменения других воркеров дочитываются"""
+import asyncio
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from database import CHANGED_TASKS_SQL, PENDING_FROM_SQL, AsyncDatabase
+from reminders import ReminderScheduler
+from timeutil import to_timestamp
+
+REMIND_BEFORE = timedelta(hours=1)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(text.split("\n")[2].removeprefix("📋 "))
+
+
+async def scheduler(db: AsyncDatabase, bot: FakeBot, **kwargs) -> ReminderScheduler:
+    reminders = ReminderScheduler(bot, db, remind_before=REMIND_BEFORE, **kwargs)
+    db.add_listener(reminders.on_task_change)
+    await reminders.start()
+    return reminders
+
+
+def test_sent_reminder_survives_restart(tmp_path):
+    async def scenario():
+        bot = FakeBot()
+        for restart in range(2):
+            db = AsyncDatabase(str(tmp_path / "t.db"))
+            await db.connect()
+            if not restart:
+                await db.create_task(1, "soon", None, datetime.now() + timedelta(minutes=30))
+            reminders = await scheduler(db, bot)
+            await asyncio.sleep(0.3)
+            reminders.shutdown()
+            await db.close()
+        return bot.sent
+
+    assert asyncio.run(scenario()) == ["soon"]
+
+
+def test_sync_reads_only_changes_of_other_workers(tmp_path):
+    path = str(tmp_path / "t.db")
+
+    async def scenario():
+        db = AsyncDatabase(path)
+        await db.connect()
+        bot = FakeBot()
+        # Напоминания о "deleted" и "completed" — через 2 секунды
+        later = datetime.now() + REMIND_BEFORE + timedelta(seconds=2)
+        moved = await db.create_task(1, "moved", None, datetime.now() + timedelta(days=2))
+        deleted = await db.create_task(1, "deleted", None, later)
+        completed = await db.create_task(1, "completed", None, later)
+        reminders = await scheduler(db, bot, sync_interval=timedelta(seconds=0.2))
+
+        queries = []
+        db.add_query_hook(lambda sql, params, seconds, rows: queries.append(sql))
+
+        # Другой воркер: своё соединение, подписчики этого процесса о записях не знают
+        other = sqlite3.connect(path)
+        soon = to_timestamp(datetime.now() + timedelta(minutes=30))
+        other.execute(
+            "INSERT INTO task (title, deadline, status, created_at, user_id) VALUES ('inserted', ?, 'pending', ?, 1)",
+            (soon, int(time.time()))
+        )
+        other.execute("UPDATE task SET deadline = ? WHERE id = ?", (soon, moved))
+        other.commit()
+        await asyncio.sleep(0.6)
+        sent_after_sync = sorted(bot.sent)
+
+        other.execute("DELETE FROM task WHERE id = ?", (deleted,))
+        other.execute("UPDATE task SET status = 'completed' WHERE id = ?", (completed,))
+        other.commit()
+        other.close()
+        await asyncio.sleep(2.5)
+
+        reminders.shutdown()
+        await db.close()
+        return sent_after_sync, sorted(bot.sent), queries
+
+    sent_after_sync, sent, queries = asyncio.run(scenario())
+    assert sent_after_sync == ["inserted", "moved"]
+    assert sent == ["inserted", "moved"]
+    # Полная перезагрузка ожидающих задач не нужна
+    assert PENDING_FROM_SQL not in queries
+    assert CHANGED_TASKS_SQL in queries
@@ -0,0 +1,73 @@
+"""render_chunks / render_tasks: лимит в единицах UTF-16, границы задач и сводка"""
+from datetime import datetime
+
+from database import Task
+from render import SEARCH_LINE, TODAY_LINE, render_chunks, render_page, render_tasks, text_length
+
+EMOJI = "😀"  # вне BMP: два UTF-16 units
+
+
+def task(task_id: int, title: str = "t", status: str = "pending") -> Task:
+    moment = datetime(2026, 3, 10, 12, 0)
+    return Task(task_id, title, None, moment, status, moment, 1)
+
+
+def test_text_length_counts_surrogate_pairs():
+    assert text_length("abc") == 3
+    assert text_length(EMOJI * 3) == 6
+
+
+def test_chunks_split_on_line_boundaries():
+    lines = ["a" * 4 + "\n"] * 5
+    chunks = list(render_chunks(lines, header="H\n", limit=12))
+
+    assert chunks == ["H\n" + "aaaa\n" * 2, "aaaa\n" * 2, "aaaa\n"]
+    assert "".join(chunks) == "H\n" + "".join(lines)
+
+
+def test_limit_is_measured_in_utf16_units():
+    # 5 эмодзи = 10 units: пять символов по len(), но в лимит 8 не влезают
+    chunks = list(render_chunks([EMOJI * 2, EMOJI * 3], limit=8))
+    assert chunks == [EMOJI * 2, EMOJI * 3]
+    assert all(text_length(chunk) <= 8 for chunk in chunks)
+
+
+def test_long_line_is_cut_without_breaking_surrogate_pairs():
+    line = "a" + EMOJI * 5  # 11 units
+    chunks = list(render_chunks([line], limit=4))
+
+    assert "".join(chunks) == line
+    # "a" + пара = 3 units: следующая пара в лимит 4 не помещается целиком
+    assert chunks == ["a" + EMOJI, EMOJI * 2, EMOJI * 2]
+    assert all(text_length(chunk) <= 4 for chunk in chunks)
+
+
+def test_empty_input_yields_header_only():
+    assert list(render_chunks([], header="H")) == ["H"]
+    assert list(render_chunks([])) == []
+
+
+def test_max_messages_appends_rest_summary():
+    tasks = [task(i, "x" * 20) for i in range(1, 11)]
+    line = text_length(TODAY_LINE(tasks[0]))
+
+    chunks = list(render_tasks(tasks, TODAY_LINE, limit=line * 3, max_messages=2))
+
+    assert len(chunks) == 3
+    assert chunks[-1] == "... и ещё 4 задач"
+
+
+def test_search_line_escapes_title_and_numbers_lines():
+    chunks = list(render_tasks([task(1, "<b>"), task(2, "a&b")], SEARCH_LINE))
+
+    assert chunks[0].startswith("1. ⏳ &lt;b&gt;")
+    assert "2. ⏳ a&amp;b" in chunks[0]
+
+
+def test_page_keeps_first_message_only():
+    tasks = [task(i, "x" * 100) for i in range(1, 200)]
+    page = render_page(tasks, TODAY_LINE, header="H\n")
+
+    assert page.startswith("H\n")
+    assert text_length(page) <= 4096
+    assert render_page([], TODAY_LINE, header="H\n") == "H\n"
@@ -0,0 +1,88 @@
+"""Потоковый разбор /import: JSON-массив и JSON Lines по кускам, CSV, пропуск плохих строк"""
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+import transfer
+from transfer import ImportReport, iter_import_rows, iter_json_records, parse_deadline
+from timeutil import to_timestamp
+
+DEADLINE = datetime(2026, 5, 1, 18, 0)
+
+
+def records(count: int):
+    return [{"title": f"t{i} «ё»", "description": "d, \"q\"", "deadline": "2026-05-01 18:00"} for i in range(count)]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Объекты гарантированно разрезаются границами кусков
+    monkeypatch.setattr(transfer, "READ_CHUNK", 7)
+
+
+def test_json_array_across_chunks(small_chunks):
+    data = records(50)
+    parsed = list(iter_json_records(io.StringIO(json.dumps(data, ensure_ascii=False, indent=2))))
+
+    assert [value for _, value in parsed] == data
+    assert [number for number, _ in parsed] == list(range(1, 51))
+
+
+def test_json_lines_across_chunks(small_chunks):
+    data = records(20)
+    text = "\n".join(json.dumps(record, ensure_ascii=False) for record in data) + "\n"
+
+    assert [value for _, value in iter_json_records(io.StringIO(text))] == data
+
+
+def test_empty_json_inputs():
+    assert list(iter_json_records(io.StringIO(""))) == []
+    assert list(iter_json_records(io.StringIO("[]"))) == []
+
+
+def test_truncated_json_raises(small_chunks):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_records(io.StringIO('[{"title": "a"}, {"title": ')))
+
+
+def test_json_reads_file_lazily(small_chunks):
+    stream = io.StringIO(json.dumps(records(1000)))
+    first = next(iter_json_records(stream))
+
+    assert first[0] == 1
+    assert stream.tell() < 200
+
+
+def test_bad_rows_are_skipped_and_reported():
+    data = [
+        {"title": "ok", "deadline": "01.05.2026 18:00"},
+        {"title": "", "deadline": "01.05.2026"},
+        {"title": "bad status", "deadline": "01.05.2026", "status": "lost"},
+        "not an object",
+        {"title": "bad deadline", "deadline": "tomorrow"},
+        {"title": "done", "deadline": to_timestamp(DEADLINE), "status": "completed"},
+    ]
+    report = ImportReport()
+    rows = list(iter_import_rows(io.StringIO(json.dumps(data)), "json", report))
+
+    assert rows == [
+        ("ok", None, to_timestamp(DEADLINE), "pending"),
+        ("done", None, to_timestamp(DEADLINE), "completed"),
+    ]
+    assert report.skipped == 4
+    assert [error.split(":")[0] for error in report.errors] == ["строка 2", "строка 3", "строка 4", "строка 5"]
+
+
+def test_csv_rows_report_file_lines():
+    text = "title,description,deadline,status\nok,,2026-05-01T18:00,\n,,2026-05-01,\n"
+    report = ImportReport()
+
+    assert list(iter_import_rows(io.StringIO(text), "csv", report)) == [("ok", "", to_timestamp(DEADLINE), "pending")]
+    assert report.errors == ["строка 3: пустое название"]
+
+
+@pytest.mark.parametrize("value", ["2026-05-01 18:00", "01.05.2026 18:00", str(to_timestamp(DEADLINE)), to_timestamp(DEADLINE)])
+def test_parse_deadline_formats(value):
+    assert parse_deadline(value) == to_timestamp(DEADLINE)
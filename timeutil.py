@@ -0,0 +1,24 @@
+"""Преобразования времени для хранения в БД.
+
+Дедлайны и created_at хранятся как целые Unix timestamp (секунды);
+наружу слой данных отдаёт их как datetime в локальном времени.
+"""
+from datetime import datetime, timedelta
+from typing import Tuple
+
+
+def to_timestamp(value: datetime) -> int:
+    """datetime (локальное время) -> Unix timestamp"""
+    return int(value.timestamp())
+
+
+def now_timestamp() -> int:
+    return to_timestamp(datetime.now())
+
+
+def day_bounds(now: datetime = None) -> Tuple[int, int]:
+    """Начало и конец (включительно) текущих суток в виде timestamp"""
+    now = now or datetime.now()
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return to_timestamp(start), to_timestamp(start + timedelta(days=1)) - 1
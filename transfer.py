@@ -0,0 +1,177 @@
+"""Импорт и экспорт задач в CSV/JSON потоком, без загрузки файла целиком.
+
+Формат строки: title, description, deadline, status (необязательно, по
+умолчанию pending). deadline — ISO 8601 («2026-05-01 18:00»), формат бота
+(«01.05.2026 18:00») или Unix timestamp. JSON принимается как массив
+объектов или JSON Lines (объект на строку); массив разбирается
+инкрементально через JSONDecoder.raw_decode.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import IO, Iterator, List, Optional, Tuple
+
+from database import Task
+from timeutil import to_timestamp
+
+EXPORT_FIELDS = ("id", "title", "description", "deadline", "status", "created_at")
+STATUSES = ("pending", "running", "completed")
+# ISO 8601 разбирается datetime.fromisoformat, остальные форматы — strptime
+DATE_FORMATS = ("%d.%m.%Y %H:%M", "%d.%m.%Y")
+
+READ_CHUNK = 64 * 1024
+MAX_ERRORS = 5
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class ImportReport:
+    """Итог импорта: сколько строк добавлено, сколько пропущено и первые ошибки"""
+    imported: int = 0
+    skipped: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def skip(self, line: int, error: Exception):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"строка {line}: {error}")
+
+
+def parse_deadline(value) -> int:
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    value = str(value or "").strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return to_timestamp(datetime.fromisoformat(value))
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return to_timestamp(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ImportRowError(f"неверный дедлайн {value!r}")
+
+
+def row_to_params(record: dict) -> Tuple:
+    """Запись файла -> (title, description, deadline_ts, status) для import_tasks"""
+    title = str(record.get("title") or "").strip()
+    if not title:
+        raise ImportRowError("пустое название")
+
+    status = str(record.get("status") or "pending").strip()
+    if status not in STATUSES:
+        raise ImportRowError(f"неизвестный статус {status!r}")
+
+    description = record.get("description")
+    return (
+        title, str(description) if description is not None else None,
+        parse_deadline(record.get("deadline")), status
+    )
+
+
+def iter_csv_records(stream: IO[str]) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def iter_json_records(stream: IO[str]) -> Iterator[Tuple[int, object]]:
+    """Элементы JSON-массива или строки JSON Lines; в памяти только текущий кусок файла"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    number = 0
+    eof = False
+
+    while True:
+        # Пропустить разделители: пробелы, скобки массива и запятые
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+            pos += 1
+
+        if pos == len(buffer):
+            if eof:
+                return
+            buffer, pos = stream.read(READ_CHUNK), 0
+            eof = not buffer
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Объект разрезан границей куска: дочитать и попробовать снова
+            chunk = stream.read(READ_CHUNK)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        number += 1
+        pos = end
+        yield number, value
+
+
+def iter_import_rows(stream: IO[str], fmt: str, report: ImportReport) -> Iterator[Tuple]:
+    """Строки для import_tasks; некорректные пропускаются, ошибки копятся в report"""
+    records = iter_json_records(stream) if fmt == "json" else iter_csv_records(stream)
+
+    for line, record in records:
+        try:
+            if not isinstance(record, dict):
+                raise ImportRowError("ожидался объект")
+            yield row_to_params(record)
+        except ImportRowError as e:
+            report.skip(line, e)
+
+
+def detect_format(file_name: Optional[str]) -> Optional[str]:
+    name = (file_name or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".json", ".jsonl", ".ndjson")):
+        return "json"
+    return None
+
+
+def task_to_record(task: Task) -> dict:
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "deadline": task.deadline.strftime("%Y-%m-%d %H:%M"),
+        "status": task.status,
+        "created_at": task.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+class ExportWriter:
+    """Запись задач в файл по одной: CSV с заголовком или JSON-массив"""
+
+    def __init__(self, stream: IO[str], fmt: str):
+        self.stream = stream
+        self.fmt = fmt
+        self.count = 0
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+            self._csv.writeheader()
+        else:
+            stream.write("[")
+
+    def write(self, task: Task):
+        record = task_to_record(task)
+        if self.fmt == "csv":
+            self._csv.writerow(record)
+        else:
+            self.stream.write(("\n" if self.count == 0 else ",\n") + json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        if self.fmt == "json":
+            self.stream.write("\n]\n")
@@ -0,0 +1,368 @@
+"""Локальный стенд webhook-режима: синтетические апдейты без обращения к Telegram.
+
+Поднимает приложение build_webhook_app() на локальном порту, отправляет
+POST-запросы с апдейтами и измеряет две задержки:
+    ack     — от отправки запроса до ответа webhook (что видит Telegram);
+    handler — от отправки запроса до первого вызова Bot API из обработчика.
+
+Исходящие вызовы Bot API перехватывает FakeSession; --flood N заставляет её
+отвечать TelegramRetryAfter на каждый N-й вызов, чтобы проверить повторы
+OutboundSender. Ответы проходят через OutboundSender бота, так что задержка
+handler включает ожидание глобального лимита (~30 сообщений/с).
+
+БД и секрет задаются через переменные окружения до импорта bot, поэтому
+config.py должен читать DB_PATH из TASKFLOW_DB_PATH.
+
+С --workers N апдейты идут через supervisor.py в N процессов-воркеров
+(каждый — этот же скрипт с --worker: bot.py с FakeSession). Проверяется,
+что апдейт обработан воркером chat_id % N, что аренду держит ровно один
+воркер и что ни одна запись в БД (обработчики, архивация ведущего) не
+завершилась ошибкой (taskflow_failed_writes на /metrics воркеров);
+--failover убивает ведущего (SIGKILL) и ждёт, пока роль заберёт другой,
+а supervisor перезапустит убитого.
+
+Примеры:
+    python webhook_harness.py
+    python webhook_harness.py --updates 5000 --concurrency 100
+    python webhook_harness.py --flood 50
+    python webhook_harness.py --workers 4 --failover
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Chat, Message
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestClient, TestServer
+
+SECRET = "harness-secret"
+# Короткая аренда, чтобы --failover не ждал 30 секунд
+LEASE_TTL_SECONDS = 3
+
+# Команда без обращения к БД и список задач (БД + клавиатура)
+TEXTS = ["/start", "📋 Все задачи"]
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API, которая отвечает сразу и запоминает время первого вызова по чату"""
+
+    def __init__(self, flood_every: int = 0):
+        super().__init__()
+        self.first_call = {}
+        self.flood_every = flood_every
+        self.calls = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        if self.flood_every and self.calls % self.flood_every == 0:
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after=1)
+
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            self.first_call.setdefault(chat_id, time.perf_counter())
+
+        if method.__returning__ is Message:
+            return Message(
+                message_id=1, date=datetime.now(),
+                chat=Chat(id=chat_id or 0, type="private"),
+                text=getattr(method, "text", None)
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        # Скачивание файлов (bot.download): отдаём пустой файл
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_update(update_id: int, text: str) -> dict:
+    # Каждый апдейт от своего пользователя: chat_id связывает запрос и ответ обработчика
+    user = {"id": update_id, "is_bot": False, "first_name": "Bench"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": update_id, "type": "private"},
+            "from": user,
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]}
+               if text.startswith("/") else {})
+        }
+    }
+
+
+def percentiles(values) -> str:
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return f"median={statistics.median(values):7.2f}ms p95={p95:7.2f}ms max={values[-1]:7.2f}ms"
+
+
+async def run(updates: int, concurrency: int, flood_every: int) -> bool:
+    import bot as bot_module
+
+    session = FakeSession(flood_every)
+    session.middleware(bot_module.sender)
+    bot_module.bot.session = session
+    client = TestClient(TestServer(bot_module.build_webhook_app()))
+    await client.start_server()
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    path = bot_module.WEBHOOK_PATH
+    sent, acks = {}, []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(update_id: int):
+        async with semaphore:
+            sent[update_id] = start = time.perf_counter()
+            async with client.post(path, json=make_update(update_id, TEXTS[update_id % len(TEXTS)]), headers=headers) as resp:
+                assert resp.status == 200, resp.status
+            acks.append((time.perf_counter() - start) * 1000)
+
+    try:
+        async with client.post(path, json=make_update(0, "/start"), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as resp:
+            rejected = resp.status == 401
+        print(f"wrong secret -> {resp.status} ({'ok' if rejected else 'FAIL'})")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update_id) for update_id in range(1, updates + 1)))
+
+        # Апдейты обрабатываются в фоне: ждём ответа на каждый (с запасом на лимит отправки)
+        deadline = time.perf_counter() + 30 + updates / bot_module.sender.global_bucket.rate
+        while len(session.first_call) < updates and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.close()
+
+    handled = [(session.first_call[uid] - sent[uid]) * 1000 for uid in sent if uid in session.first_call]
+    metrics = bot_module.sender.metrics()
+    print(f"updates={updates} concurrency={concurrency} handled={len(handled)} "
+          f"throughput={len(handled) / elapsed:8.1f} upd/s")
+    print(f"ack     {percentiles(acks)}")
+    if handled:
+        print(f"handler {percentiles(handled)}")
+    print("sender  " + " ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items()))
+
+    return rejected and len(handled) == updates and metrics["failed"] == 0
+
+
+# --- несколько воркеров ---
+
+def run_worker():
+    """Процесс-воркер: bot.py, вызовы Bot API пишутся в calls.<id>, получение аренды — в elected"""
+    import bot as bot_module
+
+    if os.path.abspath(bot_module.DB_PATH) != os.path.abspath(os.environ["TASKFLOW_DB_PATH"]):
+        sys.exit("config.py не читает TASKFLOW_DB_PATH: воркер не будет писать в рабочую БД")
+
+    workdir = os.environ["TASKFLOW_HARNESS_DIR"]
+    calls = open(os.path.join(workdir, f"calls.{bot_module.WORKER_ID}"), "a", buffering=1)
+
+    class RecordingSession(FakeSession):
+        async def make_request(self, bot, method, timeout=None):
+            chat_id = getattr(method, "chat_id", None)
+            if chat_id is not None and chat_id not in self.first_call:
+                calls.write(f"{chat_id} {time.time()}\n")
+            return await super().make_request(bot, method, timeout)
+
+    session = RecordingSession()
+    session.middleware(bot_module.sender)
+    bot_module.bot.session = session
+
+    on_elected = bot_module.leader.on_elected
+
+    async def elected():
+        with open(os.path.join(workdir, "elected"), "a") as log:
+            log.write(f"{bot_module.WORKER_ID} {os.getpid()} {time.time()}\n")
+        await on_elected()
+
+    bot_module.leader.on_elected = elected
+    try:
+        asyncio.run(bot_module.main())
+    except KeyboardInterrupt:
+        pass
+
+
+def read_lines(path: str) -> list:
+    try:
+        with open(path) as f:
+            return [line.split() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+async def wait_for(check, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if check():
+            return True
+        await asyncio.sleep(0.05)
+    return check()
+
+
+async def failed_writes(supervisor) -> Dict[int, int]:
+    """taskflow_failed_writes живых воркеров (с их /metrics на локальном порту)"""
+    result = {}
+    async with ClientSession() as session:
+        for worker in supervisor.workers:
+            try:
+                async with session.get(f"http://127.0.0.1:{worker.port}/metrics") as resp:
+                    text = await resp.text()
+            except OSError:
+                continue
+            for line in text.splitlines():
+                if line.startswith("taskflow_failed_writes "):
+                    result[worker.index] = int(float(line.split()[1]))
+    return result
+
+
+async def run_cluster(workers: int, updates: int, concurrency: int, workdir: str, db_path: str,
+                      base_port: int, failover: bool) -> bool:
+    from supervisor import Supervisor, prepare_database
+
+    prepare_database(db_path)
+    supervisor = Supervisor(workers, base_port, command=[sys.executable, os.path.abspath(__file__), "--worker"])
+    await supervisor.start()
+    client = TestClient(TestServer(supervisor.build_app(SECRET)))
+    await client.start_server()
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    sent: Dict[int, float] = {}
+    acks = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def handled() -> Dict[int, tuple]:
+        result = {}
+        for index in range(workers):
+            for chat_id, at in read_lines(os.path.join(workdir, f"calls.{index}")):
+                result.setdefault(int(chat_id), (index, float(at)))
+        return result
+
+    async def post(update_id: int):
+        async with semaphore:
+            sent[update_id] = start = time.time()
+            update = make_update(update_id, TEXTS[update_id % len(TEXTS)])
+            async with client.post(supervisor.path, json=update, headers=headers) as resp:
+                assert resp.status == 200, resp.status
+            acks.append((time.time() - start) * 1000)
+
+    ok = True
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update_id) for update_id in range(1, updates + 1)))
+        await wait_for(lambda: len(handled()) >= updates, 30 + updates / 30)
+        elapsed = time.perf_counter() - started
+
+        results = handled()
+        misrouted = sum(1 for chat_id, (index, _) in results.items() if chat_id % workers != index)
+        latencies = [(at - sent[chat_id]) * 1000 for chat_id, (_, at) in results.items() if chat_id in sent]
+        print(f"workers={workers} updates={updates} handled={len(results)} misrouted={misrouted} "
+              f"throughput={len(results) / elapsed:8.1f} upd/s")
+        print(f"ack     {percentiles(acks)}")
+        if latencies:
+            print(f"handler {percentiles(latencies)}")
+        ok = len(results) == updates and misrouted == 0
+
+        elected_path = os.path.join(workdir, "elected")
+        await wait_for(lambda: read_lines(elected_path), LEASE_TTL_SECONDS * 2)
+        elections = read_lines(elected_path)
+        print(f"leader  elected={[line[0] for line in elections]} holder={lease_holder(db_path)}")
+        ok = ok and len(elections) == 1
+
+        failed = await failed_writes(supervisor)
+        print(f"writes  failed={failed}")
+        ok = ok and len(failed) == workers and not any(failed.values())
+
+        if failover and elections:
+            leader_index = int(elections[0][0])
+            os.kill(supervisor.workers[leader_index].process.pid, signal.SIGKILL)
+            killed_at = time.time()
+            took_over = await wait_for(lambda: len(read_lines(elected_path)) > 1, LEASE_TTL_SECONDS * 4)
+            elections = read_lines(elected_path)
+            print(f"failover killed=worker{leader_index} elected={[line[0] for line in elections]} "
+                  + (f"after {float(elections[-1][2]) - killed_at:.1f}s" if took_over else "TIMEOUT"))
+            restarted = await wait_for(
+                lambda: supervisor.workers[leader_index].process.returncode is None
+                and supervisor.workers[leader_index].restarts == 1, 10
+            )
+            print(f"restart worker{leader_index} {'ok' if restarted else 'FAIL'}")
+            # Новый ведущий при избрании запускает архивацию
+            failed = await failed_writes(supervisor)
+            print(f"writes  failed={failed}")
+            ok = ok and took_over and restarted and not any(failed.values())
+    finally:
+        await client.close()
+        await supervisor.stop()
+
+    print(f"forwarded={supervisor.forwarded} dropped={supervisor.dropped}")
+    return ok and supervisor.dropped == 0
+
+
+def lease_holder(db_path: str):
+    from leader import lease_path
+
+    conn = sqlite3.connect(lease_path(db_path))
+    try:
+        row = conn.execute("SELECT holder FROM lease WHERE expires_at >= strftime('%s', 'now')").fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--flood", type=int, default=0, help="RetryAfter на каждый N-й вызов Bot API")
+    parser.add_argument("--workdir", default=None, help="Каталог для временной БД")
+    parser.add_argument("--workers", type=int, default=0, help="Прогон через supervisor.py с N воркерами")
+    parser.add_argument("--base-port", type=int, default=18100, help="Порт первого воркера")
+    parser.add_argument("--failover", action="store_true", help="Убить ведущего воркера и дождаться нового")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker()
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="taskflow-webhook-")
+    db_path = os.path.join(workdir, "webhook.db")
+    os.environ["TASKFLOW_DB_PATH"] = db_path
+    os.environ["TASKFLOW_WEBHOOK_SECRET"] = SECRET
+
+    if args.workers:
+        from config import DB_PATH
+        if os.path.abspath(DB_PATH) != os.path.abspath(db_path):
+            sys.exit("config.py не читает TASKFLOW_DB_PATH: стенд не будет писать в рабочую БД")
+
+        for name in os.listdir(workdir):
+            if name.startswith("calls.") or name == "elected":
+                os.remove(os.path.join(workdir, name))
+        os.environ["TASKFLOW_HARNESS_DIR"] = workdir
+        os.environ["TASKFLOW_LEASE_TTL_SECONDS"] = str(LEASE_TTL_SECONDS)
+        ok = asyncio.run(run_cluster(args.workers, args.updates, args.concurrency, workdir, db_path,
+                                     args.base_port, args.failover))
+        sys.exit(0 if ok else 1)
+
+    import bot as bot_module
+    if os.path.abspath(bot_module.DB_PATH) != os.path.abspath(db_path):
+        sys.exit("config.py не читает TASKFLOW_DB_PATH: стенд не будет писать в рабочую БД")
+
+    sys.exit(0 if asyncio.run(run(args.updates, args.concurrency, args.flood)) else 1)
+
+
+if __name__ == "__main__":
+    main()